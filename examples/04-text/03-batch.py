@@ -0,0 +1,24 @@
+# Add the upper directory (where the nodebox module is) to the search path.
+import os, sys; sys.path.insert(0, os.path.join("..",".."))
+
+from nodebox.graphics import *
+from random import random
+
+# A TextBatch draws many texts at once (e.g., labels in a graph or a data visualization).
+# Each text is laid out once. Moving a text only moves the vertices of its label,
+# and all the texts in the batch are drawn with a single command (for each font texture).
+
+batch = TextBatch()
+for i in range(1000):
+    batch.text(str(i), random() * 500, random() * 500,
+        fontsize = 9,
+            fill = color(0, 0, 0, 0.5))
+
+def draw(canvas):
+    canvas.clear()
+    for txt in batch:
+        txt.x = (txt.x + 1) % canvas.width
+    batch.draw()
+
+canvas.size = 500, 500
+canvas.run(draw)
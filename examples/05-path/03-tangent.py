@@ -36,6 +36,8 @@ def draw(canvas):
     fill(0.25, 0.15, 0.75, 0.25)
 
     # The BezierPath.points() method yields points evenly distributed along the path.
+    # The points are calculated from a table of (cached) lengths along the path,
+    # so this remains fast for long paths with many points.
     # The directed() iterator yields (angle, point)-tuples
     # for each point in a BezierPath(), BezierPath.points() list, or list of Point objects.
     # - The angle represents the direction into which the curve is bending.
@@ -13,20 +13,26 @@ path = textpath("GROW", x=40, y=200, fontname="Arial", fontsize=100, bold=True)
 
 # Now that we have a BezierPath from the text we can use all sorts of math on it.
 # Calculate a list of points (PathElement objects), evenly distributed along the path:
-points = list(path.points(1000))
+# points = list(path.points(1000))
+# For many points, BezierPath.points_array() is faster. 
+# It returns an array of coordinates (x1, y1, x2, y2, ...) instead of PathElement objects:
+points = path.points_array(1000)
+x = points[0::2]
+y = points[1::2]
 
 def draw(canvas):
     
     fill(0.2, 0.2, 0, max(0.1, 1-canvas.frame*0.05)) # Less opacity over time.
     
-    for pt in points:
-        ellipse(pt.x, pt.y, 1, 1)
-        
+    # Draw all the points at once.
+    ellipses(x, y, 1, 1, segments=6)
+    
+    for i in range(len(x)):
         # Each frame, adjust the position of the point a little bit.
         # Since we are not clearing the background,
         # it will appear as if something is growing from the text.
-        pt.x += random(-1.0, 1.0)
-        pt.y += random(-1.0, 1.0)
+        x[i] += random(-1.0, 1.0)
+        y[i] += random(-1.0, 1.0)
 
 canvas.fps  = 20
 canvas.size = 500, 500
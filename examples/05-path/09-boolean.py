@@ -0,0 +1,33 @@
+# Add the upper directory (where the nodebox module is) to the search path.
+import os, sys; sys.path.insert(0, os.path.join("..",".."))
+
+from nodebox.graphics import *
+
+# Paths can be combined into new paths with boolean operations:
+# BezierPath.union(), intersection(), difference() and xor().
+# Unlike a clipping mask (see the previous example), the result is calculated once,
+# and then drawn as a normal path. It can be stroked, hit-tested, combined again, ...
+
+a = BezierPath()
+a.ellipse(200, 250, 200, 200)
+b = BezierPath()
+b.ellipse(300, 250, 200, 200)
+
+# The results are cached in both paths, so calling a.union(b) again in draw() is fast.
+# When a or b is modified, the result is calculated again.
+
+def draw(canvas):
+    canvas.clear()
+    for i, path in enumerate((
+      a.union(b), 
+      a.intersection(b), 
+      a.difference(b), 
+      a.xor(b))):
+        push()
+        translate(i % 2 * 250, i // 2 * 250)
+        scale(0.5)
+        drawpath(path, fill=(0.25, 0.15, 0.75, 0.5), stroke=(0,0,0,1), strokewidth=4)
+        pop()
+
+canvas.size = 500, 500
+canvas.run(draw)
@@ -0,0 +1,59 @@
+# Add the upper directory (where the nodebox module is) to the search path.
+import os, sys; sys.path.insert(0, os.path.join("..",".."))
+
+from nodebox.graphics import *
+from random import seed
+from time import time
+
+# Each drawing command (rect(), ellipse(), ...) issues its own OpenGL calls.
+# With thousands of shapes per frame, the time spent calling OpenGL from Python adds up.
+# Between beginbatch() and endbatch() (or in a "with batch():" block),
+# primitives are recorded in vertex arrays and drawn with as few OpenGL calls as possible.
+# You can also set canvas.batching=True to batch everything drawn in the canvas.
+
+# Press the spacebar to toggle batching on and off.
+# The time it takes to draw the frame is displayed in the top left corner.
+
+N = 5000
+
+def shapes(canvas):
+    seed(0)
+    for i in range(N):
+        x = random(canvas.width)
+        y = random(canvas.height)
+        clr = color(random(), random(0.5), random(0.5, 1.0), 0.5)
+        if i % 3 == 0:
+            rect(x, y, 6, 6, fill=clr, stroke=None)
+        elif i % 3 == 1:
+            ellipse(x, y, 8, 8, fill=clr, stroke=None)
+        else:
+            line(x, y, x+10, y+10, stroke=clr)
+
+batched = True
+elapsed = 0.0
+
+def draw(canvas):
+    global elapsed
+    canvas.clear()
+    t = time()
+    if batched:
+        b = beginbatch()
+        shapes(canvas)
+        endbatch()
+    else:
+        shapes(canvas)
+    elapsed = 0.9 * elapsed + 0.1 * (time() - t)
+    s = "%s: %.1f ms" % (batched and "batched" or "unbatched", elapsed * 1000)
+    if batched:
+        s += " (%s OpenGL draw calls)" % b.calls
+    fill(0)
+    text(s, 10, canvas.height-20)
+
+def on_key_press(canvas, keys):
+    global batched
+    if keys.char == " ":
+        batched = not batched
+
+canvas.size = 500, 500
+canvas.on_key_press = on_key_press
+canvas.run(draw)
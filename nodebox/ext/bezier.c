@@ -86,6 +86,80 @@ void _curvelength(double x0, double y0, double x1, double y1,
     *out_length = length;
 }
 
+// --- FLATTEN ------------------------------------------------------------------
+// Same as bezier.flatten() in nodebox/graphics/bezier.py (with the same floating-point results).
+
+#define RELATIVE 0
+#define FIXED 1
+#define FLATNESS 2
+
+int _segments(int mode, double precision, double x0, double y0, double x1, double y1,
+              double x2, double y2, double x3, double y3) {
+    // Returns the number of lines for the given curve.
+    double a, b, d;
+    if (mode == FLATNESS) {
+        a = pow(x0-2*x1+x2, 2) + pow(y0-2*y1+y2, 2);
+        b = pow(x1-2*x2+x3, 2) + pow(y1-2*y2+y3, 2);
+        d = sqrt(a > b ? a : b);
+        return (int) ceil(sqrt(0.75 * d / (precision > 1e-6 ? precision : 1e-6)));
+    }
+    if (mode == RELATIVE) {
+        return (int) ((precision > 0 ? precision : 0) * 0.5 * (
+            sqrt(pow(x3-x0, 2) + pow(y3-y0, 2)) + 
+            sqrt(pow(x1-x0, 2) + pow(y1-y0, 2)) + 
+            sqrt(pow(x2-x1, 2) + pow(y2-y1, 2)) + 
+            sqrt(pow(x3-x2, 2) + pow(y3-y2, 2))));
+    }
+    return (int) (precision > 0 ? precision : 0);
+}
+
+int _append(PyObject *contour, double x, double y) {
+    // Appends a new (x,y)-tuple to the given list.
+    PyObject *pt, *px, *py;
+    int err;
+    px = PyFloat_FromDouble(x);
+    py = PyFloat_FromDouble(y);
+    pt = PyTuple_New(2);
+    if (px == NULL || py == NULL || pt == NULL) {
+        Py_XDECREF(px); Py_XDECREF(py); Py_XDECREF(pt);
+        return -1;
+    }
+    PyTuple_SET_ITEM(pt, 0, px);
+    PyTuple_SET_ITEM(pt, 1, py);
+    err = PyList_Append(contour, pt);
+    Py_DECREF(pt);
+    return err;
+}
+
+PyObject *_contour(PyObject *contours, double x, double y) {
+    // Appends a new list with a single (x,y)-tuple to the given list, and returns it (borrowed).
+    PyObject *contour;
+    int err;
+    contour = PyList_New(0);
+    if (contour == NULL)
+        return NULL;
+    err = PyList_Append(contours, contour);
+    Py_DECREF(contour);
+    if (err < 0 || _append(contour, x, y) < 0)
+        return NULL;
+    return contour;
+}
+
+int _buffer(PyObject *a, char typecode, const void **p, Py_ssize_t *n) {
+    // Sets p to the data of the given array.array with the given typecode, and n to its size in bytes.
+    PyObject *tc;
+    char *s;
+    tc = PyObject_GetAttrString(a, "typecode");
+    s  = tc != NULL ? PyString_AsString(tc) : NULL;
+    if (s == NULL || s[0] != typecode) {
+        Py_XDECREF(tc);
+        PyErr_Format(PyExc_TypeError, "expected array('%c')", typecode);
+        return -1;
+    }
+    Py_DECREF(tc);
+    return PyObject_AsReadBuffer(a, p, n);
+}
+
 // ------------------------------------------------------------------------------
 
 static PyObject *
@@ -138,6 +212,114 @@ curvelength(PyObject *self, PyObject *args) {
     return Py_BuildValue("d", out_length);
 }
 
+static PyObject *
+flatten(PyObject *self, PyObject *args, PyObject *kwargs) {
+    // Returns a list of contours for the packed path, where each contour is a list of (x,y)-tuples.
+    PyObject *cmds_, *coords_, *precision_ = NULL, *tolerance_ = Py_None;
+    PyObject *contours, *contour = NULL, *list;
+    const unsigned char *cmds;
+    const double *coords, *c;
+    Py_ssize_t ncmds, ncoords, i;
+    double precision = 0.2, x0 = 0, y0 = 0, cx = 0, cy = 0, lx = 0, ly = 0;
+    double x1, y1, x2, y2, x3, y3, t, mt, b0, b1, b2, b3;
+    int mode = RELATIVE, start = 1, n, k;
+    static char *kwlist[] = {"cmds", "coords", "precision", "tolerance", NULL};
+    if (!PyArg_ParseTupleAndKeywords(args, kwargs, "OO|OO", kwlist, &cmds_, &coords_, &precision_, &tolerance_))
+        return NULL;
+    if (_buffer(cmds_, 'B', (const void **) &cmds, &ncmds) < 0 ||
+        _buffer(coords_, 'd', (const void **) &coords, &ncoords) < 0)
+        return NULL;
+    if (ncoords / sizeof(double) < (size_t) ncmds * 6) {
+        PyErr_SetString(PyExc_IndexError, "array index out of range");
+        return NULL;
+    }
+    if (tolerance_ != Py_None) {
+        mode = FLATNESS;
+        precision = PyFloat_AsDouble(tolerance_);
+    } else if (precision_ != NULL && PyFloat_Check(precision_)) {
+        precision = PyFloat_AsDouble(precision_);
+    } else if (precision_ != NULL) {
+        mode = FIXED;
+        precision = PyFloat_AsDouble(precision_);
+    }
+    if (PyErr_Occurred())
+        return NULL;
+    contours = PyList_New(0);
+    if (contours == NULL)
+        return NULL;
+    for (i=0; i < ncmds; i++) {
+        c = coords + i*6;
+        if (cmds[i] == 0 || start) {
+            // MOVETO, or the first point in a path without MOVETO.
+            x0 = cx = lx = c[4];
+            y0 = cy = ly = c[5];
+            start = 0;
+            contour = _contour(contours, x0, y0);
+            if (contour == NULL)
+                goto error;
+            continue;
+        }
+        if (contour == NULL) {
+            // A new contour after CLOSE starts at the current point.
+            contour = _contour(contours, x0, y0);
+            if (contour == NULL)
+                goto error;
+            lx = x0; ly = y0;
+        }
+        if (cmds[i] == 1) {
+            // LINETO
+            if (c[4] != x0 || c[5] != y0) {
+                if (_append(contour, c[4], c[5]) < 0) 
+                    goto error;
+                lx = c[4]; ly = c[5];
+            }
+            x0 = c[4]; y0 = c[5];
+        } else if (cmds[i] == 2) {
+            // CURVETO
+            x1 = c[0]; y1 = c[1]; x2 = c[2]; y2 = c[3]; x3 = c[4]; y3 = c[5];
+            n = _segments(mode, precision, x0, y0, x1, y1, x2, y2, x3, y3);
+            if (n > 0) {
+                for (k=1; k <= n; k++) {
+                    t  = (double) k / n; 
+                    mt = 1 - t;
+                    b0 = mt*mt*mt; b1 = 3*t*mt*mt; b2 = 3*t*t*mt; b3 = t*t*t;
+                    lx = b0*x0 + b1*x1 + b2*x2 + b3*x3;
+                    ly = b0*y0 + b1*y1 + b2*y2 + b3*y3;
+                    if (_append(contour, lx, ly) < 0) 
+                        goto error;
+                }
+            } else if (x3 != x0 || y3 != y0) {
+                if (_append(contour, x3, y3) < 0) 
+                    goto error;
+                lx = x3; ly = y3;
+            }
+            x0 = x3; y0 = y3;
+        } else if (cmds[i] == 3) {
+            // CLOSE
+            if (lx != cx || ly != cy) {
+                if (_append(contour, cx, cy) < 0) 
+                    goto error;
+            }
+            x0 = cx; y0 = cy;
+            contour = NULL;
+        }
+    }
+    // Contours with a single point are omitted.
+    list = PyList_New(0);
+    for (i=0; list != NULL && i < PyList_GET_SIZE(contours); i++) {
+        contour = PyList_GET_ITEM(contours, i);
+        if (PyList_GET_SIZE(contour) > 1 && PyList_Append(list, contour) < 0) {
+            Py_DECREF(list);
+            list = NULL;
+        }
+    }
+    Py_DECREF(contours);
+    return list;
+error:
+    Py_DECREF(contours);
+    return NULL;
+}
+
 // ------------------------------------------------------------------------------
 
 static PyObject *BezierMathError;
@@ -147,6 +329,7 @@ static PyMethodDef bezier_methods[] = {
     { "linelength", linelength, METH_VARARGS },
     { "curvepoint", curvepoint, METH_VARARGS },
     { "curvelength", curvelength, METH_VARARGS },
+    { "flatten", (PyCFunction) flatten, METH_VARARGS | METH_KEYWORDS },
     { NULL, NULL }
 };
 
@@ -1,4 +1,6 @@
 #include <Python.h>
+#include <stdlib.h>
+#include <string.h>
 #include <math.h>
 
 // --- FAST INVERSE SQRT --------------------------------------------------------
@@ -84,6 +86,59 @@ void _mmult(double  a0, double  a1, double  a2, double  a3, double  a4, double
     *c8 = 1;
 }
 
+// --- SIMPLIFY -----------------------------------------------------------------
+// Ramer-Douglas-Peucker polyline simplification.
+// Marks the points to keep in the given array of n x, y coordinates.
+
+int _simplify(double *xy, int n, double tolerance, char *keep) {
+    int *stack, sp=0, i, j, k, m;
+    double x0, y0, dx, dy, d, px, py, v, vmax;
+    stack = (int *) malloc(2 * n * sizeof(int));
+    if (stack == NULL)
+        return 0;
+    memset(keep, 0, n);
+    keep[0] = keep[n-1] = 1;
+    stack[sp++] = 0;
+    stack[sp++] = n-1;
+    while (sp > 0) {
+        j = stack[--sp];
+        i = stack[--sp];
+        if (j - i < 2)
+            continue;
+        x0 = xy[i*2];
+        y0 = xy[i*2+1];
+        dx = xy[j*2] - x0;
+        dy = xy[j*2+1] - y0;
+        d  = dx*dx + dy*dy;
+        m  = i;
+        vmax = -1;
+        for (k=i+1; k < j; k++) {
+            px = xy[k*2] - x0;
+            py = xy[k*2+1] - y0;
+            if (d > 0) {
+                // Squared distance to the line.
+                v = (px*dy - py*dx);
+                v = v*v / d;
+            } else {
+                v = px*px + py*py;
+            }
+            if (v > vmax) {
+                m = k;
+                vmax = v;
+            }
+        }
+        if (vmax > tolerance * tolerance) {
+            keep[m] = 1;
+            stack[sp++] = i;
+            stack[sp++] = m;
+            stack[sp++] = m;
+            stack[sp++] = j;
+        }
+    }
+    free(stack);
+    return 1;
+}
+
 // ------------------------------------------------------------------------------
 
 static PyObject *
@@ -164,6 +219,69 @@ mmult(PyObject *self, PyObject *args) {
     return Py_BuildValue("ddddddddd", c0, c1, c2, c3, c4, c5, c6, c7, c8);
 }
 
+static PyObject *
+simplify(PyObject *self, PyObject *args) {
+    // Returns a list with the (x,y)-tuples to keep from the given list of (x,y)-tuples.
+    PyObject *points, *pt, *list;
+    double tolerance, *xy;
+    char *keep;
+    int n, i, ok;
+    if (!PyArg_ParseTuple(args, "Od", &points, &tolerance))
+        return NULL;
+    points = PySequence_Fast(points, "expected a list of (x,y)-tuples");
+    if (points == NULL)
+        return NULL;
+    n = PySequence_Fast_GET_SIZE(points);
+    if (n < 3) {
+        list = PySequence_List(points);
+        Py_DECREF(points);
+        return list;
+    }
+    xy   = (double *) malloc(n * 2 * sizeof(double));
+    keep = (char *) malloc(n);
+    if (xy == NULL || keep == NULL) {
+        free(xy); free(keep);
+        Py_DECREF(points);
+        return PyErr_NoMemory();
+    }
+    for (i=0; i < n; i++) {
+        pt = PySequence_Fast(PySequence_Fast_GET_ITEM(points, i), "expected a (x,y)-tuple");
+        if (pt == NULL || PySequence_Fast_GET_SIZE(pt) < 2) {
+            if (pt != NULL)
+                PyErr_SetString(PyExc_TypeError, "expected a (x,y)-tuple");
+            Py_XDECREF(pt);
+            free(xy); free(keep);
+            Py_DECREF(points);
+            return NULL;
+        }
+        xy[i*2+0] = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(pt, 0));
+        xy[i*2+1] = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(pt, 1));
+        Py_DECREF(pt);
+    }
+    if (PyErr_Occurred()) {
+        free(xy); free(keep);
+        Py_DECREF(points);
+        return NULL;
+    }
+    ok = _simplify(xy, n, tolerance, keep);
+    free(xy);
+    if (!ok) {
+        free(keep);
+        Py_DECREF(points);
+        return PyErr_NoMemory();
+    }
+    list = PyList_New(0);
+    for (i=0; list != NULL && i < n; i++) {
+        if (keep[i] && PyList_Append(list, PySequence_Fast_GET_ITEM(points, i)) < 0) {
+            Py_DECREF(list);
+            list = NULL;
+        }
+    }
+    free(keep);
+    Py_DECREF(points);
+    return list;
+}
+
 // ------------------------------------------------------------------------------
 
 static PyMethodDef geometry_methods[]={
@@ -175,6 +293,7 @@ static PyMethodDef geometry_methods[]={
     { "smoothstep", smoothstep, METH_VARARGS },
     { "superformula", superformula, METH_VARARGS },
     { "mmult", mmult, METH_VARARGS }, 
+    { "simplify", simplify, METH_VARARGS },
     { NULL, NULL }
 };
 
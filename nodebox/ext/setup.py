@@ -1,13 +1,14 @@
 from distutils.core import setup, Extension
 
-bezier   = Extension("bezier",   sources=["bezier.c"])
-geometry = Extension("geometry", sources=["geometry.c"])
-noise    = Extension("noise",    sources=["noise.c"])
+bezier      = Extension("bezier",      sources=["bezier.c"])
+geometry    = Extension("geometry",    sources=["geometry.c"])
+noise       = Extension("noise",       sources=["noise.c"])
+triangulate = Extension("triangulate", sources=["triangulate.c"])
 
 setup(
          name = "extensions",
       version = "1.0",
        author = "Tom De Smedt, Frederik De Bleser",
-  description = "Fast C Bezier, geometry and noise math.",
-  ext_modules = [bezier, geometry, noise]
+  description = "Fast C Bezier, geometry, noise math and triangulation.",
+  ext_modules = [bezier, geometry, noise, triangulate]
 )
\ No newline at end of file
@@ -0,0 +1,398 @@
+#include <Python.h>
+#include <stdlib.h>
+#include <math.h>
+
+// --- TRIANGULATE --------------------------------------------------------------
+// Triangulates a set of contours (polygons) with the nonzero (or even-odd) winding rule,
+// without using the GLU tessellator.
+// The plane is cut into horizontal slabs at each vertex.
+// Inside a slab, the edges do not start or end, so they can be sorted from left to right.
+// If two edges cross inside a slab, the slab is cut again at the crossing.
+// Walking the sorted edges and counting the winding number, each span that is inside
+// is a trapezoid. If a trapezoid starts where a trapezoid in the slab below ends
+// (same left and right x), it is added to the same region.
+// Each region is a y-monotone polygon, which is triangulated when it ends
+// (about one triangle per vertex).
+// This handles holes, overlapping contours and self-intersecting contours.
+
+typedef struct {
+    double xa, ya; // Bottom point.
+    double yb;     // Top point.
+    double dx;     // Slope, change of x for each change of y.
+    int dir;       // +1 if the contour goes up, -1 if it goes down.
+} Edge;
+
+typedef struct {
+    double *v;
+    int n, size;
+} Buffer;
+
+static int _push(Buffer *b, double x, double y) {
+    if (b->n + 2 > b->size) {
+        double *v;
+        b->size = b->size * 2 + 64;
+        v = (double *) realloc(b->v, b->size * sizeof(double));
+        if (v == NULL)
+            return 0;
+        b->v = v;
+    }
+    b->v[b->n++] = x;
+    b->v[b->n++] = y;
+    return 1;
+}
+
+static int _triangle(Buffer *b, double x0, double y0, double x1, double y1, double x2, double y2) {
+    // Degenerate triangles (no area) are omitted.
+    if (fabs((x1-x0) * (y2-y0) - (x2-x0) * (y1-y0)) < 1e-12)
+        return 1;
+    return _push(b, x0, y0) && _push(b, x1, y1) && _push(b, x2, y2);
+}
+
+static int _cmp_double(const void *a, const void *b) {
+    double d = *(const double *) a - *(const double *) b;
+    return (d > 0) - (d < 0);
+}
+
+static int _cmp_edge(const void *a, const void *b) {
+    double d = ((const Edge *) a)->ya - ((const Edge *) b)->ya;
+    return (d > 0) - (d < 0);
+}
+
+// Edges in a slab are sorted by x at the bottom, then by x at the top (qsort has no context argument).
+static double *_xb, *_xt, _eps;
+
+static int _cmp_active(const void *a, const void *b) {
+    int i = *(const int *) a;
+    int j = *(const int *) b;
+    double d = _xb[i] - _xb[j];
+    if (fabs(d) <= _eps)
+        d = _xt[i] - _xt[j];
+    return (d > 0) - (d < 0);
+}
+
+// A region is a y-monotone polygon with a left and a right chain of points (bottom to top).
+// Its top is the span between xl and xr, bounded by the edges le and re.
+typedef struct {
+    double xl, xr;
+    int le, re;
+    Buffer left, right;
+} Region;
+
+static int _monotone(Buffer *left, Buffer *right, double eps, Buffer *out) {
+    // Triangulates the y-monotone polygon with the given left and right chains.
+    // The vertices are visited from bottom to top. Vertices that can't be connected yet
+    // (reflex vertices) are kept on a stack, which always forms a chain on one side.
+    int nl = left->n / 2, nr = right->n / 2, i, j, k, n=0, ns, a, last, ok=1;
+    int *side, *stack;
+    double *L = left->v, *R = right->v, *v, c;
+    j = fabs(L[0] - R[0]) <= eps ? 1 : 0; // Shared bottom point.
+    if (fabs(L[nl*2-2] - R[nr*2-2]) <= eps) // Shared top point.
+        nl--;
+    v     = (double *) malloc((nl+nr+1) * 2 * sizeof(double));
+    side  = (int *) malloc((nl+nr+1) * sizeof(int));
+    stack = (int *) malloc((nl+nr+1) * sizeof(int));
+    if (!v || !side || !stack) {
+        free(v); free(side); free(stack);
+        return 0;
+    }
+    // Merge the chains, sorted by y.
+    i = 0;
+    while (i < nl || j < nr) {
+        if (j == nr || (i < nl && L[i*2+1] <= R[j*2+1])) {
+            v[n*2] = L[i*2]; v[n*2+1] = L[i*2+1]; side[n++] = 0; i++;
+        } else {
+            v[n*2] = R[j*2]; v[n*2+1] = R[j*2+1]; side[n++] = 1; j++;
+        }
+    }
+    #define _V(i) v[(i)*2], v[(i)*2+1]
+    if (n >= 3) {
+        stack[0] = 0;
+        stack[1] = 1;
+        ns = 2;
+        for (k=2; k < n-1 && ok; k++) {
+            if (side[k] != side[stack[ns-1]]) {
+                // Opposite side: connect to all the vertices on the stack.
+                for (i=0; i < ns-1 && ok; i++)
+                    ok = _triangle(out, _V(k), _V(stack[i]), _V(stack[i+1]));
+                stack[0] = stack[ns-1];
+                stack[1] = k;
+                ns = 2;
+            } else {
+                // Same side: connect to the vertices on the stack as long as the diagonal is inside.
+                last = stack[--ns];
+                while (ns > 0 && ok) {
+                    a = stack[ns-1];
+                    c = (v[k*2]-v[a*2]) * (v[last*2+1]-v[a*2+1]) - (v[k*2+1]-v[a*2+1]) * (v[last*2]-v[a*2]);
+                    if ((side[k] == 0 && c > 0) || (side[k] == 1 && c < 0)) {
+                        ok = _triangle(out, _V(k), _V(last), _V(a));
+                        last = stack[--ns];
+                    } else {
+                        break;
+                    }
+                }
+                stack[ns++] = last;
+                stack[ns++] = k;
+            }
+        }
+        for (i=0; i < ns-1 && ok; i++)
+            ok = _triangle(out, _V(n-1), _V(stack[i]), _V(stack[i+1]));
+    }
+    #undef _V
+    free(v); free(side); free(stack);
+    return ok;
+}
+
+static int _close(Region *r, double eps, Buffer *out) {
+    // Triangulates the given region and frees its chains.
+    int ok = _monotone(&r->left, &r->right, eps, out);
+    free(r->left.v);
+    free(r->right.v);
+    return ok;
+}
+
+static int _extend(Buffer *chain, int same, double x, double y) {
+    // Moves the top point of the chain up along the same edge, or adds a new point.
+    if (same) {
+        chain->v[chain->n-2] = x;
+        chain->v[chain->n-1] = y;
+        return 1;
+    }
+    return _push(chain, x, y);
+}
+
+int _triangulate(Edge *edges, int n, double *ys, int m, int nonzero, Buffer *out) {
+    int *active, *order, na=0, e=0, s, i, j, k, w, inside, start, ok=1;
+    int np=0, nr=0, p;
+    double *xb, *xt, y0, y1, yc, y, ylo, lb, lt, rb, rt;
+    Region *pending, *regions, *tmp, *r;
+    active  = (int *) malloc((n+1) * sizeof(int));
+    order   = (int *) malloc((n+1) * sizeof(int));
+    xb      = (double *) malloc((n+1) * sizeof(double));
+    xt      = (double *) malloc((n+1) * sizeof(double));
+    pending = (Region *) malloc((n+1) * sizeof(Region)); // Regions that end at the bottom of the slab.
+    regions = (Region *) malloc((n+1) * sizeof(Region)); // Regions in the slab.
+    if (!active || !order || !xb || !xt || !pending || !regions) {
+        free(active); free(order); free(xb); free(xt); free(pending); free(regions);
+        return 0;
+    }
+    _eps = 1e-9 * (1 + fabs(ys[0]) + fabs(ys[m-1]));
+    for (s=0; s < m-1 && ok; s++) {
+        y0 = ys[s];
+        y1 = ys[s+1];
+        // Remove the edges that end below the slab, add the edges that start in it.
+        for (i=0, j=0; i < na; i++) {
+            if (edges[active[i]].yb > y0)
+                active[j++] = active[i];
+        }
+        na = j;
+        while (e < n && edges[e].ya <= y0) {
+            if (edges[e].yb > y0)
+                active[na++] = e;
+            e++;
+        }
+        if (na < 2) {
+            for (i=0; i < np; i++)
+                ok = _close(&pending[i], _eps, out) && ok;
+            np = 0;
+            continue;
+        }
+        ylo = y0;
+        while (ylo < y1 && ok) {
+            // Sort the edges from left to right.
+            for (i=0; i < na; i++) {
+                k = active[i];
+                order[i] = i;
+                xb[i] = edges[k].xa + (ylo - edges[k].ya) * edges[k].dx;
+                xt[i] = edges[k].xa + (y1  - edges[k].ya) * edges[k].dx;
+            }
+            _xb = xb; _xt = xt;
+            qsort(order, na, sizeof(int), _cmp_active);
+            // Find the first crossing of two neighboring edges.
+            yc = y1;
+            for (i=0; i < na-1; i++) {
+                j = order[i];
+                k = order[i+1];
+                if (xt[j] > xt[k] + _eps) {
+                    y = ylo + (xb[k] - xb[j]) / (edges[active[j]].dx - edges[active[k]].dx);
+                    if (y > ylo + _eps && y < yc)
+                        yc = y;
+                }
+            }
+            if (yc < y1) {
+                for (i=0; i < na; i++) {
+                    k = active[i];
+                    xt[i] = edges[k].xa + (yc - edges[k].ya) * edges[k].dx;
+                }
+            }
+            // Add each span inside the polygon to a region.
+            w = 0;
+            p = 0;
+            nr = 0;
+            start = -1;
+            for (i=0; i < na && ok; i++) {
+                k = order[i];
+                w += edges[active[k]].dir;
+                inside = nonzero ? (w != 0) : (w & 1);
+                if (inside && start < 0) {
+                    start = k;
+                } else if (!inside && start >= 0) {
+                    lb = xb[start]; lt = xt[start];
+                    rb = xb[k];     rt = xt[k];
+                    j = start;
+                    start = -1;
+                    if (rb - lb <= _eps && rt - lt <= _eps)
+                        continue;
+                    while (p < np && pending[p].xl < lb - _eps)
+                        ok = _close(&pending[p++], _eps, out) && ok;
+                    if (p < np 
+                     && fabs(pending[p].xl - lb) <= _eps 
+                     && fabs(pending[p].xr - rb) <= _eps && rb - lb > _eps) {
+                        r = &regions[nr++];
+                        *r = pending[p++];
+                        ok = _extend(&r->left,  r->le == active[j], lt, yc) && ok;
+                        ok = _extend(&r->right, r->re == active[k], rt, yc) && ok;
+                    } else {
+                        r = &regions[nr++];
+                        r->left.v  = NULL; r->left.n  = 0; r->left.size  = 0;
+                        r->right.v = NULL; r->right.n = 0; r->right.size = 0;
+                        ok = _push(&r->left,  lb, ylo) && _push(&r->left,  lt, yc)
+                          && _push(&r->right, rb, ylo) && _push(&r->right, rt, yc) && ok;
+                    }
+                    r->xl = lt;
+                    r->xr = rt;
+                    r->le = active[j];
+                    r->re = active[k];
+                }
+            }
+            for (; p < np; p++)
+                ok = _close(&pending[p], _eps, out) && ok;
+            tmp = pending; pending = regions; regions = tmp;
+            np = nr;
+            ylo = yc;
+        }
+    }
+    for (i=0; i < np; i++)
+        ok = _close(&pending[i], _eps, out) && ok;
+    free(active); free(order); free(xb); free(xt); free(pending); free(regions);
+    return ok;
+}
+
+// ------------------------------------------------------------------------------
+
+static PyObject *
+triangulate(PyObject *self, PyObject *args) {
+    PyObject *contours, *contour, *pt, *list;
+    Edge *edges;
+    Buffer out = { NULL, 0, 0 };
+    double *ys, *xy, x0, y0, x1, y1;
+    int nonzero=1, n=0, m=0, size=0, i, j, k, ok;
+    if (!PyArg_ParseTuple(args, "O|i", &contours, &nonzero))
+        return NULL;
+    contours = PySequence_Fast(contours, "expected a list of contours");
+    if (contours == NULL)
+        return NULL;
+    for (i=0; i < PySequence_Fast_GET_SIZE(contours); i++) {
+        k = PySequence_Size(PySequence_Fast_GET_ITEM(contours, i));
+        if (k < 0) {
+            Py_DECREF(contours);
+            return NULL;
+        }
+        size += k;
+    }
+    edges = (Edge *) malloc((size+1) * sizeof(Edge));
+    ys = (double *) malloc((size+1) * sizeof(double));
+    xy = (double *) malloc((size+1) * 2 * sizeof(double));
+    if (!edges || !ys || !xy) {
+        free(edges); free(ys); free(xy);
+        Py_DECREF(contours);
+        return PyErr_NoMemory();
+    }
+    for (i=0; i < PySequence_Fast_GET_SIZE(contours); i++) {
+        contour = PySequence_Fast(PySequence_Fast_GET_ITEM(contours, i), "expected a list of points");
+        if (contour == NULL)
+            goto error;
+        // Read the (x,y)-tuples of the contour.
+        k = PySequence_Fast_GET_SIZE(contour);
+        for (j=0; j < k; j++) {
+            pt = PySequence_Fast(PySequence_Fast_GET_ITEM(contour, j), "expected a (x,y)-tuple");
+            if (pt == NULL || PySequence_Fast_GET_SIZE(pt) < 2) {
+                Py_XDECREF(pt);
+                Py_DECREF(contour);
+                goto error;
+            }
+            xy[j*2+0] = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(pt, 0));
+            xy[j*2+1] = PyFloat_AsDouble(PySequence_Fast_GET_ITEM(pt, 1));
+            Py_DECREF(pt);
+        }
+        Py_DECREF(contour);
+        if (PyErr_Occurred())
+            goto error;
+        // Each contour is closed: the last point connects to the first.
+        for (j=0; j < k; j++) {
+            x0 = xy[((j+k-1) % k) * 2 + 0];
+            y0 = xy[((j+k-1) % k) * 2 + 1];
+            x1 = xy[j*2+0];
+            y1 = xy[j*2+1];
+            ys[m++] = y1;
+            if (y0 == y1) // Horizontal edges are never crossed.
+                continue;
+            if (y0 < y1) {
+                edges[n].xa = x0; edges[n].ya = y0; edges[n].yb = y1; edges[n].dir = +1;
+            } else {
+                edges[n].xa = x1; edges[n].ya = y1; edges[n].yb = y0; edges[n].dir = -1;
+            }
+            edges[n].dx = (x1-x0) / (y1-y0);
+            n++;
+        }
+    }
+    Py_DECREF(contours);
+    contours = NULL;
+    ok = 1;
+    if (n > 1) {
+        // Sort the edges from bottom to top, and the slab boundaries (unique).
+        qsort(edges, n, sizeof(Edge), _cmp_edge);
+        qsort(ys, m, sizeof(double), _cmp_double);
+        for (i=1, j=1; i < m; i++) {
+            if (ys[i] != ys[j-1])
+                ys[j++] = ys[i];
+        }
+        ok = _triangulate(edges, n, ys, j, nonzero, &out);
+    }
+    free(edges); free(ys); free(xy);
+    if (!ok) {
+        free(out.v);
+        return PyErr_NoMemory();
+    }
+    // Return a flat list of x, y coordinates (three vertices per triangle).
+    list = PyList_New(out.n);
+    if (list != NULL) {
+        for (i=0; i < out.n; i++) {
+            PyList_SET_ITEM(list, i, PyFloat_FromDouble(out.v[i]));
+        }
+    }
+    free(out.v);
+    return list;
+error:
+    free(edges); free(ys); free(xy);
+    Py_XDECREF(contours);
+    return NULL;
+}
+
+// ------------------------------------------------------------------------------
+
+static PyMethodDef triangulate_methods[]={
+    { "triangulate", triangulate, METH_VARARGS },
+    { NULL, NULL }
+};
+
+PyMODINIT_FUNC inittriangulate(void){
+    PyObject *m;
+    m = Py_InitModule("triangulate", triangulate_methods);
+}
+
+int main(int argc, char *argv[]) {
+    Py_SetProgramName(argv[0]);
+    Py_Initialize();
+    inittriangulate();
+    return 0;
+}
@@ -84,6 +84,10 @@ f = open("glyph.p","w")
 cPickle.dump(glyphs, f)
 f.close()
 
+# NodeBox for OpenGL reads the glyphs from a compact binary file, glyph.bin.
+# Convert glyph.p to glyph.bin with:
+# > python nodebox/graphics/glyphstore.py nodebox/font/glyph.p nodebox/font/glyph.bin
+
 #=====================================================================================================
 # For testing purposes:
 
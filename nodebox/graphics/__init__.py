@@ -9,6 +9,7 @@ from context import *
 
 physics.line    = context.line
 physics.ellipse = context.ellipse
+physics.ellipses = context.ellipses
 physics.Text    = context.Text
 
 #-----------------------------------------------------------------------------------------------------
@@ -7,8 +7,11 @@
 
 # Thanks to Prof. F. De Smedt at the Vrije Universiteit Brussel.
 
-from context import BezierPath, PathElement, PathError, Point, MOVETO, LINETO, CURVETO, CLOSE
-from math import sqrt, pow
+from context import BezierPath, PathElement, PathError, Point
+from context import MOVETO, LINETO, CURVETO, CLOSE
+from math import sqrt, pow, ceil
+from array import array
+from bisect import bisect_left
 
 class DynamicPathElement(PathElement):
     # Not a "fixed" point in the BezierPath, but calculated with BezierPath.point().
@@ -217,6 +220,312 @@ def points(path, amount=100, start=0.0, end=1.0, segments=None):
     for i in xrange(amount):
         yield point(path, start+d*i, segments)
 
+#--- BEZIER PATH ARC LENGTH --------------------------------------------------------------------------
+# For long paths, point() is slow because _locate() walks the list of segment lengths for each t.
+# The arc-length table stores the cumulative length of the path at a number of samples:
+# one for each line and n for each curve (i.e., the curve is measured with n straight lines).
+# The sample that contains t can then be found with a binary search,
+# and the samples for a list of ascending t are found in a single pass.
+# Inside a sample, the curve time is interpolated linearly,
+# so that the points on a curve are (nearly) evenly distributed.
+
+def arclength(cmds, coords, n=10):
+    """ Returns the arc-length table for the packed path (see pack()), a (lengths, samples, segments)-tuple:
+        - lengths : an array with the cumulative length at the end of each sample, starting with 0.0,
+        - samples : a list of (t0, t1, segment)-tuples, with the time on the segment at the start and end,
+        - segments: a list of (i, cmd, x0, y0, x1, y1, x2, y2, x3, y3)-tuples, where i is the index 
+                    of the PathElement at the end of the segment and cmd is LINETO (1) or CURVETO (2).
+        A CLOSE is a LINETO segment. Samples with zero length are omitted.
+    """
+    lengths, samples, segments = array("d", [0.0]), [], []
+    x0 = y0 = closeto = None
+    d = 0.0
+    for i in xrange(len(cmds)):
+        cmd, j = cmds[i], i*6
+        if cmd == 0 or x0 is None: # MOVETO, or the first point in a path without MOVETO.
+            x0, y0 = closeto = coords[j+4], coords[j+5]
+            continue
+        if cmd == 1 or cmd == 3: # LINETO, CLOSE
+            x3, y3 = cmd == 1 and (coords[j+4], coords[j+5]) or closeto
+            s = (i, 1, x0, y0, x0, y0, x3, y3, x3, y3)
+            l = sqrt((x3-x0)**2 + (y3-y0)**2)
+            if l > 0:
+                d += l
+                lengths.append(d)
+                samples.append((0.0, 1.0, s))
+        elif cmd == 2: # CURVETO
+            x1, y1, x2, y2, x3, y3 = coords[j:j+6]
+            s = (i, 2, x0, y0, x1, y1, x2, y2, x3, y3)
+            xa, ya, t0, k = x0, y0, 0.0, 0
+            for b0, b1, b2, b3 in bernstein(n):
+                k += 1
+                xb = b0*x0 + b1*x1 + b2*x2 + b3*x3
+                yb = b0*y0 + b1*y1 + b2*y2 + b3*y3
+                l = sqrt((xb-xa)**2 + (yb-ya)**2)
+                if l > 0:
+                    d += l
+                    lengths.append(d)
+                    samples.append((t0, float(k) / n, s))
+                    t0 = float(k) / n
+                xa, ya = xb, yb
+        segments.append(s)
+        x0, y0 = x3, y3
+    return lengths, samples, segments
+
+def _arcsample(lengths, samples, k, d):
+    # Returns the segment and the time on the segment for distance d, in the k-th sample.
+    t0, t1, s = samples[k-1]
+    a = lengths[k-1]
+    return s, t0 + (t1-t0) * min(1.0, (d-a) / (lengths[k]-a))
+
+def arclocate(table, t):
+    """ Returns a (segment, t)-tuple for the relative t (0.0-1.0) on the path, 
+        where the returned t is the time on the segment (see arclength()).
+    """
+    lengths, samples, segments = table
+    if len(samples) == 0:
+        raise PathError, "The given path has no length"
+    d = lengths[-1] * max(0.0, min(t, 1.0))
+    k = max(1, min(bisect_left(lengths, d, 1), len(samples)))
+    return _arcsample(lengths, samples, k, d)
+
+def arclocate_all(table, amount=100, start=0.0, end=1.0):
+    """ Returns an iterator of (segment, t)-tuples for the given amount of points (see points()).
+        All the points are located in a single pass over the arc-length table.
+    """
+    lengths, samples, segments = table
+    if len(samples) == 0:
+        raise PathError, "The given path has no length"
+    d = end - start
+    if amount > 1: 
+        d = float(d) / (amount-1)
+    n = len(samples)
+    k = 1
+    for i in xrange(amount):
+        t = lengths[-1] * max(0.0, min(start+d*i, 1.0))
+        if lengths[k-1] > t:
+            # Descending, e.g. when start > end.
+            k = max(1, bisect_left(lengths, t, 1))
+        while k < n and lengths[k] < t:
+            k += 1
+        yield _arcsample(lengths, samples, k, t)
+
+def _segmentpoint(segment, t):
+    # Returns the DynamicPathElement at time t on the given segment (see point()).
+    i, cmd, x0, y0, x1, y1, x2, y2, x3, y3 = segment
+    if cmd == 1:
+        return DynamicPathElement(LINETO, ((x0 + t*(x3-x0), y0 + t*(y3-y0)),))
+    x, y, c1x, c1y, c2x, c2y = curvepoint(t, x0, y0, x1, y1, x2, y2, x3, y3)
+    return DynamicPathElement(CURVETO, ((c1x, c1y), (c2x, c2y), (x, y)))
+
+def arcpoint(table, t):
+    """ Returns the DynamicPathElement at t on the path, using the given arc-length table.
+    """
+    return _segmentpoint(*arclocate(table, t))
+
+def arcpoints(table, amount=100, start=0.0, end=1.0):
+    """ Returns an iterator of DynamicPathElements along the path, using the given arc-length table.
+    """
+    for s, t in arclocate_all(table, amount, start, end):
+        yield _segmentpoint(s, t)
+
+def arcpoints_array(table, amount=100, start=0.0, end=1.0):
+    """ Returns an array of x, y coordinates of points along the path, using the given arc-length table.
+        This is faster than arcpoints() since no DynamicPathElement objects are created.
+    """
+    a = array("d")
+    for (i, cmd, x0, y0, x1, y1, x2, y2, x3, y3), t in arclocate_all(table, amount, start, end):
+        mt = 1 - t
+        if cmd == 1:
+            a.append(x0*mt + x3*t)
+            a.append(y0*mt + y3*t)
+        else:
+            b0, b1, b2, b3 = mt*mt*mt, 3*t*mt*mt, 3*t*t*mt, t*t*t
+            a.append(b0*x0 + b1*x1 + b2*x2 + b3*x3)
+            a.append(b0*y0 + b1*y1 + b2*y2 + b3*y3)
+    return a
+
+#--- BEZIER PATH FLATTENING --------------------------------------------------------------------------
+# A path is drawn as a number of straight lines.
+# The points on a curve are calculated with the Bernstein polynomials:
+# B(t) = (1-t)^3 * P0 + 3t(1-t)^2 * P1 + 3t^2(1-t) * P2 + t^3 * P3.
+# For n line segments, the coefficients for t = 1/n, 2/n, ..., 1 are calculated once,
+# so that each point takes only a few multiplications (no function calls).
+
+_bernstein = {}
+
+def bernstein(n):
+    """ Returns a list of (b0, b1, b2, b3)-tuples, the Bernstein coefficients for t = 1/n, 2/n, ..., 1.
+    """
+    b = _bernstein.get(n)
+    if b is None:
+        b = []
+        for i in xrange(1, n+1):
+            t = float(i) / n; mt = 1 - t
+            b.append((mt*mt*mt, 3*t*mt*mt, 3*t*t*mt, t*t*t))
+        if n <= 1024:
+            _bernstein[n] = b
+    return b
+
+def pack(path):
+    """ Returns a (commands, coordinates)-tuple of arrays for the given BezierPath (see PackedPath).
+    """
+    if hasattr(path, "_cmds"):
+        return path._cmds, path._coords
+    packed = {MOVETO: 0, LINETO: 1, CURVETO: 2, CLOSE: 3}
+    cmds, coords = array("B"), array("d")
+    try:
+        # Reading the attributes directly is a lot faster than the properties.
+        cmds.fromlist([packed[pt._cmd] for pt in path])
+        coords.fromlist([v for pt in path for v in (
+            pt._ctrl1._x, pt._ctrl1._y, pt._ctrl2._x, pt._ctrl2._y, pt._x, pt._y)])
+    except AttributeError:
+        cmds, coords = array("B"), array("d")
+        for pt in path:
+            h1, h2 = pt.ctrl1, pt.ctrl2
+            cmds.append(packed[pt.cmd])
+            coords.extend((h1.x, h1.y, h2.x, h2.y, pt.x, pt.y))
+    return cmds, coords
+
+def flatten(cmds, coords, precision=0.2, tolerance=None):
+    """ Returns a list of contours for the packed path, where each contour is a list of (x,y)-tuples.
+        Successive points in a contour are connected with a straight line (i.e., a line strip).
+        The precision is the number of lines per curve (int) or relative to the curve length (float).
+        With a given tolerance, the number of lines is such that no point on the curve
+        deviates more than the tolerance from the lines.
+    """
+    contours = []
+    contour = None
+    x0, y0 = None, None
+    closeto = None
+    for i in xrange(len(cmds)):
+        cmd, j = cmds[i], i*6
+        if cmd == 0 or x0 is None: # MOVETO, or the first point in a path without MOVETO.
+            x0, y0 = closeto = coords[j+4], coords[j+5]
+            contour = [closeto]
+            contours.append(contour)
+            continue
+        if contour is None:
+            # A new contour after CLOSE starts at the current point.
+            contour = [(x0, y0)]
+            contours.append(contour)
+        if cmd == 1: # LINETO
+            x, y = coords[j+4], coords[j+5]
+            if x != x0 or y != y0:
+                contour.append((x, y))
+            x0, y0 = x, y
+        elif cmd == 2: # CURVETO
+            x1, y1, x2, y2, x3, y3 = coords[j:j+6]
+            if tolerance is not None:
+                # The maximum distance between a cubic curve and n lines is 
+                # 3/4 * max(|P0-2*P1+P2|, |P1-2*P2+P3|) / n^2.
+                d = sqrt(max((x0-2*x1+x2)**2 + (y0-2*y1+y2)**2, (x1-2*x2+x3)**2 + (y1-2*y2+y3)**2))
+                n = int(ceil(sqrt(0.75 * d / max(tolerance, 1e-6))))
+            elif isinstance(precision, float):
+                # The curve length is about halfway between the chord and the control polygon length.
+                n = int(max(0, precision) * 0.5 * (
+                    sqrt((x3-x0)**2 + (y3-y0)**2) + 
+                    sqrt((x1-x0)**2 + (y1-y0)**2) + 
+                    sqrt((x2-x1)**2 + (y2-y1)**2) + 
+                    sqrt((x3-x2)**2 + (y3-y2)**2)))
+            else:
+                n = int(max(0, precision))
+            if n > 0:
+                contour.extend([(
+                    b0*x0 + b1*x1 + b2*x2 + b3*x3, 
+                    b0*y0 + b1*y1 + b2*y2 + b3*y3) for b0, b1, b2, b3 in bernstein(n)])
+            elif x3 != x0 or y3 != y0:
+                contour.append((x3, y3))
+            x0, y0 = x3, y3
+        elif cmd == 3 and closeto is not None: # CLOSE
+            if contour[-1] != closeto:
+                contour.append(closeto)
+            x0, y0 = closeto
+            contour = None
+    return [contour for contour in contours if len(contour) > 1]
+
+_py_flatten = flatten
+
+# Fast C implementation (about 10x faster, with the same results):
+try: from nodebox.ext.bezier import flatten
+except:
+    pass
+
+#--- BEZIER PATH BOUNDS ------------------------------------------------------------------------------
+# The bounding box of a curve includes its start and end point, and the points where it turns,
+# i.e. where the derivative (a quadratic polynomial in t) is zero for x or for y:
+# B'(t) = 3 * ((-P0 + 3*P1 - 3*P2 + P3) * t^2 + 2 * (P0 - 2*P1 + P2) * t + (P1 - P0)).
+
+def _extrema(p0, p1, p2, p3):
+    """ Returns a list of values at the extrema of the given cubic polynomial, for t between 0.0 and 1.0.
+    """
+    a = -p0 + 3*p1 - 3*p2 + p3
+    b = 2 * (p0 - 2*p1 + p2)
+    c = p1 - p0
+    if abs(a) < 1e-12:
+        if abs(b) < 1e-12:
+            return []
+        roots = (-c / b,)
+    else:
+        d = b*b - 4*a*c
+        if d < 0:
+            return []
+        d = sqrt(d)
+        roots = ((-b + d) / (2*a), (-b - d) / (2*a))
+    v = []
+    for t in roots:
+        if 0 < t < 1:
+            mt = 1 - t
+            v.append(mt*mt*mt*p0 + 3*t*mt*mt*p1 + 3*t*t*mt*p2 + t*t*t*p3)
+    return v
+
+def bounds(cmds, coords):
+    """ Returns a list of (x, y, width, height)-tuples for the packed path (see pack()), 
+        the exact bounding box of each contour (contours without lines or curves are omitted).
+    """
+    bounds = []
+    contour = False
+    x0 = y0 = closeto = None
+    for i in xrange(len(cmds)):
+        cmd, j = cmds[i], i*6
+        if cmd == 0 or x0 is None: # MOVETO, or the first point in a path without MOVETO.
+            if contour:
+                bounds.append((l, t, r-l, b-t))
+            x0, y0 = closeto = coords[j+4], coords[j+5]
+            contour = False
+            continue
+        if cmd == 3: # CLOSE
+            if contour:
+                bounds.append((l, t, r-l, b-t))
+            x0, y0 = closeto
+            contour = False
+            continue
+        if not contour:
+            # The first line or curve in a contour.
+            l = r = x0
+            t = b = y0
+            contour = True
+        x, y = coords[j+4], coords[j+5]
+        if x < l: l = x
+        if x > r: r = x
+        if y < t: t = y
+        if y > b: b = y
+        if cmd == 2: # CURVETO
+            # If the control points are inside the bounds, so is the curve.
+            x1, y1, x2, y2 = coords[j:j+4]
+            if not (l <= x1 <= r and l <= x2 <= r):
+                for v in _extrema(x0, x1, x2, x):
+                    if v < l: l = v
+                    if v > r: r = v
+            if not (t <= y1 <= b and t <= y2 <= b):
+                for v in _extrema(y0, y1, y2, y):
+                    if v < t: t = v
+                    if v > b: b = v
+        x0, y0 = x, y
+    if contour:
+        bounds.append((l, t, r-l, b-t))
+    return bounds
+
 #--- BEZIER PATH CONTOURS ----------------------------------------------------------------------------
 
 def contours(path):
@@ -321,14 +630,20 @@ def findpath(points, curvature=1.0):
 
 #--- BEZIER PATH INSERT POINT ------------------------------------------------------------------------
 
-def insert_point(path, t):
+def insert_point(path, t, table=None):
     """ Inserts an extra point at t.
+        With a given arc-length table (see arclength()), t is located in the same way as in arcpoint().
     """
     
     # Find the points before and after t on the path.
-    i, t, closeto = _locate(path, t)
-    x0 = path[i].x
-    y0 = path[i].y
+    if table is not None:
+        s, t = arclocate(table, t)
+        i, x0, y0 = s[0]-1, s[2], s[3]
+        closeto = Point(s[8], s[9])
+    else:
+        i, t, closeto = _locate(path, t)
+        x0 = path[i].x
+        y0 = path[i].y
     p1 = path[i+1]
     p1cmd, x3, y3, x1, y1, x2, y2 = p1.cmd, p1.x, p1.y, p1.ctrl1.x, p1.ctrl1.y, p1.ctrl2.x, p1.ctrl2.y
     
@@ -14,7 +14,7 @@ pyglet.options['debug_gl'] = False
 
 from pyglet.gl    import *
 from pyglet.image import Texture
-from math         import cos, sin, radians, pi, floor
+from math         import cos, sin, radians, pi, floor, sqrt, log
 from time         import time
 from random       import seed, choice, shuffle, random as rnd
 from new          import instancemethod
@@ -26,8 +26,13 @@ from hashlib      import md5
 from types        import FunctionType
 from datetime     import datetime
 from numbers      import Number
+from array        import array
+from ctypes       import byref
 
 import geometry
+import diskcache
+import glyphstore
+import truetype
 
 #import bezier
 # Do this at the end, when we have defined BezierPath, which is needed in the bezier module.
@@ -43,12 +48,20 @@ OPENGL = pyglet.gl.gl_info.get_version()
 #--- CACHING -----------------------------------------------------------------------------------------
 # OpenGL Display Lists offer a simple way to precompile batches of OpenGL commands.
 # The drawback is that the commands, once compiled, can't be modified.
+# Vertex Buffer Objects (VBO) store vertices in graphics memory, and draw them with one command.
+# Vertex buffers are kept in a cache with a maximum size (GEOMETRY_CACHE, in bytes).
+# When the cache is full, the least recently used buffer is removed from graphics memory.
+# Its vertices are kept, and uploaded again the next time it is drawn.
 
 def precompile(function, *args, **kwargs):
     """ Creates an OpenGL Display List from the OpenGL commands in the given function.
         A Display List will precompile the commands and (if possible) store them in graphics memory.
         Returns an id which can be used with precompiled() to execute the cached commands.
+        Alternatively, precompile(vertices, mode=GL_TRIANGLES, texcoords=None)
+        creates a VertexBuffer from a list of x, y coordinates.
     """
+    if not callable(function):
+        return VertexBuffer(function, *args, **kwargs)
     id = glGenLists(1)
     glNewList(id, GL_COMPILE)
     function(*args, **kwargs)
@@ -56,16 +69,391 @@ def precompile(function, *args, **kwargs):
     return id
         
 def precompiled(id):
-    """ Executes the Display List program with the given id.
+    """ Executes the Display List program (or draws the VertexBuffer) with the given id.
     """
-    glCallList(id)
+    if isinstance(id, VertexBuffer):
+        id.draw()
+    else:
+        glCallList(id)
         
 def flush(id):
-    """ Removes the Display List program with the given id from memory.
+    """ Removes the Display List program (or VertexBuffer) with the given id from memory.
     """
-    if id is not None:
+    if isinstance(id, VertexBuffer):
+        id.delete()
+    elif id is not None:
         glDeleteLists(id, 1)
 
+# Maximum size in bytes of the vertex buffers in graphics memory.
+GEOMETRY_CACHE = 32 * 1024 * 1024
+
+def _vbo_delete(vertices, (id, nbytes)):
+    # Removes the buffer from graphics memory (called when the cache discards a VertexBuffer).
+    glDeleteBuffers(1, byref(GLuint(id)))
+
+# VertexBuffer => (buffer id, size in bytes).
+_vertex_buffers = geometry.lrucache("geometry", 
+    bytes = GEOMETRY_CACHE, 
+   sizeof = lambda v: v[1], 
+    evict = _vbo_delete)
+
+cache_stats = geometry.cache_stats
+cache_limit = geometry.cache_limit
+
+def geometry_cache(size=None):
+    """ Returns the cache of vertex buffers in graphics memory, an LRUCache
+        with hits, misses and evictions counters and the total size in bytes (LRUCache.nbytes).
+        Sets the maximum size in bytes, if given.
+    """
+    if size is not None:
+        _vertex_buffers.bytes = size
+        _vertex_buffers.trim()
+    return _vertex_buffers
+
+# Flattened and tessellated paths can also be stored in a file (see diskcache.py),
+# so that they are loaded instead of calculated the next time the application starts.
+_disk_cache = None
+
+def disk_cache(enabled=None, path=None, size=None):
+    """ Returns the cache of path vertices on disk (a DiskCache), or None if it is disabled.
+        With enabled=True, the vertices of paths drawn with BezierPath.draw() are stored in a file
+        (by default, in the user's cache folder), and loaded from it the next time.
+        The size sets the maximum file size in bytes.
+    """
+    global _disk_cache
+    if enabled is False and _disk_cache is not None:
+        _disk_cache.close()
+        _disk_cache = None
+    if enabled is True and (_disk_cache is None or path is not None and path != _disk_cache.path):
+        if _disk_cache is not None:
+            _disk_cache.close()
+        _disk_cache = diskcache.DiskCache(path)
+    if size is not None and _disk_cache is not None:
+        _disk_cache.bytes = size
+    return _disk_cache
+
+class VertexBuffer(object):
+
+    def __init__(self, vertices, mode=GL_TRIANGLES, texcoords=None):
+        """ A list of x, y coordinates drawn with the given mode (GL_TRIANGLES, GL_LINES, ...).
+            The optional texcoords is a list of s, t, r texture coordinates (one per vertex).
+            The vertices are uploaded to graphics memory the first time they are drawn.
+        """
+        self.mode      = mode
+        self.vertices  = array("f", vertices)
+        self.texcoords = texcoords is not None and array("f", texcoords) or None
+        self.nbytes    = self.vertices.itemsize * (len(self.vertices) + len(self.texcoords or ()))
+
+    def __len__(self):
+        return len(self.vertices) / 2
+
+    def _upload(self):
+        # Copies the vertices and texture coordinates into a new buffer in graphics memory.
+        # Vertices are stored first, followed by texture coordinates.
+        # Returns None if the graphics hardware does not support vertex buffers (OpenGL 1.5).
+        id = GLuint()
+        try: 
+            glGenBuffers(1, byref(id))
+        except Exception:
+            return None
+        glBindBuffer(GL_ARRAY_BUFFER, id)
+        glBufferData(GL_ARRAY_BUFFER, self.nbytes, None, GL_STATIC_DRAW)
+        n = self.vertices.itemsize * len(self.vertices)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, n, self.vertices.buffer_info()[0])
+        if self.texcoords is not None:
+            glBufferSubData(GL_ARRAY_BUFFER, n, self.nbytes - n, self.texcoords.buffer_info()[0])
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        _vertex_buffers[self] = (id.value, self.nbytes)
+        return id.value
+
+    def draw(self):
+        """ Draws the vertices with the current color (and bound texture, if any).
+        """
+        if len(self.vertices) == 0:
+            return
+        id = _vertex_buffers.get(self)
+        if id is not None:
+            id = id[0]
+        else:
+            id = self._upload()
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        if id is not None:
+            # Pointers are offsets in the bound buffer.
+            glBindBuffer(GL_ARRAY_BUFFER, id)
+            v = 0
+            t = self.vertices.itemsize * len(self.vertices)
+        else:
+            # Pointers are memory addresses of the arrays (no vertex buffer support).
+            v = self.vertices.buffer_info()[0]
+            t = self.texcoords is not None and self.texcoords.buffer_info()[0]
+        glVertexPointer(2, GL_FLOAT, 0, v)
+        if self.texcoords is not None:
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glTexCoordPointer(3, GL_FLOAT, 0, t)
+        glDrawArrays(self.mode, 0, len(self))
+        if id is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glPopClientAttrib()
+
+    def delete(self):
+        """ Removes the vertices from graphics memory.
+        """
+        v = _vertex_buffers.pop(self)
+        if v is not None:
+            _vbo_delete(self, v)
+
+#--- STATE -------------------------------------------------------------------------------------------
+# Each drawing primitive sets the color, line width and line dash for each shape,
+# even if they are the same as for the previous shape.
+# GLState remembers the current OpenGL state and skips calls that wouldn't change anything.
+# OpenGL commands that are called directly (e.g., by pyglet) can change the state behind its back.
+# After such commands, GLState.reset() forgets the remembered state,
+# so that the next calls are passed to OpenGL.
+# For example, pyglet binds a texture when it creates it (Texture.create(), get_texture())
+# or reads it (get_image_data(), save()), so these are followed by glstate.reset("texture").
+
+class GLState(object):
+
+    def __init__(self):
+        """ Shadows the current OpenGL color, line width, line dash, blend function,
+            bound texture and shader program, so that redundant state changes can be skipped.
+            GLState.calls is the number of state changes passed to OpenGL, 
+            GLState.saved is the number of calls that were skipped.
+        """
+        self.calls    = 0
+        self.saved    = 0
+        self.previous = {"calls": 0, "saved": 0} # Counters of the previous frame.
+        self.reset()
+
+    def reset(self, *keys):
+        """ Forgets the remembered state (or the given keys, e.g., "color"),
+            so that the next state change will always be passed to OpenGL.
+        """
+        for k in keys or ("color", "linewidth", "linedash", "blendfunc", "texture", "program"):
+            setattr(self, "_"+k, None)
+
+    def frame(self):
+        """ Starts counting calls for a new frame (called from Canvas._draw()).
+            The counters of the previous frame are kept in GLState.previous.
+        """
+        self.previous = self.stats()
+        self.calls = 0
+        self.saved = 0
+        self.reset()
+
+    def stats(self):
+        return {"calls": self.calls, "saved": self.saved}
+
+    def color(self, r, g, b, a):
+        v = (r, g, b, a)
+        if v != self._color:
+            self._color = v
+            self.calls += 1
+            glColor4f(r, g, b, a)
+        else:
+            self.saved += 1
+
+    def linewidth(self, width):
+        if width != self._linewidth:
+            self._linewidth = width
+            self.calls += 1
+            glLineWidth(width)
+        else:
+            self.saved += 1
+
+    def linedash(self, style):
+        if style != self._linedash:
+            self._linedash = style
+            self.calls += 1
+            glLineDash(style)
+        else:
+            self.saved += 1
+
+    def blendfunc(self, *args):
+        """ Sets the blend function with two parameters (glBlendFunc)
+            or four parameters (glBlendFuncSeparate).
+        """
+        if args != self._blendfunc:
+            self._blendfunc = args
+            self.calls += 1
+            if len(args) == 2:
+                glBlendFunc(*args)
+            else:
+                glBlendFuncSeparate(*args)
+        else:
+            self.saved += 1
+
+    def texture(self, target, id):
+        """ Binds the texture with the given id (in the active texture unit).
+        """
+        if (target, id) != self._texture:
+            self._texture = (target, id)
+            self.calls += 1
+            glBindTexture(target, id)
+        else:
+            self.saved += 1
+
+    def program(self, id):
+        if id != self._program:
+            self._program = id
+            self.calls += 1
+            glUseProgram(id)
+        else:
+            self.saved += 1
+
+    def __repr__(self):
+        return "GLState(calls=%i, saved=%i)" % (self.calls, self.saved)
+
+glstate = GLState()
+
+#--- BATCH -------------------------------------------------------------------------------------------
+# Each drawing primitive (line, rect, ellipse, ...) issues its own glBegin() - glVertex() - glEnd().
+# With thousands of shapes per frame, most time is spent calling OpenGL from Python through ctypes.
+# Between beginbatch() and endbatch(), primitives are recorded in vertex and color arrays instead.
+# Fills are recorded as triangles, strokes as line segments.
+# The triangles and the lines (for each strokewidth and strokestyle) are kept in separate arrays,
+# each drawn with a single glDrawArrays(), in the order in which they were first used.
+# For filled and stroked shapes, this means that in a batch all strokes are drawn on top of the fills.
+# The batch is flushed when the transformation state changes (e.g. push(), translate()),
+# when something is drawn that can't be batched (e.g. images, text) and at endbatch().
+# For example:
+# with batch():
+#     for i in range(10000):
+#         rect(random(500), random(500), 2, 2)
+
+_batch = None # Current Batch, see beginbatch().
+
+class Batch(object):
+
+    def __init__(self):
+        """ Vertex and color arrays in which drawing primitives are recorded.
+            Recorded primitives are drawn with Batch.flush().
+        """
+        self._arrays   = {}   # (mode, strokewidth, strokestyle) => (vertices, colors) arrays of floats.
+        self._order    = []   # (mode, strokewidth, strokestyle) in the order in which they were first used.
+        self._state    = None # (mode, strokewidth, strokestyle) of the last recorded vertices.
+        self._current  = None # (vertices, colors) of the last recorded vertices.
+        self._previous = None # Batch that was active before this one.
+        self.calls     = 0          # Number of glDrawArrays() calls.
+        self.vertices  = 0          # Number of vertices drawn.
+
+    def __len__(self):
+        return sum(len(v) for v, c in self._arrays.values()) / 2
+
+    def _get(self, mode, strokewidth, strokestyle):
+        # Returns the (vertices, colors) arrays for the given mode (and strokewidth and strokestyle).
+        if mode == GL_LINES:
+            state = (mode, strokewidth, strokestyle)
+        else:
+            state = (mode, None, None)
+        if state != self._state:
+            if state not in self._arrays:
+                self._arrays[state] = (array("f"), array("f"))
+                self._order.append(state)
+            self._state = state
+            self._current = self._arrays[state]
+        return self._current
+
+    def append(self, mode, clr, vertices, strokewidth=1, strokestyle="solid"):
+        """ Records the given list of x, y coordinates with the given color.
+            The mode is GL_TRIANGLES (fill) or GL_LINES (stroke).
+        """
+        v, c = self._get(mode, strokewidth, strokestyle)
+        n = len(vertices) / 2
+        v.extend(vertices)
+        c.extend((clr[0], clr[1], clr[2], clr[3] * _alpha) * n)
+
+    def extend(self, mode, vertices, colors, strokewidth=1, strokestyle="solid"):
+        """ Records the given list of x, y coordinates with a list of r, g, b, a colors (one per vertex).
+            The alpha channel of the colors is used as is (i.e., the current alpha is not applied).
+        """
+        v, c = self._get(mode, strokewidth, strokestyle)
+        v.extend(vertices)
+        c.extend(colors)
+
+    def triangles(self, clr, vertices):
+        """ Records a list of x, y coordinates, where every three points define a triangle.
+        """
+        self.append(GL_TRIANGLES, clr, vertices)
+
+    def polygon(self, clr, vertices):
+        """ Records a list of x, y coordinates as a filled polygon (triangle fan).
+            The polygon must be convex, or at least star-shaped from its first point.
+        """
+        x0, y0, v = vertices[0], vertices[1], []
+        for i in xrange(2, len(vertices)-3, 2):
+            v.extend((x0, y0, vertices[i], vertices[i+1], vertices[i+2], vertices[i+3]))
+        self.append(GL_TRIANGLES, clr, v)
+
+    def lines(self, clr, vertices, strokewidth=1, strokestyle="solid", closed=False):
+        """ Records a list of x, y coordinates as a connected line (or loop, if closed=True).
+        """
+        v = []
+        for i in xrange(0, len(vertices)-3, 2):
+            v.extend(vertices[i:i+4])
+        if closed and len(vertices) > 2:
+            v.extend((vertices[-2], vertices[-1], vertices[0], vertices[1]))
+        self.append(GL_LINES, clr, v, strokewidth, strokestyle)
+
+    def flush(self):
+        """ Draws the recorded primitives and clears the batch.
+        """
+        for state in self._order:
+            v, c = self._arrays[state]
+            n = len(v) / 2
+            if n == 0:
+                continue
+            mode, strokewidth, strokestyle = state
+            if mode == GL_LINES:
+                glstate.linewidth(strokewidth)
+                glstate.linedash(strokestyle)
+            glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glEnableClientState(GL_COLOR_ARRAY)
+            glVertexPointer(2, GL_FLOAT, 0, v.buffer_info()[0])
+            glColorPointer(4, GL_FLOAT, 0, c.buffer_info()[0])
+            glDrawArrays(mode, 0, n)
+            glPopClientAttrib()
+            # The current color is undefined after drawing with a color array.
+            glstate.reset("color")
+            self.calls    += 1
+            self.vertices += n
+        self._arrays  = {}
+        self._order   = []
+        self._state   = None
+        self._current = None
+
+    def __enter__(self):
+        global _batch
+        _flush_batch()
+        self._previous, _batch = _batch, self
+        return self
+
+    def __exit__(self, *args):
+        global _batch
+        self.flush()
+        _batch, self._previous = self._previous, None
+
+batch = Batch
+
+def beginbatch():
+    """ Drawing primitives between beginbatch() and endbatch() are recorded,
+        and drawn together with as few OpenGL calls as possible.
+    """
+    return Batch().__enter__()
+
+def endbatch():
+    """ Draws the primitives recorded since beginbatch().
+    """
+    if _batch is not None:
+        _batch.__exit__()
+
+def _flush_batch():
+    # Called before OpenGL commands that can't be batched (e.g. transformations, images).
+    if _batch is not None:
+        _batch.flush()
+
 #=====================================================================================================
 
 #--- COLOR -------------------------------------------------------------------------------------------
@@ -170,7 +558,7 @@ class Color(list):
         return Color(self)
 
     def _apply(self):
-        glColor4f(self[0], self[1], self[2], self[3] * _alpha)
+        glstate.color(self[0], self[1], self[2], self[3] * _alpha)
 
     def __repr__(self):
         return "Color(%.3f, %.3f, %.3f, %.3f)" % \
@@ -267,11 +655,12 @@ def strokewidth(width=None):
     """
     # Note: strokewidth is clamped to integers (e.g. 0.2 => 1), 
     # but finer lines can be achieved visually with a transparent stroke.
-    # Thicker strokewidth results in ugly (i.e. no) line caps.
+    # Thicker strokewidth results in ugly (i.e. no) line caps,
+    # except for BezierPath, which draws thick strokes as triangles with joins and caps.
     global _strokewidth
     if width is not None:
         _strokewidth = width
-        glLineWidth(width)
+        glstate.linewidth(width)
     return _strokewidth
 
 SOLID  = "solid"
@@ -284,9 +673,25 @@ def strokestyle(style=None):
     global _strokestyle
     if style is not None and style != _strokestyle:
         _strokestyle = style
-        glLineDash(style)
+        glstate.linedash(style)
     return _strokestyle
     
+# Dash patterns of thick strokes drawn as triangles (see BezierPath.draw()),
+# as dash and gap lengths relative to the strokewidth.
+# A strokestyle can also be a tuple of dash and gap lengths.
+DASH = {
+     SOLID: None,
+    DOTTED: (1, 7),
+    DASHED: (4, 12)
+}
+
+# Joins between the segments of a thick stroke, and caps at the ends.
+MITER  = geometry.MITER
+ROUND  = geometry.ROUND
+BEVEL  = geometry.BEVEL
+BUTT   = geometry.BUTT
+SQUARE = geometry.SQUARE
+
 def glLineDash(style):
     if style == SOLID:
         glDisable(GL_LINE_STIPPLE)
@@ -484,6 +889,7 @@ def colorplane(x, y, width, height, *a):
         # Black top, white bottom.
         clr1 = clr2 = (0,0,0,1)
         clr3 = clr4 = (1,1,1,1)
+    _flush_batch()
     glPushMatrix()
     glTranslatef(x, y, 0)
     glScalef(width, height, 1)
@@ -494,6 +900,7 @@ def colorplane(x, y, width, height, *a):
     glColor4f(clr4[0], clr4[1], clr4[2], clr4[3] * _alpha); glVertex2f(-0.0, -0.0)
     glEnd()
     glPopMatrix()
+    glstate.reset("color")
 
 #=====================================================================================================
 
@@ -507,24 +914,28 @@ def colorplane(x, y, width, height, *a):
 # p.rect(10,10,100,70)
 # p = t.transform_path(p)
 # p.contains(x,y) # now we can check if the mouse is in the transformed shape.
+# p.transform(t)  # transforms the path in-place, including its cached triangles.
 Transform = geometry.AffineTransform
 
 def push():
     """ Pushes the transformation state.
         Subsequent transformations (translate, rotate, scale) remain in effect until pop() is called.
     """
+    _flush_batch()
     glPushMatrix()
 
 def pop():
     """ Pops the transformation state.
         This reverts the transformation to before the last push().
     """
+    _flush_batch()
     glPopMatrix()
 
 def translate(x, y, z=0):
     """ By default, the origin of the layer or canvas is at the bottom left.
         This origin point will be moved by (x,y) pixels.
     """
+    _flush_batch()
     glTranslatef(round(x), round(y), round(z))
 
 def rotate(degrees, axis=(0,0,1)):
@@ -532,6 +943,7 @@ def rotate(degrees, axis=(0,0,1)):
         Rotations work incrementally:
         calling rotate(60) and rotate(30) sets the current rotation to 90.
     """
+    _flush_batch()
     glRotatef(degrees, *axis)
 
 def scale(x, y=None, z=None):
@@ -541,13 +953,27 @@ def scale(x, y=None, z=None):
         y = x
     if z is None: 
         z = 1
+    _flush_batch()
     glScalef(x, y, z)
 
 def reset():
     """ Resets the transform state of the layer or canvas.
     """
+    _flush_batch()
     glLoadIdentity()
 
+def transform_scale(transform=None):
+    """ Returns the effective scale of the given Transform (or of the current transformation state),
+        i.e. the number of pixels covered by one unit in user space.
+        Reading the current transformation state queries OpenGL, which is not for free.
+    """
+    if transform is not None:
+        m = transform.matrix
+        return sqrt(abs(m[0]*m[4] - m[1]*m[3]))
+    m = (GLfloat * 16)()
+    glGetFloatv(GL_MODELVIEW_MATRIX, m)
+    return sqrt(abs(m[0]*m[5] - m[1]*m[4]))
+
 CORNER = "corner"
 CENTER = "center"
 def transform(mode=None):
@@ -571,10 +997,12 @@ def line(x0, y0, x1, y1, **kwargs):
     """
     fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
     if stroke is not None and strokewidth > 0:
-        glColor4f(stroke[0], stroke[1], stroke[2], stroke[3] * _alpha)
-        glLineWidth(strokewidth)
-        if strokestyle != _strokestyle:
-            glLineDash(strokestyle)
+        if _batch is not None:
+            _batch.append(GL_LINES, stroke, (x0, y0, x1, y1), strokewidth, strokestyle)
+            return
+        glstate.color(stroke[0], stroke[1], stroke[2], stroke[3] * _alpha)
+        glstate.linewidth(strokewidth)
+        glstate.linedash(strokestyle)
         glBegin(GL_LINES)
         glVertex2f(x0, y0)
         glVertex2f(x1, y1)
@@ -585,14 +1013,21 @@ def rect(x, y, width, height, **kwargs):
         The current stroke, strokewidth and fill color are applied.
     """
     fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+    if _batch is not None:
+        v = (x, y, x+width, y, x+width, y+height, x, y+height)
+        if fill is not None:
+            _batch.polygon(fill, v)
+        if stroke is not None and strokewidth > 0:
+            _batch.lines(stroke, v, strokewidth, strokestyle, closed=True)
+        return
     if fill is not None:
-        glColor4f(fill[0], fill[1], fill[2], fill[3] * _alpha)
+        glstate.color(fill[0], fill[1], fill[2], fill[3] * _alpha)
         glRectf(x, y, x+width, y+height)
 
     if stroke is not None and strokewidth > 0:
-        glLineWidth(strokewidth)
-        glLineDash(strokestyle)
-        glColor4f(stroke[0], stroke[1], stroke[2], stroke[3] * _alpha)
+        glstate.linewidth(strokewidth)
+        glstate.linedash(strokestyle)
+        glstate.color(stroke[0], stroke[1], stroke[2], stroke[3] * _alpha)
         # Note: this performs equally well as when using precompile().
         glBegin(GL_LINE_LOOP)
         glVertex2f(x, y)
@@ -606,13 +1041,19 @@ def triangle(x1, y1, x2, y2, x3, y3, **kwargs):
         The current stroke, strokewidth and fill color are applied.
     """
     fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+    if _batch is not None:
+        v = (x1, y1, x2, y2, x3, y3)
+        if fill is not None:
+            _batch.triangles(fill, v)
+        if stroke is not None and strokewidth > 0:
+            _batch.lines(stroke, v, strokewidth, strokestyle, closed=True)
+        return
     for i, clr in enumerate((fill, stroke)):
         if clr is not None and (i==0 or strokewidth > 0):
             if i == 1: 
-                glLineWidth(strokewidth)
-                if strokestyle != _strokestyle:
-                    glLineDash(strokestyle)
-            glColor4f(clr[0], clr[1], clr[2], clr[3] * _alpha)
+                glstate.linewidth(strokewidth)
+                glstate.linedash(strokestyle)
+            glstate.color(clr[0], clr[1], clr[2], clr[3] * _alpha)
             # Note: this performs equally well as when using precompile().
             glBegin((GL_TRIANGLES, GL_LINE_LOOP)[i])
             glVertex2f(x1, y1)
@@ -620,39 +1061,58 @@ def triangle(x1, y1, x2, y2, x3, y3, **kwargs):
             glVertex2f(x3, y3)
             glEnd()
 
-_ellipses = {}
+def _flush_shape(key, cached):
+    # Removes the vertex buffers of a cached shape (called when a shape cache discards it).
+    flush(cached[0])
+    flush(cached[1])
+
+def _sizeof_shape(cached):
+    # Returns the size in bytes of a cached shape: two vertex buffers and a list of (x,y)-tuples.
+    return cached[0].nbytes + cached[1].nbytes + len(cached[2]) * 16
+
+# Maximum size in bytes of the cached ellipse and star shapes.
+SHAPE_CACHE = 1024 * 1024
+
+_ellipses = geometry.lrucache("ellipses", bytes=SHAPE_CACHE, sizeof=_sizeof_shape, evict=_flush_shape)
 ELLIPSE_SEGMENTS = 50
 def ellipse(x, y, width, height, segments=ELLIPSE_SEGMENTS, **kwargs):
     """ Draws an ellipse with the center located at x, y.
         The current stroke, strokewidth and fill color are applied.
     """
-    if not segments in _ellipses:
+    cached = _ellipses.get(segments)
+    if cached is None:
         # For the given amount of line segments, calculate the ellipse once.
         # Then reuse the cached ellipse by scaling it to the desired size.
-        commands = []
+        cached = []
         f = 2 * pi / segments
         v = [(cos(t)/2, sin(t)/2) for t in [i*f for i in range(segments)+[0]]]
         for mode in (GL_TRIANGLE_FAN, GL_LINE_LOOP):
-            commands.append(precompile(lambda:(
-               glBegin(mode),
-               [glVertex2f(x, y) for (x, y) in v],
-               glEnd()
-               )))
-        
-        _ellipses[segments] = commands
+            cached.append(precompile([c for pt in v for c in pt], mode))
+        # The unit vertices are kept for batching, see Batch.
+        cached.append(v[:-1])
+        _ellipses[segments] = cached
 
     fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+    if _batch is not None:
+        v = []
+        for vx, vy in cached[2]:
+            v.append(x + vx*width)
+            v.append(y + vy*height)
+        if fill is not None:
+            _batch.polygon(fill, v)
+        if stroke is not None and strokewidth > 0:
+            _batch.lines(stroke, v, strokewidth, strokestyle, closed=True)
+        return
     for i, clr in enumerate((fill, stroke)):
         if clr is not None and (i==0 or strokewidth > 0):
             if i == 1: 
-                glLineWidth(strokewidth)
-                if strokestyle != _strokestyle:
-                    glLineDash(strokestyle)
-            glColor4f(clr[0], clr[1], clr[2], clr[3] * _alpha)
+                glstate.linewidth(strokewidth)
+                glstate.linedash(strokestyle)
+            glstate.color(clr[0], clr[1], clr[2], clr[3] * _alpha)
             glPushMatrix()
             glTranslatef(x, y, 0)
             glScalef(width, height, 1)
-            glCallList(_ellipses[segments][i])
+            precompiled(cached[i])
             glPopMatrix()
 
 oval = ellipse # Backwards compatibility.
@@ -664,12 +1124,26 @@ def arrow(x, y, width, **kwargs):
     head = width * 0.4
     tail = width * 0.2
     fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+    if _batch is not None:
+        # The arrow is not convex, but it is star-shaped from its tip.
+        v = (x, y, 
+             x-head,  y+head, 
+             x-head,  y+tail, 
+             x-width, y+tail, 
+             x-width, y-tail, 
+             x-head,  y-tail, 
+             x-head,  y-head)
+        if fill is not None:
+            _batch.polygon(fill, v)
+        if stroke is not None and strokewidth > 0:
+            _batch.lines(stroke, v, strokewidth, strokestyle, closed=True)
+        return
     for i, clr in enumerate((fill, stroke)):
         if clr is not None and (i==0 or strokewidth > 0):
             if i == 1: 
-                glLineWidth(strokewidth)
-                glLineDash(strokestyle)
-            glColor4f(clr[0], clr[1], clr[2], clr[3] * _alpha)
+                glstate.linewidth(strokewidth)
+                glstate.linedash(strokestyle)
+            glstate.color(clr[0], clr[1], clr[2], clr[3] * _alpha)
             # Note: this performs equally well as when using precompile().
             glBegin((GL_POLYGON, GL_LINE_LOOP)[i])
             glVertex2f(x, y)
@@ -685,7 +1159,7 @@ def arrow(x, y, width, **kwargs):
 def gcd(a, b):
     return gcd(b, a % b) if b else a
 
-_stars = {} #TODO: LRU?
+_stars = geometry.lrucache("stars", bytes=SHAPE_CACHE, sizeof=_sizeof_shape, evict=_flush_shape)
 def fast_star(x, y, points=20, outer=100, inner=50, **kwargs):
     """ Draws a star with the given points, outer radius and inner radius.
         The current stroke, strokewidth and fill color are applied.
@@ -693,36 +1167,39 @@ def fast_star(x, y, points=20, outer=100, inner=50, **kwargs):
     scale = gcd(inner, outer)
     iscale = inner / scale
     oscale = outer / scale
-    cached = _stars.get((points, iscale, oscale), [])
-    if not cached:
+    cached = _stars.get((points, iscale, oscale))
+    if cached is None:
+        cached = []
         radii = [oscale, iscale] * int(points+1); radii.pop() # which radius?
         f = pi / points
         v = [(r*sin(i*f), r*cos(i*f)) for i, r in enumerate(radii)]
-        cached.append(precompile(lambda:(
-            glBegin(GL_TRIANGLE_FAN),
-            glVertex2f(0, 0),
-            [glVertex2f(vx, vy) for (vx, vy) in v],
-            glEnd()
-        )))
-        cached.append(precompile(lambda:(
-            glBegin(GL_LINE_LOOP),
-            [glVertex2f(vx, vy) for (vx, vy) in v],
-            glEnd()
-        )))
+        cached.append(precompile([0, 0] + [c for pt in v for c in pt], GL_TRIANGLE_FAN))
+        cached.append(precompile([c for pt in v for c in pt], GL_LINE_LOOP))
+        # The unit vertices are kept for batching, see Batch.
+        cached.append(v)
         _stars[(points, iscale, oscale)] = cached
 
     fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+    if _batch is not None:
+        v = []
+        for vx, vy in cached[2]:
+            v.append(x + vx*scale)
+            v.append(y + vy*scale)
+        if fill is not None:
+            _batch.polygon(fill, [x, y] + v)
+        if stroke is not None and strokewidth > 0:
+            _batch.lines(stroke, v, strokewidth, strokestyle)
+        return
     for i, clr in enumerate((fill, stroke)):
         if clr is not None and (i == 0 or strokewidth > 0):
             if i == 1: 
-                glLineWidth(strokewidth)
-                if strokestyle != _strokestyle:
-                    glLineDash(strokestyle)
-            glColor4f(clr[0], clr[1], clr[2], clr[3] * _alpha)
+                glstate.linewidth(strokewidth)
+                glstate.linedash(strokestyle)
+            glstate.color(clr[0], clr[1], clr[2], clr[3] * _alpha)
             glPushMatrix()
             glTranslatef(x, y, 0)
             glScalef(scale, scale, 1)
-            glCallList(cached[i])
+            precompiled(cached[i])
             glPopMatrix()
 
 def star(x, y, points=20, outer=100, inner=50, **kwargs):
@@ -742,6 +1219,136 @@ def star(x, y, points=20, outer=100, inner=50, **kwargs):
         p.draw(**kwargs)
     return p
 
+#--- INSTANCES ---------------------------------------------------------------------------------------
+# Bulk versions of rect(), ellipse() and fast_star() draw many shapes in a single call.
+# They take parallel sequences of positions (lists, tuples or array.array objects).
+# Sizes can be a single number or a sequence, and fill/stroke a single color or a list of colors.
+# All fills are drawn with one glDrawArrays(), followed by all strokes
+# (or recorded in the current batch, see beginbatch()).
+# For example:
+# ellipses([p.x for p in particles], [p.y for p in particles], 4, 4, fill=(0,0,0,1))
+
+# Unit shapes as (fill triangles, stroke lines), see _instance().
+_instances = geometry.lrucache("instances", 
+    bytes = SHAPE_CACHE, 
+   sizeof = lambda (f, s): (len(f) + len(s)) * 16)
+
+def _instance(key, shape):
+    """ Returns a cached (triangles, lines)-tuple for the unit shape with the given key.
+        The given function returns the shape as a (polygon, outline)-tuple.
+        The polygon is a list of (x,y)-tuples that is triangulated as a fan from its first point.
+        The outline is a list of (x,y)-tuples that is split into line segments.
+    """
+    cached = _instances.get(key)
+    if cached is None:
+        polygon, outline = shape()
+        f, s = [], []
+        for i in xrange(1, len(polygon)-1):
+            f.extend((polygon[0], polygon[i], polygon[i+1]))
+        for i in xrange(len(outline)-1):
+            s.extend((outline[i], outline[i+1]))
+        _instances[key] = cached = (f, s)
+    return cached
+
+def _column(v, n):
+    # Returns a sequence of n values, repeating v if it is a single number.
+    if isinstance(v, Number):
+        return [v] * n
+    if len(v) != n:
+        raise ValueError, "expected %s values, got %s" % (n, len(v))
+    return v
+
+def _is_colors(clr):
+    # Returns True if the given value is a sequence of colors (rather than a single color).
+    # Colors in the sequence can be None (= transparent).
+    return clr is not None and len(clr) > 0 and (clr[0] is None or isinstance(clr[0], (list, tuple)))
+
+def _instance_colors(clr, n):
+    # Returns a list of n (R,G,B,A)-tuples for a single color or a sequence of colors.
+    if _is_colors(clr):
+        return [c is None and (0, 0, 0, 0) or (c[0], c[1], c[2], c[3] * _alpha) for c in _column(clr, n)]
+    return [(clr[0], clr[1], clr[2], clr[3] * _alpha)] * n
+
+def _draw_instances(shape, x, y, width, height, fill=None, stroke=None, strokewidth=1, strokestyle="solid"):
+    """ Draws the given unit shape (see _instance()) at each x, y, scaled by width and height.
+    """
+    n = len(x)
+    y = _column(y, n)
+    w = _column(width, n)
+    h = _column(height, n)
+    b = _batch
+    if b is None:
+        b = Batch()
+    for clr, mode, template in ((fill, GL_TRIANGLES, shape[0]), (stroke, GL_LINES, shape[1])):
+        if clr is None or n == 0 or mode == GL_LINES and strokewidth <= 0:
+            continue
+        colors = _instance_colors(clr, n)
+        m = len(template)
+        v, c = [], []
+        for i in xrange(n):
+            xi, yi, wi, hi = x[i], y[i], w[i], h[i]
+            for ux, uy in template:
+                v.append(xi + ux*wi)
+                v.append(yi + uy*hi)
+            c.extend(colors[i] * m)
+        b.extend(mode, v, c, strokewidth, strokestyle)
+    if b is not _batch:
+        b.flush()
+
+def rects(x, y, width, height, **kwargs):
+    """ Draws a rectangle at each x, y in the given sequences (bottom left corners).
+        The width and height can be a number or a sequence.
+        The fill and stroke can be a color or a sequence of colors (one for each rectangle).
+    """
+    v = [(0, 0), (1, 0), (1, 1), (0, 1)]
+    fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+    _draw_instances(_instance("rect", lambda: (v, v+v[:1])), x, y, width, height, 
+        fill, stroke, strokewidth, strokestyle)
+
+def ellipses(x, y, width, height, segments=ELLIPSE_SEGMENTS, **kwargs):
+    """ Draws an ellipse at each x, y in the given sequences (centers).
+        The width and height can be a number or a sequence.
+        The fill and stroke can be a color or a sequence of colors (one for each ellipse).
+        For many small ellipses (e.g., particles), fewer segments are considerably faster.
+    """
+    def shape():
+        f = 2 * pi / segments
+        v = [(cos(t)/2, sin(t)/2) for t in [i*f for i in range(segments)]]
+        return v, v+v[:1]
+    fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+    _draw_instances(_instance(("ellipse", segments), shape), x, y, width, height, 
+        fill, stroke, strokewidth, strokestyle)
+
+def stars(x, y, points=20, outer=100, inner=50, **kwargs):
+    """ Draws a star at each x, y in the given sequences, with the given points, outer and inner radius.
+        The outer and inner radius can be a number or a sequence.
+        The fill and stroke can be a color or a sequence of colors (one for each star).
+    """
+    n = len(x)
+    outer = _column(outer, n)
+    inner = _column(inner, n)
+    fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+    # Stars with a different inner/outer ratio have a different unit shape.
+    # Each group of stars with the same ratio is drawn in one call.
+    groups = {}
+    for i in xrange(n):
+        groups.setdefault(outer[i] and float(inner[i]) / outer[i] or 0, []).append(i)
+    def shape():
+        radii = [1, r] * int(points+1); radii.pop() # which radius?
+        f = pi / points
+        v = [(ri*sin(i*f), ri*cos(i*f)) for i, ri in enumerate(radii)]
+        return [(0, 0)] + v, v
+    for r, indices in groups.items():
+        cached = _instance(("star", points, r), shape)
+        if len(groups) == 1:
+            _draw_instances(cached, x, y, outer, outer, 
+                fill, stroke, strokewidth, strokestyle)
+        else:
+            subset = lambda v: [v[i] for i in indices]
+            _draw_instances(cached, subset(x), subset(y), subset(outer), subset(outer),
+                _is_colors(fill) and subset(fill) or fill,
+                _is_colors(stroke) and subset(stroke) or stroke, strokewidth, strokestyle)
+
 #=====================================================================================================
 
 #--- BEZIER PATH -------------------------------------------------------------------------------------
@@ -750,8 +1357,10 @@ def star(x, y, points=20, outer=100, inner=50, **kwargs):
 # A number of caching mechanisms are used for performance:
 # drawn vertices, segment lengths, path bounds, and a hit test area for BezierPath.contains().
 # For optimal performance, the path should be created once (not every frame) and left unmodified.
-# When points in the path are added, removed or modified, a _dirty flag is set.
-# When dirty, the cache will be cleared and the new path recalculated.
+# When points in the path are added, removed or modified, the path's version counter is increased.
+# When the version changed, the cache will be cleared and the new path recalculated.
+# Each PathElement (and its control handles) keeps a list of the version counters of the paths
+# it belongs to, instead of a reference to the path, so there are no circular references.
 # If the path is being drawn with a fill color, this means doing tessellation
 # (i.e. additional math for finding out if parts overlap and punch a hole in the shape).
 
@@ -762,6 +1371,44 @@ CLOSE   = "close"
 
 RELATIVE = "relative" # Number of straight lines to represent a curve = 20% of curve length.
 RELATIVE_PRECISION = 0.2
+FLATNESS = "flatness" # Number of straight lines such that they deviate less than 0.25 from the curve.
+FLATNESS_TOLERANCE = 0.25
+AUTO = "auto" # FLATNESS in screen space, depending on the current scale.
+
+# Simplification of paths (see BezierPath.simplify()).
+DOUGLAS_PEUCKER = geometry.DOUGLAS_PEUCKER
+VISVALINGAM     = geometry.VISVALINGAM
+
+# With draw(simplify=True), points that deviate less than 0.5 pixels from a line are left out.
+SIMPLIFY_TOLERANCE = 0.5
+
+# Boolean operations on paths (see BezierPath.union()).
+UNION        = geometry.UNION
+INTERSECTION = geometry.INTERSECTION
+DIFFERENCE   = geometry.DIFFERENCE
+XOR          = geometry.XOR
+
+# With precision=AUTO, the current scale is rounded to a LOD (level-of-detail) bucket in steps of sqrt(2).
+# Each path caches its vertices for a few buckets, so zooming in and out does not flatten every frame.
+LOD_RANGE = 16 # Scale between 2**-8 and 2**8.
+LOD_CACHE = 4  # Number of cached precisions per path.
+
+def _lod(scale):
+    """ Returns the flatness tolerance (in user space) for the given effective scale.
+        The tolerance is FLATNESS_TOLERANCE in screen space, rounded to a LOD bucket.
+    """
+    b = -LOD_RANGE
+    if scale > 0:
+        b = max(b, min(int(round(log(scale, 2) * 2)), LOD_RANGE))
+    return FLATNESS_TOLERANCE / 2 ** (b * 0.5)
+
+def _flush_path(cache):
+    # Removes the cached vertex buffers of a BezierPath from graphics memory.
+    for c in cache:
+        if c[0]: flush(c[0])
+        if c[1]: flush(c[1])
+        if len(c) > 6:
+            _flush_path(c[6].values())
 
 class PathError(Exception): 
     pass
@@ -770,6 +1417,15 @@ class NoCurrentPointForPath(Exception):
 class NoCurrentPath(Exception): 
     pass
 
+class PathVersion(object):
+    
+    __slots__ = ("n",)
+    
+    def __init__(self):
+        """ The version counter of a BezierPath, increased each time the path is modified.
+        """
+        self.n = 0
+
 class PathPoint(Point):
     
     def __init__(self, x=0, y=0):
@@ -777,17 +1433,20 @@ class PathPoint(Point):
         """
         self._x = x
         self._y = y
-        self._dirty = False
+        self._owners = [] # PathVersion of each BezierPath that contains the point.
+    
+    def _changed(self):
+        for v in self._owners: v.n += 1
     
     def _get_x(self): return self._x
     def _set_x(self, v): 
         self._x = v
-        self._dirty = True
+        self._changed()
 
     def _get_y(self): return self._y
     def _set_y(self, v):
         self._y = v
-        self._dirty = True
+        self._changed()
         
     x = property(_get_x, _set_x)
     y = property(_get_y, _set_y)
@@ -814,21 +1473,14 @@ class PathElement(object):
         self._cmd    = cmd
         self._x      = pt[0]
         self._y      = pt[1]
+        self._owners = [] # PathVersion of each BezierPath that contains the element.
         self._ctrl1  = PathPoint(h1[0], h1[1])
         self._ctrl2  = PathPoint(h2[0], h2[1])
-        self.__dirty = False
+        self._ctrl1._owners = self._owners
+        self._ctrl2._owners = self._owners
 
-    def _get_dirty(self):
-        return self.__dirty \
-            or self.ctrl1._dirty \
-            or self.ctrl2._dirty
-            
-    def _set_dirty(self, b):
-        self.__dirty = b
-        self.ctrl1._dirty = b
-        self.ctrl2._dirty = b
-        
-    _dirty = property(_get_dirty, _set_dirty)
+    def _changed(self):
+        for v in self._owners: v.n += 1
 
     @property
     def cmd(self):
@@ -837,12 +1489,12 @@ class PathElement(object):
     def _get_x(self): return self._x
     def _set_x(self, v): 
         self._x = v
-        self.__dirty = True
+        self._changed()
         
     def _get_y(self): return self._y
     def _set_y(self, v): 
         self._y = v
-        self.__dirty = True
+        self._changed()
         
     x = property(_get_x, _set_x)
     y = property(_get_y, _set_y)
@@ -859,13 +1511,15 @@ class PathElement(object):
     def _get_ctrl1(self): return self._ctrl1
     def _set_ctrl1(self, v):
         self._ctrl1 = PathPoint(v.x, v.y)
-        self.__dirty = True
+        self._ctrl1._owners = self._owners
+        self._changed()
 
     # Handle 2 describes how the curve from the previous point arrives in this point.
     def _get_ctrl2(self): return self._ctrl2
     def _set_ctrl2(self, v):
         self._ctrl2 = PathPoint(v.x, v.y)
-        self.__dirty = True
+        self._ctrl2._owners = self._owners
+        self._changed()
     
     ctrl1 = property(_get_ctrl1, _set_ctrl1)
     ctrl2 = property(_get_ctrl2, _set_ctrl2)
@@ -902,33 +1556,88 @@ class BezierPath(list):
     def __init__(self, path=None, **kwargs):
         """ A list of PathElements describing the curves and lines that make up the path.
         """
-        if isinstance(path, (BezierPath, list, tuple)):
-            self.extend([pt.copy() for pt in path])
         self._kwargs   = kwargs
-        self._cache    = None # Cached vertices for drawing.
-        self._segments = None # Cached segment lengths.
-        self._bounds   = None # Cached bounding rectangle.
-        self._polygon  = None # Cached polygon hit test area.
-        self._dirty    = False
+        self._cache    = None # Cached vertices for drawing, for each precision (see LOD_CACHE).
+        self._segments = None # Cached arc-length table.
+        self._bounds   = None # Cached bounding rectangle, and bounding rectangle of each contour.
+        self._polygon  = None # Cached hit test area (see geometry.PolygonIndex).
+        self._packed   = None # Cached commands and coordinates arrays (see bezier.pack()).
+        self._hashes   = {}   # Cached hash() for each state and decimal precision.
+        self._clipped  = {}   # Cached union(), intersection(), difference() and xor() paths.
+        self._version  = PathVersion()
+        self._cached   = 0    # Version of the path in the cache.
         self._index    = {}
+        if isinstance(path, (BezierPath, list, tuple)):
+            self.extend([pt.copy() for pt in path])
 
     def copy(self):
-        return BezierPath(self, **self._kwargs)
+        p = BezierPath(self, **self._kwargs)
+        p._inherit(self)
+        return p
+
+    def _inherit(self, path):
+        # Shares the cached vertices of the given path, which has the same points as this path
+        # (i.e., the copy is not flattened and tessellated again).
+        # The vertex buffers in graphics memory are not shared.
+        path._update()
+        if path._cache:
+            self._cache = [[None, None] + c[2:6] + [dict((k, [None, None, v[2]]) for k, v in c[6].items())] 
+                for c in path._cache]
+        self._cached = self._version.n
+    
+    def _get_dirty(self):
+        return self._version.n != self._cached
+    def _set_dirty(self, b):
+        if b: self._version.n += 1
     
+    _dirty = property(_get_dirty, _set_dirty)
+    
+    def _own(self, points):
+        # Points in the path increase its version counter when modified.
+        # Returns the list of points, where views on a PackedPath (see PackedPathElement) are copied.
+        v = self._version
+        points = list(points)
+        for i, pt in enumerate(points):
+            if isinstance(pt, PackedPathElement):
+                points[i] = pt = pt.copy()
+            pt._owners.append(v)
+        return points
+    def _disown(self, points):
+        v = self._version
+        for pt in points:
+            o = pt._owners
+            for i in xrange(len(o)):
+                if o[i] is v:
+                    del o[i]; break
+
     def append(self, pt):
-        self._dirty = True; list.append(self, pt)
+        self._dirty = True; pt, = self._own((pt,)); list.append(self, pt)
     def extend(self, points):
-        self._dirty = True; list.extend(self, points)
+        self._dirty = True; points = self._own(points); list.extend(self, points)
     def insert(self, i, pt):
-        self._dirty = True; self._index={}; list.insert(self, i, pt)
+        self._dirty = True; self._index={}; pt, = self._own((pt,)); list.insert(self, i, pt)
     def remove(self, pt):
-        self._dirty = True; self._index={}; list.remove(self, pt)
-    def pop(self, i):
-        self._dirty = True; self._index={}; list.pop(self, i)
+        self._dirty = True; self._index={}; self._disown((pt,)); list.remove(self, pt)
+    def pop(self, i=-1):
+        self._dirty = True; self._index={}; pt = list.pop(self, i); self._disown((pt,)); return pt
     def __setitem__(self, i, pt):
-        self._dirty = True; self._index={}; list.__setitem__(self, i, pt)
+        self._dirty = True; self._index={}
+        if isinstance(i, slice):
+            self._disown(list.__getitem__(self, i)); pt = self._own(pt)
+        else:
+            self._disown((list.__getitem__(self, i),)); pt, = self._own((pt,))
+        list.__setitem__(self, i, pt)
     def __delitem__(self, i):
-        self._dirty = True; self._index={}; list.__delitem__(self, i)
+        self._dirty = True; self._index={}
+        if isinstance(i, slice):
+            self._disown(list.__getitem__(self, i))
+        else:
+            self._disown((list.__getitem__(self, i),))
+        list.__delitem__(self, i)
+    def __setslice__(self, i, j, points):
+        self.__setitem__(slice(max(0, i), max(0, j)), points)
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(max(0, i), max(0, j)))
     def sort(self):
         self._dirty = True; self._index={}; list.sort(self)
     def reverse(self):
@@ -937,16 +1646,20 @@ class BezierPath(list):
         return self._index.setdefault(pt, list.index(self, pt))
     
     def _update(self):
-        # Called from BezierPath.draw().
-        # If points were added or removed, clear the cache.
-        b = self._dirty
-        for pt in self: b = b or pt._dirty; pt._dirty = False
-        if b:
-            if self._cache is not None:
-                if self._cache[0]: flush(self._cache[0])
-                if self._cache[1]: flush(self._cache[1])
-            self._cache = self._segments = self._bounds = self._polygon = None
-            self._dirty = False
+        # Called from BezierPath.draw(), bounds, contains(), point() and points().
+        # If points were added, removed or modified (i.e. the version changed), clear the cache.
+        if self._version.n != self._cached:
+            self._clear()
+
+    def _clear(self):
+        # Clears the cached vertices, segment lengths, bounds and hit test area.
+        if self._cache is not None:
+            _flush_path(self._cache)
+        self._cache = self._segments = self._bounds = self._polygon = None
+        self._hashes = {}
+        self._clipped = {}
+        self._packed = None
+        self._cached = self._version.n
     
     def moveto(self, x, y):
         """ Adds a new point to the path at x, y.
@@ -1039,94 +1752,218 @@ class BezierPath(list):
             self._index[pt] = i
             e.smooth(pt, *args, **kwargs)
 
-    def flatten(self, precision=RELATIVE):
+    def _arrays(self):
+        # Returns the cached (commands, coordinates)-tuple of arrays (see bezier.pack()).
+        self._update()
+        if self._packed is None:
+            self._packed = bezier.pack(self)
+        return self._packed
+
+    def _unpack(self, coords):
+        # Updates the coordinates of the path elements from the given array (see bezier.pack()).
+        for i, pt in enumerate(list.__iter__(self)):
+            j = i * 6
+            try:
+                pt._ctrl1._x, pt._ctrl1._y, pt._ctrl2._x, pt._ctrl2._y, pt._x, pt._y = coords[j:j+6]
+                pt._changed()
+            except AttributeError:
+                pt.ctrl1.x, pt.ctrl1.y, pt.ctrl2.x, pt.ctrl2.y, pt.x, pt.y = coords[j:j+6]
+
+    def transform(self, transform):
+        """ Applies the given Transform to the path (in-place).
+            The cached flattened contours and triangles are transformed as well,
+            so the path is not flattened and tessellated again.
+            Curves flattened with a relative precision or a tolerance are only kept 
+            if the transform doesn't enlarge the path (they would be too coarse otherwise).
+            Thick strokes are only kept for a rotation and/or translation.
+        """
+        cmds, coords = self._arrays()
+        coords = transform.transform_points(coords)
+        cache = self._cache
+        self._cache = None
+        self._unpack(coords)
+        self._clear()
+        if cache is None:
+            return
+        a, b, _, c, d, _, e, f, _ = transform.matrix
+        rigid = abs(a*a + b*b - 1) < 1e-9 and abs(c*c + d*d - 1) < 1e-9 and abs(a*c + b*d) < 1e-9
+        # The transform enlarges the path if the largest singular value of its matrix is > 1.
+        n = a*a + b*b + c*c + d*d
+        enlarge = n + sqrt(max(0, n*n - 4*(a*d - b*c)**2)) > 2 + 1e-9
+        _flush_path(cache)
+        for v in cache:
+            v[0] = v[1] = None
+            precision, tolerance, simplify = v[2]
+            if enlarge and (not isinstance(precision, int) or simplify):
+                # A fixed number of lines per curve is the same before and after the transform,
+                # other flattened curves (and simplified contours) are no longer within the tolerance.
+                v[3] = v[4] = v[5] = None
+            if v[3] is not None:
+                v[3] = [transform.map(points) for points in v[3]]
+            if v[4] is not None:
+                v[4] = transform.transform_points(v[4])
+            if v[5] is not None:
+                v[5] = transform.transform_points(v[5])
+            if rigid:
+                v[6] = dict((k, [None, None, transform.transform_points(o[2])]) for k, o in v[6].items())
+            else:
+                v[6] = {}
+        self._cache = cache
+        if self._packed is None:
+            self._packed = cmds, coords
+
+    def flatten(self, precision=RELATIVE, tolerance=None):
         """ Returns a list of contours, in which each contour is a list of (x,y)-tuples.
             The precision determines the number of straight lines to use as a substition for a curve.
             It can be a fixed number (int) or relative to the curve length (float or RELATIVE).
+            With precision=FLATNESS (or a given tolerance), the number of lines is such that 
+            they deviate less than the tolerance (FLATNESS_TOLERANCE) from the curve.
         """
         if precision == RELATIVE:
             precision = RELATIVE_PRECISION
-        contours = [[]]
-        x0, y0 = None, None
-        closeto = None
-        for pt in self:
-            if (pt.cmd == LINETO or pt.cmd == CURVETO) and x0 == y0 is None:
-                raise NoCurrentPointForPath
-            elif pt.cmd == LINETO:
-                contours[-1].append((x0, y0))
-                contours[-1].append((pt.x, pt.y))
-            elif pt.cmd == CURVETO:
-                # Curves are interpolated from a number of straight line segments.
-                # With relative precision, we use the (rough) curve length to determine the number of lines.
-                x1, y1, x2, y2, x3, y3 =  pt.ctrl1.x, pt.ctrl1.y, pt.ctrl2.x, pt.ctrl2.y, pt.x, pt.y
-                if isinstance(precision, float):
-                    n = int(max(0, precision) * bezier.curvelength(x0, y0, x1, y1, x2, y2, x3, y3, 3))
-                else:
-                    n = int(max(0, precision))
-                if n > 0:
-                    xi, yi = x0, y0
-                    for i in range(n+1):
-                        xj, yj, vx1, vy1, vx2, vy2 = bezier.curvepoint(float(i)/n, x0, y0, x1, y1, x2, y2, x3, y3)
-                        contours[-1].append((xi, yi))
-                        contours[-1].append((xj, yj))
-                        xi, yi = xj, yj
-            elif pt.cmd == MOVETO:
-                contours.append([]) # Start a new contour.
-                closeto = pt
-            elif pt.cmd == CLOSE and closeto is not None:
-                contours[-1].append((x0, y0))
-                contours[-1].append((closeto.x, closeto.y))
-            x0, y0 = pt.x, pt.y
-        return contours
-
-    def draw(self, precision=RELATIVE, **kwargs):
+        if precision == FLATNESS and tolerance is None:
+            tolerance = FLATNESS_TOLERANCE
+        cmds, coords = self._arrays()
+        return bezier.flatten(cmds, coords, precision, tolerance)
+
+    def _geometry(self, precision=RELATIVE, tolerance=None, fill=True, stroke=True, simplify=None):
+        # Returns the cached vertices for the given precision (see draw()).
+        # The cache is a short list of the most recently drawn precisions.
+        # Each item holds: fill VertexBuffer, stroke VertexBuffer, (precision, tolerance, simplify), 
+        # flattened contours, fill triangles + stroke lines as lists of x, y coordinates,
+        # and a dict of stroke triangles for each stroke width and style (see _outline()).
+        if self._cache is None:
+            self._cache = []
+        for i, cache in enumerate(self._cache):
+            if cache[2] == (precision, tolerance, simplify):
+                if i > 0:
+                    self._cache.insert(0, self._cache.pop(i))
+                break
+        else:
+            cache = [None, None, (precision, tolerance, simplify), None, None, None, {}]
+            self._cache.insert(0, cache)
+            _flush_path(self._cache[LOD_CACHE:])
+            del self._cache[LOD_CACHE:]
+        if not (fill and cache[4] is None or stroke and cache[5] is None):
+            return cache
+        # The path's commands and coordinates identify the triangles in the tessellation cache
+        # and the vertices in the disk cache (see disk_cache()).
+        id = (self._id(),) + cache[2]
+        key = None
+        if _disk_cache is not None:
+            key = md5(repr(id)).digest()
+            v = _disk_cache.get(key)
+            if v is not None:
+                if cache[4] is None:
+                    cache[4] = v[0]
+                if cache[5] is None:
+                    cache[5] = v[1]
+            if not (fill and cache[4] is None or stroke and cache[5] is None):
+                return cache
+        if fill and cache[4] is None:
+            # The path fill is drawn as triangles by tessellating the contours.
+            cache[4] = geometry.triangulate(self._flattened(cache), id=id)
+        if stroke and cache[5] is None:
+            # The path stroke is drawn as line segments between successive points.
+            cache[5] = v = []
+            for path in self._flattened(cache):
+                for i in xrange(len(path)-1):
+                    v.extend(path[i]); v.extend(path[i+1])
+        if key is not None:
+            _disk_cache.set(key, cache[4], cache[5])
+        return cache
+
+    def _flattened(self, cache):
+        # Returns the flattened contours for the given cache item (see _geometry()),
+        # simplified with the given tolerance, if any.
+        if cache[3] is None:
+            precision, tolerance, simplify = cache[2]
+            cache[3] = self.flatten(precision, tolerance)
+            if simplify:
+                cache[3] = [geometry.simplify(points, simplify) for points in cache[3]]
+        return cache[3]
+
+    def draw(self, precision=RELATIVE, tolerance=None, **kwargs):
         """ Draws the path.
             The precision determines the number of straight lines to use as a substition for a curve.
             It can be a fixed number (int) or relative to the curve length (float or RELATIVE).
+            With precision=FLATNESS (or a given tolerance), the number of lines is such that 
+            they deviate less than the tolerance (FLATNESS_TOLERANCE) from the curve.
+            With precision=AUTO, the tolerance is in screen space, using the scale of the current layer
+            (Layer.transform) or the current transformation state.
+            With simplify=True, points that deviate less than SIMPLIFY_TOLERANCE (in screen space)
+            from a straight line are left out (see BezierPath.simplify()).
         """
+        kw = self._kwargs
         if len(kwargs) > 0:
             # Optional parameters in draw() overrule those set during initialization. 
             kw = dict(self._kwargs)
             kw.update(kwargs)
-            fill, stroke, strokewidth, strokestyle = color_mixin(**kw)
-        else:
-            fill, stroke, strokewidth, strokestyle = color_mixin(**self._kwargs)
-        def _draw_fill(contours):
-            # Drawing commands for the path fill (as triangles by tessellating the contours).
-            v = geometry.tesselate(contours)
-            glBegin(GL_TRIANGLES)
-            for x, y in v:
-                glVertex3f(x, y, 0)
-            glEnd()
-        def _draw_stroke(contours):
-            # Drawing commands for the path stroke.
-            for path in contours:
-                glBegin(GL_LINE_STRIP)
-                for x, y in path:
-                    glVertex2f(x, y)
-                glEnd()
+        fill, stroke, strokewidth, strokestyle = color_mixin(**kw)
         self._update() # Remove the cache if points were modified.
-        if self._cache is None \
-        or self._cache[0] is None and fill \
-        or self._cache[1] is None and stroke \
-        or self._cache[-1] != precision:
-            # Calculate and cache the vertices as Display Lists.
-            # If the path requires a fill color, it will have to be tessellated.
-            if self._cache is not None:
-                if self._cache[0]: flush(self._cache[0])
-                if self._cache[1]: flush(self._cache[1])
-            contours = self.flatten(precision)
-            self._cache = [None, None, precision]
-            if fill   : self._cache[0] = precompile(_draw_fill, contours)
-            if stroke : self._cache[1] = precompile(_draw_stroke, contours)
+        simplify = kw.get("simplify")
+        if precision == AUTO or simplify:
+            tf = _layer is not None and _layer.transform or None
+            lod = _lod(transform_scale(tf))
+        if precision == AUTO:
+            precision, tolerance = FLATNESS, lod
+        if simplify:
+            # The simplification tolerance is in screen space, rounded to a LOD bucket.
+            if simplify is True:
+                simplify = SIMPLIFY_TOLERANCE
+            simplify = lod / FLATNESS_TOLERANCE * simplify
+        else:
+            simplify = None
+        # Thick or dashed strokes are drawn as triangles (see geometry.stroke()).
+        # Thin solid strokes are drawn as OpenGL lines.
+        outline = None
+        if stroke is not None and strokewidth > 0 and (strokewidth > 1 or strokestyle != SOLID):
+            stroke, outline = None, stroke
+        cache = self._geometry(precision, tolerance, fill is not None, stroke is not None, simplify)
+        if outline is not None:
+            v = self._outline(cache, strokewidth, strokestyle, 
+                kw.get("joinstyle", MITER), 
+                kw.get("capstyle", BUTT))
+        if _batch is not None:
+            # Record the path in the current batch.
+            if fill is not None:
+                _batch.triangles(fill, cache[4])
+            if stroke is not None and strokewidth > 0:
+                _batch.append(GL_LINES, stroke, cache[5], strokewidth, strokestyle)
+            if outline is not None:
+                _batch.triangles(outline, v[2])
+            return
+        # Cache the vertices in graphics memory.
+        if cache[0] is None and fill is not None:
+            cache[0] = precompile(cache[4], GL_TRIANGLES)
+        if cache[1] is None and stroke is not None:
+            cache[1] = precompile(cache[5], GL_LINES)
         if fill is not None:
-            glColor4f(fill[0], fill[1], fill[2], fill[3] * _alpha)
-            glCallList(self._cache[0])
+            glstate.color(fill[0], fill[1], fill[2], fill[3] * _alpha)
+            precompiled(cache[0])
         if stroke is not None and strokewidth > 0:
-            glColor4f(stroke[0], stroke[1], stroke[2], stroke[3] * _alpha)
-            glLineWidth(strokewidth)
-            glLineDash(strokestyle)
-            glCallList(self._cache[1])
+            glstate.color(stroke[0], stroke[1], stroke[2], stroke[3] * _alpha)
+            glstate.linewidth(strokewidth)
+            glstate.linedash(strokestyle)
+            precompiled(cache[1])
+        if outline is not None:
+            if v[0] is None:
+                v[0] = precompile(v[2], GL_TRIANGLES)
+            glstate.color(outline[0], outline[1], outline[2], outline[3] * _alpha)
+            precompiled(v[0])
+
+    def _outline(self, cache, strokewidth=1, strokestyle=SOLID, joinstyle=MITER, capstyle=BUTT):
+        # Returns the cached stroke triangles for the given cache item (see _geometry()),
+        # as a [VertexBuffer, None, triangles]-list (so that _flush_path() can flush it).
+        k = (strokewidth, strokestyle, joinstyle, capstyle)
+        if k not in cache[6]:
+            if len(cache[6]) >= LOD_CACHE:
+                _flush_path([cache[6].popitem()[1]])
+            dash = DASH.get(strokestyle, strokestyle)
+            if dash:
+                dash = [d * max(strokewidth, 1) for d in dash]
+            cache[6][k] = [None, None, geometry.stroke(self._flattened(cache), strokewidth, joinstyle, capstyle, dash)]
+        return cache[6][k]
 
     def angle(self, t):
         """ Returns the directional angle at time t (0.0-1.0) on the path.
@@ -1135,28 +1972,54 @@ class BezierPath(list):
         pt0, pt1 = t==0 and (self.point(t), self.point(t+0.001)) or (self.point(t-0.001), self.point(t))
         return geometry.angle(pt0.x, pt0.y, pt1.x, pt1.y)
 
+    def _arclength(self):
+        # Returns the cached arc-length table of the path (see bezier.arclength()).
+        self._update()
+        if self._segments is None:
+            cmds, coords = self._arrays()
+            self._segments = bezier.arclength(cmds, coords, n=10)
+        return self._segments
+
     def point(self, t):
         """ Returns the PathElement at time t (0.0-1.0) on the path.
             See the linear interpolation math in bezier.py.
         """
-        if self._segments is None:
-            self._segments = bezier.length(self, segmented=True, n=10)
-        return bezier.point(self, t, segments=self._segments)
+        if len(self) == 0:
+            raise PathError, "The given path is empty"
+        table = self._arclength()
+        if len(table[1]) == 0:
+            # A path with no length.
+            return bezier.DynamicPathElement(LINETO, ((self[0].x, self[0].y),))
+        return bezier.arcpoint(table, t)
     
     def points(self, amount=2, start=0.0, end=1.0):
         """ Returns a list of PathElements along the path.
             To omit the last point on closed paths: end=1-1.0/amount
         """
-        if self._segments is None:
-            self._segments = bezier.length(self, segmented=True, n=10)
-        return bezier.points(self, amount, start, end, segments=self._segments)
+        if len(self) == 0:
+            raise PathError, "The given path is empty"
+        table = self._arclength()
+        if len(table[1]) == 0:
+            return (self.point(0) for i in xrange(amount))
+        return bezier.arcpoints(table, amount, start, end)
+    
+    def points_array(self, amount=2, start=0.0, end=1.0):
+        """ Returns an array of x, y coordinates (i.e., x1, y1, x2, y2, ...) of points along the path.
+            This is faster than points() for many points, since no PathElement objects are created.
+        """
+        if len(self) == 0:
+            raise PathError, "The given path is empty"
+        table = self._arclength()
+        if len(table[1]) == 0:
+            return array("d", (self[0].x, self[0].y) * amount)
+        return bezier.arcpoints_array(table, amount, start, end)
     
     def addpoint(self, t):
         """ Inserts a new PathElement at time t (0.0-1.0) on the path.
         """
-        self._segments = None
+        table = self._arclength()
         self._index = {}
-        return bezier.insert_point(self, t)
+        return bezier.insert_point(self, t, table=len(table[1]) > 0 and table or None)
         
     split = addpoint
     
@@ -1164,7 +2027,7 @@ class BezierPath(list):
     def length(self, precision=10):
         """ Returns an approximation of the total length of the path.
         """
-        return bezier.length(self, segmented=False, n=precision)
+        return self._arclength()[0][-1]
     
     @property
     def contours(self):
@@ -1173,48 +2036,175 @@ class BezierPath(list):
         """
         return bezier.contours(self)
 
+    def _contour_bounds(self):
+        # Returns the cached bounds of the path + of each contour (see bezier.bounds()).
+        self._update()
+        if self._bounds is None:
+            cmds, coords = self._arrays()
+            contours = bezier.bounds(cmds, coords)
+            if len(contours) > 0:
+                l = min(x for x, y, w, h in contours)
+                t = min(y for x, y, w, h in contours)
+                r = max(x+w for x, y, w, h in contours)
+                b = max(y+h for x, y, w, h in contours)
+                self._bounds = (l, t, r-l, b-t), contours
+            elif len(self) > 0 and self[0].cmd == MOVETO:
+                self._bounds = (self[0].x, self[0].y, 0, 0), contours
+            else:
+                self._bounds = (float("inf"), float("inf"), float("-inf"), float("-inf")), contours
+        return self._bounds
+
+    @property
+    def contour_bounds(self):
+        """ Returns a list of (x, y, width, height)-tuples, the exact dimensions of each contour.
+        """
+        return list(self._contour_bounds()[1])
+
     @property
     def bounds(self, precision=100):
-        """ Returns a (x, y, width, height)-tuple of the approximate path dimensions.
+        """ Returns a (x, y, width, height)-tuple of the exact path dimensions.
         """
-        # In _update(), traverse all the points and check if they have changed.
+        # In _update(), check if the path has changed (see PathVersion).
         # If so, the bounds must be recalculated.
+        return self._contour_bounds()[0]
+
+    def _hittest(self, precision=RELATIVE):
+        # Returns the cached hit test area of the path (see geometry.PolygonIndex).
         self._update()
-        if self._bounds is None:
-            l = t = float( "inf")
-            r = b = float("-inf")
-            for pt in self.points(precision):
-                if pt.x < l: l = pt.x
-                if pt.y < t: t = pt.y
-                if pt.x > r: r = pt.x
-                if pt.y > b: b = pt.y
-            self._bounds = (l, t, r-l, b-t)
-        return self._bounds
+        if self._polygon is None \
+        or self._polygon[1] != precision:
+            self._polygon = geometry.PolygonIndex(self.flatten(precision)), precision
+        return self._polygon[0]
 
-    def contains(self, x, y, precision=100):
+    def contains(self, x, y, precision=RELATIVE):
         """ Returns True when point (x,y) falls within the contours of the path.
+            The precision determines the number of straight lines to use as a substition for a curve.
         """
-        bx, by, bw, bh = self.bounds
-        if bx <= x <= bx+bw and \
-           by <= y <= by+bh:
-                if self._polygon is None \
-                or self._polygon[1] != precision:
-                    self._polygon = [(pt.x,pt.y) for pt in self.points(precision)], precision
+        for bx, by, bw, bh in self._contour_bounds()[1]: # Calls _update().
+            if bx <= x <= bx+bw and \
+               by <= y <= by+bh:
                 # Ray casting algorithm:
-                return geometry.point_in_polygon(self._polygon[0], x, y)
+                return self._hittest(precision).contains(x, y)
         return False
 
+    def contains_many(self, points, precision=RELATIVE):
+        """ Returns a list of True or False for each (x,y)-tuple in the given list,
+            which is faster than calling BezierPath.contains() for each point.
+        """
+        return self._hittest(precision).contains_many(points)
+
+    def _clip(self, path, operation, precision=RELATIVE):
+        # Returns a new BezierPath from the given boolean operation on this path and the given path
+        # (see geometry.clip()). The new path is cached in both paths, by the id of both paths.
+        # For a UNION, INTERSECTION or XOR, the order of the paths does not matter.
+        # The cached path is returned again, unless it has been modified since (e.g., by the user),
+        # or it is still referenced elsewhere. It then keeps its cached vertices, 
+        # so it is not flattened, tessellated and uploaded to graphics memory again.
+        self._update()
+        path._update()
+        a, b = self._id(), path._id()
+        if operation != DIFFERENCE and b < a:
+            a, b = b, a
+        k = (operation, a, b, precision)
+        r = self._clipped.get(k) or path._clipped.get(k)
+        if r is None:
+            r = [geometry.clip(self.flatten(precision), path.flatten(precision), operation), None, None]
+        for p in (self, path):
+            if k not in p._clipped:
+                if len(p._clipped) >= 16:
+                    p._clipped.clear()
+                p._clipped[k] = r
+        # Reference count 3 => the cache, p, getrefcount().
+        p = r[1]
+        if p is None or p._version.n != r[2] or getrefcount(p) > 3:
+            p = r[1] = self._polygons(r[0])
+            r[2] = p._version.n
+        return p
+
+    def _polygons(self, contours):
+        # Returns a new PackedPath (with the same style) from the given list of lists of (x,y)-tuples.
+        # A contour that ends at its first point is closed.
+        cmds, coords = array("B"), array("d")
+        for points in contours:
+            if len(points) == 0:
+                continue
+            closed = len(points) > 2 and points[0] == points[-1]
+            if closed:
+                points = points[:-1]
+            cmds.append(0) # MOVETO
+            cmds.extend([1] * (len(points)-1)) # LINETO
+            for x, y in points:
+                coords.extend((x, y, x, y, x, y))
+            if closed:
+                cmds.append(3) # CLOSE
+                coords.extend((0, 0, 0, 0, 0, 0))
+        p = PackedPath(**self._kwargs)
+        p._cmds = cmds
+        p._coords = coords
+        p._dirty = True
+        return p
+
+    def simplify(self, tolerance=0.5, method=DOUGLAS_PEUCKER, precision=RELATIVE):
+        """ Returns a new path with fewer points, that deviates less than the tolerance from this path.
+            The method can be DOUGLAS_PEUCKER or VISVALINGAM (smoother).
+            Curves are flattened to lines with the given precision (see BezierPath.flatten()).
+        """
+        return self._polygons([geometry.simplify(points, tolerance, method) for points in self.flatten(precision)])
+
+    def resample(self, spacing=1.0, precision=RELATIVE):
+        """ Returns a new path with points at an equal distance (spacing) from each other,
+            along the lines and curves of this path.
+        """
+        return self._polygons([geometry.resample(points, spacing) for points in self.flatten(precision)])
+
+    def union(self, path, precision=RELATIVE):
+        """ Returns a new BezierPath that covers the area of both paths.
+            Curves are flattened to lines with the given precision (see BezierPath.flatten()).
+        """
+        return self._clip(path, UNION, precision)
+
+    def intersection(self, path, precision=RELATIVE):
+        """ Returns a new BezierPath that covers the area where both paths overlap.
+        """
+        return self._clip(path, INTERSECTION, precision)
+
+    def difference(self, path, precision=RELATIVE):
+        """ Returns a new BezierPath that covers the area of this path, minus the given path.
+        """
+        return self._clip(path, DIFFERENCE, precision)
+
+    def xor(self, path, precision=RELATIVE):
+        """ Returns a new BezierPath that covers the area of either path, but not both.
+        """
+        return self._clip(path, XOR, precision)
+
+    intersect = intersection
+
+    def _id(self):
+        # Returns the md5 digest of the packed commands and coordinates of the path.
+        self._update()
+        if None not in self._hashes:
+            cmds, coords = self._arrays()
+            self._hashes[None] = md5(cmds.tostring() + coords.tostring()).digest()
+        return self._hashes[None]
+
     def hash(self, state=None, decimal=1):
         """ Returns the path id, based on the position and handles of its PathElements.
             Two distinct BezierPath objects that draw the same path therefore have the same id.
+            The id is cached until the path is modified.
         """
-        f = lambda x: int(x*10**decimal) # Format floats as strings with given decimal precision.
-        id = [state]
-        for pt in self: id.extend((
-            pt.cmd, f(pt.x), f(pt.y), f(pt.ctrl1.x), f(pt.ctrl1.y), f(pt.ctrl2.x), f(pt.ctrl2.y)))
-        id = str(id)
-        id = md5(id).hexdigest()
-        return id
+        self._update()
+        k = (repr(state), decimal)
+        if k not in self._hashes:
+            # Round the coordinates to the given decimal precision, 
+            # and calculate the md5 hash of the packed commands and coordinates.
+            m = 10**decimal
+            cmds, coords = self._arrays()
+            id = md5(cmds.tostring())
+            id.update(array("d", [float(int(v*m)) for v in coords]).tostring())
+            id.update(k[0])
+            self._hashes[k] = id.hexdigest()
+        return self._hashes[k]
     
     def __repr__(self):
         return "BezierPath(%s)" % repr(list(self))
@@ -1223,8 +2213,203 @@ class BezierPath(list):
         # Note: it is important that __del__() is called since it unloads the cache from GPU.
         # BezierPath and PathElement should contain no circular references, e.g. no PathElement.parent.
         if hasattr(self, "_cache") and self._cache is not None and flush:
-            if self._cache[0]: flush(self._cache[0])
-            if self._cache[1]: flush(self._cache[1])
+            _flush_path(self._cache)
+
+#--- PACKED PATH -------------------------------------------------------------------------------------
+# A BezierPath with many points (e.g., a plot of a large data set) consumes a lot of memory,
+# since each PathElement is an object with two PathPoint objects for its control handles.
+# PackedPath stores the path commands in a byte array and the coordinates in a float array,
+# 6 coordinates per command: ctrl1.x, ctrl1.y, ctrl2.x, ctrl2.y, x, y.
+# It can be used as a BezierPath: the PathElement objects are created on demand,
+# as "views" that read from and write to the arrays. 
+# Views are no longer valid once points are inserted or removed before them.
+
+_PACKED = {MOVETO: 0, LINETO: 1, CURVETO: 2, CLOSE: 3}
+_UNPACKED = (MOVETO, LINETO, CURVETO, CLOSE)
+
+class PackedPathPoint(PathPoint):
+
+    def __init__(self, path, i):
+        """ A control handle view on the coordinates of a PackedPath, at the given array index.
+        """
+        self._path = path
+        self._i = i
+
+    def _get_x(self): return self._path._coords[self._i]
+    def _set_x(self, v): 
+        self._path._coords[self._i] = v
+        self._path._dirty = True
+
+    def _get_y(self): return self._path._coords[self._i+1]
+    def _set_y(self, v):
+        self._path._coords[self._i+1] = v
+        self._path._dirty = True
+
+    x = property(_get_x, _set_x)
+    y = property(_get_y, _set_y)
+
+    def copy(self, parent=None):
+        return PathPoint(self.x, self.y)
+
+class PackedPathElement(PathElement):
+
+    def __init__(self, path, i):
+        """ A PathElement view on the i-th command in a PackedPath.
+        """
+        self._path = path
+        self._i = i
+
+    @property
+    def cmd(self):
+        return _UNPACKED[self._path._cmds[self._i]]
+
+    def _get_x(self): return self._path._coords[self._i*6+4]
+    def _set_x(self, v): 
+        self._path._coords[self._i*6+4] = v
+        self._path._dirty = True
+
+    def _get_y(self): return self._path._coords[self._i*6+5]
+    def _set_y(self, v): 
+        self._path._coords[self._i*6+5] = v
+        self._path._dirty = True
+
+    x = property(_get_x, _set_x)
+    y = property(_get_y, _set_y)
+
+    def _get_ctrl1(self): return PackedPathPoint(self._path, self._i*6)
+    def _set_ctrl1(self, v):
+        self._path._coords[self._i*6+0] = v.x
+        self._path._coords[self._i*6+1] = v.y
+        self._path._dirty = True
+
+    def _get_ctrl2(self): return PackedPathPoint(self._path, self._i*6+2)
+    def _set_ctrl2(self, v):
+        self._path._coords[self._i*6+2] = v.x
+        self._path._coords[self._i*6+3] = v.y
+        self._path._dirty = True
+
+    ctrl1 = property(_get_ctrl1, _set_ctrl1)
+    ctrl2 = property(_get_ctrl2, _set_ctrl2)
+
+class PackedPath(BezierPath):
+
+    def __init__(self, path=None, **kwargs):
+        """ A BezierPath that stores its commands and coordinates in compact arrays.
+            The PathElement objects in the path are created on demand.
+        """
+        BezierPath.__init__(self, None, **kwargs)
+        self._cmds   = array("B") # MOVETO=0, LINETO=1, CURVETO=2, CLOSE=3.
+        self._coords = array("d") # ctrl1.x, ctrl1.y, ctrl2.x, ctrl2.y, x, y, ...
+        if isinstance(path, PackedPath):
+            self._cmds.extend(path._cmds)
+            self._coords.extend(path._coords)
+        elif isinstance(path, (BezierPath, list, tuple)):
+            self.extend(path)
+
+    def copy(self):
+        p = PackedPath(self, **self._kwargs)
+        p._inherit(self)
+        return p
+
+    def _unpack(self, coords):
+        self._coords[:] = coords
+        self._dirty = True
+
+    def _arrays(self):
+        return self._cmds, self._coords
+
+    def _pack(self, pt):
+        # Returns the command and coordinates of the given PathElement.
+        return _PACKED[pt.cmd], (pt.ctrl1.x, pt.ctrl1.y, pt.ctrl2.x, pt.ctrl2.y, pt.x, pt.y)
+
+    def _view(self, i):
+        if i < 0:
+            i += len(self._cmds)
+        if not 0 <= i < len(self._cmds):
+            raise IndexError, "path index out of range"
+        return PackedPathElement(self, i)
+
+    def __len__(self):
+        return len(self._cmds)
+    def __iter__(self):
+        for i in xrange(len(self._cmds)):
+            yield PackedPathElement(self, i)
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._view(j) for j in xrange(*i.indices(len(self._cmds)))]
+        return self._view(i)
+    def __getslice__(self, i, j):
+        return self[max(0, i):max(0, j):]
+    def __contains__(self, pt):
+        return pt in list(self)
+
+    def append(self, pt):
+        cmd, v = self._pack(pt)
+        self._cmds.append(cmd)
+        self._coords.extend(v)
+        self._dirty = True
+    def extend(self, points):
+        for pt in points:
+            self.append(pt)
+    def insert(self, i, pt):
+        i = max(0, min(len(self._cmds), i < 0 and i + len(self._cmds) or i))
+        cmd, v = self._pack(pt)
+        self._cmds.insert(i, cmd)
+        self._coords[i*6:i*6] = array("d", v)
+        self._dirty = True
+    def __setitem__(self, i, pt):
+        i = self._view(i)._i
+        cmd, v = self._pack(pt)
+        self._cmds[i] = cmd
+        self._coords[i*6:i*6+6] = array("d", v)
+        self._dirty = True
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            for j in sorted(xrange(*i.indices(len(self._cmds))), reverse=True):
+                del self[j]
+            return
+        i = self._view(i)._i
+        del self._cmds[i]
+        del self._coords[i*6:i*6+6]
+        self._dirty = True
+    def __delslice__(self, i, j):
+        del self[max(0, i):max(0, j)]
+    def pop(self, i=-1):
+        pt = self._view(i).copy()
+        del self[i]
+        return pt
+    def remove(self, pt):
+        del self[self.index(pt)]
+    def index(self, pt):
+        if isinstance(pt, PackedPathElement) and pt._path is self:
+            return pt._i
+        for i, el in enumerate(self):
+            if el == pt: 
+                return i
+        raise ValueError, "PackedPath.index(x): x not in path"
+    def reverse(self):
+        raise PathError, "can't reverse the order of PathElements in a PackedPath"
+    def sort(self):
+        raise PathError, "can't sort the PathElements in a PackedPath"
+
+    def _add(self, cmd, x1, y1, x2, y2, x3, y3):
+        self._cmds.append(cmd)
+        self._coords.extend((x1, y1, x2, y2, x3, y3))
+        self._dirty = True
+
+    def moveto(self, x, y):
+        self._add(0, x, y, x, y, x, y)
+    def lineto(self, x, y):
+        self._add(1, x, y, x, y, x, y)
+    def curveto(self, x1, y1, x2, y2, x3, y3):
+        self._add(2, x1, y1, x2, y2, x3, y3)
+    def closepath(self):
+        self._add(3, 0, 0, 0, 0, 0, 0)
+
+    def __repr__(self):
+        return "PackedPath(%s)" % repr(list(self))
+
+packedpath = PackedPath
 
 def drawpath(path, **kwargs):
     """ Draws the given BezierPath (or list of PathElements).
@@ -1439,6 +2624,7 @@ def beginclip(path):
         Drawing commands between beginclip() and endclip() are constrained to the shape of the path.
     """
     # Enable the stencil buffer to limit the area of rendering (stenciling).
+    _flush_batch()
     glClear(GL_STENCIL_BUFFER_BIT)
     glEnable(GL_STENCIL_TEST)
     glStencilFunc(GL_NOTEQUAL, 0, 0)
@@ -1447,11 +2633,13 @@ def beginclip(path):
     # In any case, if it is, transparency doesn't work.
     #glDisable(GL_DEPTH_TEST)
     path.draw(fill=(0,0,0,1), stroke=None) # Disregard color settings; always use a black mask.
+    _flush_batch()
     #glEnable(GL_DEPTH_TEST)
     glStencilFunc(GL_EQUAL, 1, 1)
     glStencilOp(GL_KEEP, GL_KEEP, GL_KEEP)
 
 def endclip():
+    _flush_batch()
     glDisable(GL_STENCIL_TEST)
 
 #--- SUPERSHAPE --------------------------------------------------------------------------------------
@@ -1510,6 +2698,8 @@ def texture(img, data=None):
             cache(img, pyglet.image.load(img).get_texture())
         except IOError:
             raise ImageError, "can't load image from %s" % repr(img)
+        finally:
+            glstate.reset("texture")
         return _texture_cache[img]
     # Image texture, return original.
     if isinstance(img, pyglet.image.Texture):
@@ -1523,10 +2713,14 @@ def texture(img, data=None):
         return img.texture
     # Pyglet image data.
     if isinstance(img, pyglet.image.ImageData):
-        return img.texture
+        t = img.texture
+        glstate.reset("texture")
+        return t
     # Image data as byte string, load it, return texture.
     if isinstance(data, basestring):
-        return pyglet.image.load("", file=StringIO(data)).get_texture()
+        t = pyglet.image.load("", file=StringIO(data)).get_texture()
+        glstate.reset("texture")
+        return t
     # Don't know how to handle this image.
     raise ImageError, "unknown image type: %s" % repr(img.__class__)
 
@@ -1561,7 +2755,7 @@ def _render(texture, quad=(0,0,0,0,0,0,0,0)):
     h = texture.height
     dx1, dy1, dx2, dy2, dx3, dy3, dx4, dy4 = quad or (0,0,0,0,0,0,0,0)
     glEnable(texture.target)
-    glBindTexture(texture.target, texture.id)
+    glstate.texture(texture.target, texture.id)
     glBegin(GL_QUADS)
     glTexCoord3f(t[0], t[1],  t[2] ); glVertex3f(dx4,   dy4,   0)
     glTexCoord3f(t[3], t[4],  t[5] ); glVertex3f(dx3+w, dy3,   0)
@@ -1570,6 +2764,16 @@ def _render(texture, quad=(0,0,0,0,0,0,0,0)):
     glEnd()
     glDisable(texture.target)
 
+def _quad(texture, quad=(0,0,0,0,0,0,0,0)):
+    """ Returns a VertexBuffer with the vertices and texture coordinates of the quadrilateral.
+        Unlike _render(), the texture is not bound: it must be enabled and bound before drawing.
+    """
+    t = texture.tex_coords
+    w = texture.width
+    h = texture.height
+    dx1, dy1, dx2, dy2, dx3, dy3, dx4, dy4 = quad or (0,0,0,0,0,0,0,0)
+    return precompile((dx4, dy4, dx3+w, dy3, dx2+w, dy2+h, dx1, dy1+h), GL_QUADS, t)
+
 class Quad(list):
     
     def __init__(self, dx1=0, dy1=0, dx2=0, dy2=0, dx3=0, dy3=0, dx4=0, dy4=0):
@@ -1702,11 +2906,13 @@ class Image(object):
         """ Draws the image.
             The given parameters (if any) override the image's attributes.
         """
-        # Calculate and cache the quad vertices as a Display List.
+        # Images are not batched: draw the primitives recorded so far.
+        _flush_batch()
+        # Calculate and cache the quad vertices in a VertexBuffer.
         # If the quad has changed, update the cache.
         if self._cache is None or self.quad._dirty:
             flush(self._cache)
-            self._cache = precompile(_render, self._texture, self.quad)
+            self._cache = _quad(self._texture, self.quad)
             self.quad._dirty = False
         # Given parameters override Image attributes.
         if x is None: 
@@ -1738,8 +2944,11 @@ class Image(object):
         glPushMatrix()
         glTranslatef(x, y, 0)
         glScalef(w, h, 0)
-        glColor4f(color[0], color[1], color[2], color[3] * _alpha)
-        glCallList(self._cache)
+        glstate.color(color[0], color[1], color[2], color[3] * _alpha)
+        glEnable(self._texture.target)
+        glstate.texture(self._texture.target, self._texture.id)
+        precompiled(self._cache)
+        glDisable(self._texture.target)
         glPopMatrix() 
         if filter:
             filter.pop()
@@ -1748,6 +2957,7 @@ class Image(object):
         """ Exports the image as a PNG-file.
         """
         self._texture.save(path)
+        glstate.reset("texture")
     
     def __repr__(self):
         return "%s(x=%.1f, y=%.1f, width=%.1f, height=%.1f, alpha=%.2f)" % (
@@ -1822,6 +3032,7 @@ class Pixels(list):
             The Pixels object can be passed to the image() command.
         """
         self._img  = texture(img).get_image_data()
+        glstate.reset("texture")
         # A negative pitch means the pixels are stored top-to-bottom row.
         self._flipped = self._img.pitch >= 0
         # Data yields a byte array if no conversion (e.g. BGRA => RGBA) was necessary,
@@ -1905,6 +3116,7 @@ class Pixels(list):
         data = "".join(map(chr, data))
         self._img.set_data("RGBA", self._img.width*4*(-1,1)[self._flipped], data)
         self._texture = self._img.get_texture()
+        glstate.reset("texture")
         
     @property
     def texture(self):
@@ -2150,7 +3362,11 @@ def label(str="", width=None, height=None, **kwargs):
     fill = fill is None and (0,0,0,0) or fill
     # We use begin_update() so that the TextLayout doesn't refresh on each update.
     # FormattedDocument allows individual styling of characters - see Text.style().
-    label = pyglet.text.Label(batch=_label_batch)
+    # The optional batch is a pyglet.graphics.Batch (see TextBatch).
+    batch = kwargs.get("batch")
+    if batch is None:
+        batch = _label_batch
+    label = pyglet.text.Label(batch=batch)
     label.begin_update()
     label.document = pyglet.text.document.FormattedDocument(str or " ")
     label.width     = width    
@@ -2177,7 +3393,9 @@ class Text(object):
             Text has the following properties: 
             text, x, y, width, height, font, fontsize, bold, italic, lineheight, align, fill.
             Individual character ranges can be styled with Text.style().
+            With the optional batch parameter (a TextBatch), the text is drawn with TextBatch.draw().
         """
+        batch = kwargs.pop("batch", None)
         if width is None:
             # Supplying a string with "\n" characters will crash if no width is given.
             # On the outside it appears as None but inside we use a very large number.
@@ -2187,10 +3405,17 @@ class Text(object):
             a = None
         self.__dict__["x"]      = x
         self.__dict__["y"]      = y
-        self.__dict__["_label"] = label(str, width, height, **kwargs)
         self.__dict__["_dirty"] = False
         self.__dict__["_align"] = a
         self.__dict__["_fill"]  = None
+        self.__dict__["_layout"] = None # Key in the text() cache.
+        self.__dict__["_offset"] = (0, 0) # Offset of the label's vertices (see TextBatch).
+        self.__dict__["_batch"]  = None
+        if batch is not None:
+            self.__dict__["_label"] = label(str, width, height, batch=batch._batch, **kwargs)
+            batch.append(self)
+        else:
+            self.__dict__["_label"] = label(str, width, height, **kwargs)
 
     def _get_xy(self):
         return (self.x, self.y)
@@ -2238,7 +3463,10 @@ class Text(object):
         if k in self.__dict__:
             self.__dict__[k] = v; return
         # Setting properties other than x and y requires the label's layout to be updated.
+        # Other than the fill, this also means the text no longer matches its key in the text() cache.
         self.__dict__["_dirty"] = True
+        if k != "fill":
+            self.__dict__["_layout"] = None
         self._label.begin_update()
         if k in ("text", "height", "bold", "italic"):
             setattr(self._label, k, v)
@@ -2273,6 +3501,52 @@ class Text(object):
         if self._dirty:
             self._label.end_update()
             self._dirty = False
+            # The label's vertices are calculated anew, at (0, 0).
+            self._offset = (0, 0)
+
+    def _move(self):
+        # Called from TextBatch.draw().
+        # Moves the vertices of the label to (Text.x, Text.y), without laying out the text again.
+        self._update()
+        x, y = self.x, self.y
+        dx = x - self._offset[0]
+        dy = y - self._offset[1]
+        if dx == 0 and dy == 0:
+            return
+        for vertices in (vl.vertices for vl in self._label._vertex_lists):
+            if len(vertices) > 0 and isinstance(vertices[0], int):
+                # Integer vertices (e.g., "v2i") are moved by whole pixels.
+                x, y = int(round(x)), int(round(y))
+                dx = x - self._offset[0]
+                dy = y - self._offset[1]
+            v = list(vertices)
+            v[0::2] = [vx + dx for vx in v[0::2]]
+            v[1::2] = [vy + dy for vy in v[1::2]]
+            vertices[:] = v
+        self._offset = (x, y)
+
+    def _rebatch(self, batch):
+        # Moves the text to the given pyglet.graphics.Batch.
+        # Pyglet can't move a label to another batch, so a new label is created (with the same styling).
+        self._update()
+        l = label(self.text, self._label.width, self.height, 
+              fontname = self.fontname,
+              fontsize = self.fontsize,
+                  bold = self.bold,
+                italic = self.italic,
+            lineheight = self.lineheight,
+                 align = self._label.get_style("align"),
+                  fill = self.fill,
+                 batch = batch
+        )
+        l.begin_update()
+        for k in self._label.document._style_runs:
+            for i, j, v in self._label.document._style_runs[k]:
+                l.document.set_style(i, j, {k:v})
+        l.end_update()
+        self._label.delete()
+        self._label  = l
+        self._offset = (0, 0)
     
     @property
     def path(self):
@@ -2296,11 +3570,14 @@ class Text(object):
         # Fontsize is rounded, and fontsize 0 will output a default font.
         # Therefore, we don't draw text with a fontsize smaller than 0.5.
         if self._label.font_size >= 0.5:
+            _flush_batch()
             glPushMatrix()
-            glTranslatef(x, y, 0)
             self._update()
+            glTranslatef(x - self._offset[0], y - self._offset[1], 0)
             self._label.draw()
             glPopMatrix()
+            # Pyglet changes the color, blend function and texture.
+            glstate.reset()
     
     def copy(self):
         self._update()
@@ -2345,6 +3622,7 @@ class Text(object):
             else:
                 attributes[k] = v
         self._dirty = True
+        self._layout = None
         self._label.begin_update()
         self._label.document.set_style(i, j, attributes)
 
@@ -2355,9 +3633,101 @@ class Text(object):
         if hasattr(self, "_label") and self._label:
             self._label.delete()
 
-_TEXT_CACHE = 200
-_text_cache = {}
-_text_queue = []
+#--- TEXT BATCH --------------------------------------------------------------------------------------
+# Each Text.draw() is a glPushMatrix(), glTranslatef(), label.draw(), glPopMatrix().
+# For thousands of texts (e.g., node labels in a graph) this is slow.
+# A TextBatch draws all of its texts with one call for each font texture (pyglet.graphics.Batch).
+# Moving a text in the batch moves the vertices of its label, the text is not laid out again.
+# Texts in a batch are drawn with TextBatch.draw(), not Text.draw() (which would draw them twice).
+# For example:
+# batch = TextBatch()
+# for n in graph.nodes:
+#     batch.text(n.id, n.x, n.y, fontsize=9)
+
+class TextBatch(object):
+    
+    def __init__(self, texts=[]):
+        """ A collection of Text objects that are drawn together with TextBatch.draw().
+        """
+        self._batch = pyglet.graphics.Batch()
+        self._texts = []
+        for txt in texts:
+            self.append(txt)
+
+    def text(self, str, x=0, y=0, width=None, height=None, **kwargs):
+        """ Returns a new Text in the batch, with the given string, position and font parameters.
+        """
+        return Text(str, x, y, width, height, batch=self, **kwargs)
+
+    def append(self, txt):
+        """ Adds the given Text to the batch.
+            A Text can only be in one batch (it is removed from the previous batch).
+        """
+        if txt._batch is self:
+            return
+        if txt._batch is not None:
+            txt._batch.remove(txt)
+        if getattr(txt._label, "batch", None) is not self._batch:
+            txt._rebatch(self._batch)
+        txt._batch = self
+        self._texts.append(txt)
+
+    def remove(self, txt):
+        """ Removes the given Text from the batch (it can be drawn with Text.draw()).
+        """
+        self._texts.remove(txt)
+        txt._rebatch(_label_batch)
+        txt._batch = None
+
+    def clear(self):
+        for txt in list(self._texts):
+            self.remove(txt)
+
+    def __len__(self):
+        return len(self._texts)
+    def __iter__(self):
+        return iter(self._texts)
+    def __contains__(self, txt):
+        return txt in self._texts
+
+    def draw(self):
+        """ Draws all the texts in the batch.
+        """
+        _flush_batch()
+        for txt in self._texts:
+            txt._move()
+        self._batch.draw()
+        # Pyglet changes the color, blend function and texture.
+        glstate.reset()
+
+    def __repr__(self):
+        return "TextBatch(texts=%i)" % len(self._texts)
+
+#-----------------------------------------------------------------------------------------------------
+
+# Dynamic texts (i.e., text() with a string) are cached by string, font and layout (width, align, ...)
+# so that drawing the same string every frame does not lay out a new label every frame.
+# The measured size of strings (i.e., textwidth(), textheight(), textmetrics()) is cached separately.
+# When a cache exceeds its size in bytes, the least recently used texts are discarded.
+# The hits and misses are in cache_stats("text") and cache_stats("textmetrics").
+
+# Maximum size in bytes of the cached Text objects (approximately, 128 bytes per character).
+TEXT_CACHE = 4 * 1024 * 1024
+# Maximum size in bytes of the cached text metrics.
+TEXT_METRICS_CACHE = 256 * 1024
+
+_texts = geometry.lrucache("text", 
+    bytes = TEXT_CACHE, 
+   sizeof = lambda txt: 1024 + 128 * len(txt._label.text))
+
+_text_metrics = geometry.lrucache("textmetrics", 
+    bytes = TEXT_METRICS_CACHE, 
+   sizeof = lambda (w, h, n): 64 + 2 * n)
+
+def _text_key(str, width=None, height=None, **kwargs):
+    fontname, fontsize, bold, italic, lineheight, align = font_mixin(**kwargs)
+    return (str, fontname, fontsize, bold, italic, width, height, lineheight, align)
+
 def text(str, x=None, y=None, width=None, height=None, draw=True, **kwargs):
     """ Draws the string at the given position, with the current font().
         Lines of text will span the given width before breaking to the next line.
@@ -2368,45 +3738,46 @@ def text(str, x=None, y=None, width=None, height=None, draw=True, **kwargs):
         txt = str
     else:
         # If the given text is not a Text object, create one on the fly.
-        # Dynamic Text objects are cached by (font, fontsize, bold, italic),
-        # and those that are no longer referenced by the user are recycled.
-        # Changing Text properties is still faster than creating a new Text.
-        # The cache has a limited size (200), so the oldest Text objects are deleted.
-        fontname, fontsize, bold, italic, lineheight, align = font_mixin(**kwargs)
-        fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
-        id = (fontname, int(fontsize), bold, italic)
-        recycled = False
-        if id in _text_cache:
-            for txt in _text_cache[id]:
-                # Reference count 3 => Python, _text_cache[id], txt.
-                # No other variables are referencing the text, so we can recycle it.
-                if getrefcount(txt) == 3:
-                    txt.text = str
-                    txt.x = x or 0
-                    txt.y = y or 0
-                    txt.width = width
-                    txt.height = height
-                    txt.lineheight = lineheight
-                    txt.align = align
-                    txt.fill = fill
-                    recycled = True
-                    break
-        if not recycled:
+        # Dynamic Text objects are cached by (string, font, fontsize, bold, italic, width, ...).
+        # A cached Text that has been modified since (e.g., by the user) no longer matches its key.
+        # A cached Text that is still referenced elsewhere (e.g., text(..., draw=False) kept by the user)
+        # is not reused, since moving it would move the user's text.
+        # Reference count 3 => the cache, txt, getrefcount().
+        # Changing the fill of a cached Text is still faster than creating a new Text.
+        key = _text_key(str, width, height, **kwargs)
+        txt = _texts.get(key)
+        if txt is None or txt._layout != key or getrefcount(txt) > 3:
             txt = Text(str, x or 0, y or 0, width, height, **kwargs)
-            _text_cache.setdefault(id, [])
-            _text_cache[id].append(txt)
-            _text_queue.insert(0, id)
-            for id in reversed(_text_queue[_TEXT_CACHE:]): 
-                del _text_cache[id][0]
-                del _text_queue[-1]
+            txt._layout = key
+            _texts[key] = txt
+        else:
+            fill, stroke, strokewidth, strokestyle = color_mixin(**kwargs)
+            txt.x = x or 0
+            txt.y = y or 0
+            if [int(ch*255) for ch in fill or (0,0,0,0)] != list(txt._label.color):
+                txt.fill = fill
     if draw:
         txt.draw(x, y)
     return txt
 
+def _textmetrics(str, width=None, **kwargs):
+    """ Returns the cached (width, height)-tuple of the given string.
+    """
+    key = _text_key(str, width, **kwargs)
+    m = _text_metrics.get(key)
+    if m is None:
+        # The string is measured with a Text that is not stored in the text() cache,
+        # so measuring many strings doesn't push the texts that are drawn out of the cache.
+        w, h = Text(str, 0, 0, width, **kwargs).metrics
+        m = _text_metrics[key] = (w, h, len(str))
+    return m[:2]
+
 def textwidth(txt, **kwargs):
     """ Returns the width of the given text.
     """
-    if not isinstance(txt, Text) or len(kwargs) > 0:
+    if not isinstance(txt, Text):
+        return _textmetrics(txt, **kwargs)[0]
+    if len(kwargs) > 0:
         kwargs["draw"] = False
         txt = text(txt, 0, 0, **kwargs)
     return txt.metrics[0]
@@ -2414,7 +3785,9 @@ def textwidth(txt, **kwargs):
 def textheight(txt, width=None, **kwargs):
     """ Returns the height of the given text.
     """
-    if not isinstance(txt, Text) or len(kwargs) > 0 or width != txt.width:
+    if not isinstance(txt, Text):
+        return _textmetrics(txt, width, **kwargs)[1]
+    if len(kwargs) > 0 or width != txt.width:
         kwargs["draw"] = False
         txt = text(txt, 0, 0, width=width, **kwargs)
     return txt.metrics[1]
@@ -2422,7 +3795,9 @@ def textheight(txt, width=None, **kwargs):
 def textmetrics(txt, width=None, **kwargs):
     """ Returns a (width, height)-tuple for the given text.
     """
-    if not isinstance(txt, Text) or len(kwargs) > 0 or width != txt.width:
+    if not isinstance(txt, Text):
+        return _textmetrics(txt, width, **kwargs)
+    if len(kwargs) > 0 or width != txt.width:
         kwargs["draw"] = False
         txt = text(txt, 0, 0, width=width, **kwargs)
     return txt.metrics
@@ -2432,41 +3807,103 @@ def textmetrics(txt, width=None, **kwargs):
 class GlyphPathError(Exception):
     pass
 
-import cPickle
-glyphs = {}
-try:
-    # Load cached font glyph path information from nodebox/font/glyph.p.
-    # By default, it has glyph path info for Droid Sans, Droid Sans Mono, Droid Serif.
-    glyphs = path.join(path.dirname(__file__), "..", "font", "glyph.p")
-    glyphs = cPickle.load(open(glyphs))
-except:
-    pass
-
-def textpath(string, x=0, y=0, **kwargs):
-    """ Returns a BezierPath from the given text string.
+# Glyph path information for the default fonts (Droid Sans, Droid Sans Mono, Droid Serif, Arial)
+# is read from nodebox/font/glyph.bin, the first time textpath() is called (see glyphstore.py).
+# Characters that are not in glyph.bin (i.e., non-ASCII) are read from the TrueType files
+# in nodebox/font/ (see truetype.py), as well as the advance width of each character.
+glyphs = glyphstore.GlyphStore(path.join(path.dirname(__file__), "..", "font", "glyph.bin"))
+fonts  = truetype.FontFolder(path.join(path.dirname(__file__), "..", "font"))
+
+def _glyph_weight(bold=False, italic=False):
+    return bold and italic and "bold italic" or bold and "bold" or italic and "italic" or "normal"
+
+# Each glyph is converted once to a path template: packed commands and coordinates at fontsize 1.
+# A textpath() is then a concatenation of templates, scaled to the fontsize and moved to their offset.
+# The advance width of each character is measured once for each font (name, size, bold, italic).
+_glyph_templates = {} # (fontname, weight, character) => (commands, coordinates)-tuple of arrays.
+_advances = {} # (fontname, fontsize, bold, italic) => {character: width}
+_kerning  = {} # (fontname, fontsize, bold, italic) => {(character, character): width adjustment}
+
+def _glyph_template(fontname, weight, ch):
+    """ Returns a (commands, coordinates)-tuple of arrays for the given character,
+        with 6 coordinates for each command (see PackedPath), at fontsize 1.
+    """
+    k = (fontname, weight, ch)
+    if k not in _glyph_templates:
+        try: 
+            cmds, coords = glyphs.glyph(fontname, weight, ch)
+        except (KeyError, IOError, glyphstore.GlyphStoreError):
+            try:
+                cmds, coords = fonts.glyph(fontname, weight, ch)
+            except (KeyError, IOError, truetype.TrueTypeError):
+                raise GlyphPathError, "no glyph path information for %s %s '%s'" % (weight, fontname, ch)
+        v, i, f = array("d"), 0, 0.001
+        for cmd in cmds:
+            if cmd == glyphstore.MOVETO \
+            or cmd == glyphstore.LINETO:
+                x, y = coords[i]*f, -coords[i+1]*f; i+=2
+                v.extend((x, y, x, y, x, y))
+            elif cmd == glyphstore.CURVETO:
+                v.extend((coords[i+2]*f, -coords[i+3]*f, 
+                          coords[i+4]*f, -coords[i+5]*f, 
+                          coords[i+0]*f, -coords[i+1]*f)); i+=6
+            else:
+                v.extend((0, 0, 0, 0, 0, 0))
+        _glyph_templates[k] = (cmds, v)
+    return _glyph_templates[k]
+
+def _advance(font, ch):
+    """ Returns the cached advance width of the given character,
+        for the given (fontname, fontsize, bold, italic)-tuple.
+        For the TrueType fonts in nodebox/font/, this does not need an OpenGL context.
+    """
+    a = _advances.setdefault(font, {})
+    if ch not in a:
+        fontname, fontsize, bold, italic = font
+        try:
+            a[ch] = fonts.advance(fontname, _glyph_weight(bold, italic), ch) * fontsize * 0.001
+        except (KeyError, IOError, truetype.TrueTypeError):
+            a[ch] = textwidth(ch, font=fontname, fontsize=fontsize, bold=bold, italic=italic)
+    return a[ch]
+
+def _kern(font, ch1, ch2):
+    """ Returns the cached width adjustment between the given characters,
+        i.e., the width of both characters minus the advance width of each character.
+    """
+    k = _kerning.setdefault(font, {})
+    if (ch1, ch2) not in k:
+        k[(ch1, ch2)] = textwidth(ch1+ch2, font=font[0], fontsize=font[1], bold=font[2], italic=font[3]) \
+                      - _advance(font, ch1) \
+                      - _advance(font, ch2)
+    return k[(ch1, ch2)]
+
+def textpath(string, x=0, y=0, kerning=False, **kwargs):
+    """ Returns a BezierPath (PackedPath) from the given text string.
         The fontname, fontsize and fontweight can be given as optional parameters,
         width, height, lineheight and align are ignored.
-        Only works with ASCII characters in the default fonts (Droid Sans, Droid Sans Mono, Droid Serif, Arial).
+        With kerning=True, the space between each pair of characters is measured as well.
+        Works with the default fonts (Droid Sans, Droid Sans Mono, Droid Serif: any character in the font,
+        Arial: ASCII characters only).
         See nodebox/font/glyph.py on how to activate other fonts.
     """
     fontname, fontsize, bold, italic, lineheight, align = font_mixin(**kwargs)
-    w = bold and italic and "bold italic" or bold and "bold" or italic and "italic" or "normal"
-    p = BezierPath()
-    f = fontsize / 1000.0
-    for ch in string:
-        try: glyph = glyphs[fontname][w][ch]
-        except:
-            raise GlyphPathError, "no glyph path information for %s %s '%s'" % (w, fontname, ch)
-        for pt in glyph:
-            if pt[0] == MOVETO:
-                p.moveto(x+pt[1]*f, y-pt[2]*f)
-            elif pt[0] == LINETO:
-                p.lineto(x+pt[1]*f, y-pt[2]*f)
-            elif pt[0] == CURVETO:
-                p.curveto(x+pt[3]*f, y-pt[4]*f, x+pt[5]*f, y-pt[6]*f, x+pt[1]*f, y-pt[2]*f)
-            elif pt[0] == CLOSE:
-                p.closepath()
-        x += textwidth(ch, font=fontname, fontsize=fontsize, bold=bold, italic=italic)
+    w = _glyph_weight(bold, italic)
+    font = (fontname, fontsize, bold, italic)
+    cmds, coords = array("B"), array("d")
+    for i, ch in enumerate(string):
+        c, v = _glyph_template(fontname, w, ch)
+        if kerning and i > 0:
+            x += _kern(font, string[i-1], ch)
+        n = len(coords)
+        coords.extend(v)
+        coords[n+0::2] = array("d", [x + u*fontsize for u in v[0::2]])
+        coords[n+1::2] = array("d", [y + u*fontsize for u in v[1::2]])
+        cmds.extend(c)
+        x += _advance(font, ch)
+    p = PackedPath()
+    p._cmds = cmds
+    p._coords = coords
+    p._dirty = True
     return p
 
 #=====================================================================================================
@@ -2730,6 +4167,8 @@ _UID = 0
 def _uid():
     global _UID; _UID+=1; return _UID
 
+_layer = None # The layer currently being drawn.
+
 RELATIVE = "relative" # Origin point is stored as float, e.g. (0.5, 0.5).
 ABSOLUTE = "absolute" # Origin point is stored as int, e.g. (100, 100).
 
@@ -3080,6 +4519,7 @@ class Layer(list, Prototype, EventHandler):
         """
         if self.hidden:
             return
+        _flush_batch()
         glPushMatrix()
         # Be careful that the transformations happen in the same order in Layer._transform().
         # translate => flip => rotate => scale => origin.
@@ -3098,11 +4538,15 @@ class Layer(list, Prototype, EventHandler):
             if layer.top is False:
                 layer._draw()
         # Draw layer.
-        global _alpha
+        global _alpha, _layer
         _alpha = self._opacity.current # XXX should also affect child layers?
+        _flush_batch()
         glPushMatrix()
         glTranslatef(-round(dx), -round(dy), 0) # Layers are drawn relative from parent origin.
+        _layer, layer = self, _layer # Current layer, for BezierPath.draw(precision=AUTO).
         self.draw()
+        _layer = layer
+        _flush_batch()
         glPopMatrix()
         _alpha = 1
         # Draw child layers on top.
@@ -3111,6 +4555,7 @@ class Layer(list, Prototype, EventHandler):
                 layer._draw()
         if self.clipped:
             endclip()
+        _flush_batch()
         glPopMatrix()
         
     def draw(self):
@@ -3550,6 +4995,7 @@ class Canvas(list, Prototype, EventHandler):
         self._elapsed                 = 0           # dt = time elapsed since last frame.
         self._active                  = False       # Application is running?
         self.paused                   = False       # Pause animation?
+        self.batching                 = False       # Record primitives in vertex arrays?
         self._mouse                   = Mouse(self) # The mouse cursor location. 
         self._keys                    = Keys(self)  # The keys pressed on the keyboard.
         self._focus                   = None        # The layer being focused by the mouse.
@@ -3892,7 +5338,7 @@ class Canvas(list, Prototype, EventHandler):
             glEnable(GL_LINE_SMOOTH)
             # Enable alpha transparency.
             glEnable(GL_BLEND)
-            glBlendFuncSeparate(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
+            glstate.blendfunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
             #glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
             self._window.dispatch_events()
             self._window.set_visible(True)
@@ -3907,8 +5353,14 @@ class Canvas(list, Prototype, EventHandler):
         if self.paused: 
             return
         self._window.switch_to()
+        glstate.frame()
+        # With Canvas.batching=True, primitives are recorded in vertex arrays (see beginbatch()).
+        b = None
+        if self.batching:
+            b = beginbatch()
         glPushMatrix()
         self.draw()
+        _flush_batch()
         glPopMatrix()
         glPushMatrix()
         for layer in self:
@@ -3916,7 +5368,10 @@ class Canvas(list, Prototype, EventHandler):
         glPopMatrix()
         glPushMatrix()
         self.draw_overlay()
+        _flush_batch()
         glPopMatrix()
+        if b is not None:
+            b.__exit__()
 
     def _update(self, lapse=0):
         """ Updates the canvas and its layers.
@@ -3956,6 +5411,7 @@ class Canvas(list, Prototype, EventHandler):
     def clear(self):
         """ Clears the previous frame from the canvas.
         """
+        _flush_batch()
         glClear(GL_COLOR_BUFFER_BIT)
         glClear(GL_DEPTH_BUFFER_BIT)
         glClear(GL_STENCIL_BUFFER_BIT)
@@ -4009,13 +5465,15 @@ class Canvas(list, Prototype, EventHandler):
         """ Returns a screenshot of the current frame as a texture.
             This texture can be passed to the image() command.
         """
-        return pyglet.image.get_buffer_manager().get_color_buffer().get_texture()
+        t = pyglet.image.get_buffer_manager().get_color_buffer().get_texture()
+        glstate.reset("texture")
+        return t
         
     buffer = screenshot = render
     
     @property
     def texture(self):
-        return pyglet.image.get_buffer_manager().get_color_buffer().get_texture()
+        return self.render()
 
     def save(self, path):
         """ Exports the current frame as a PNG-file.
@@ -0,0 +1,442 @@
+#=== DISK CACHE ======================================================================================
+# Persistent cache of flattened and tessellated path geometry.
+# Authors: Tom De Smedt, Frederik De Bleser
+# License: BSD (see LICENSE.txt for details).
+# Copyright (c) 2008-2012 City In A Bottle (cityinabottle.org)
+# http://cityinabottle.org/nodebox
+
+# Paths that are drawn with a fill are tessellated (see geometry.triangulate()),
+# paths that are drawn with a stroke are flattened into lines (see bezier.flatten()).
+# For heavy vector graphics (e.g., maps) this takes a while each time the application starts.
+# With disk_cache() enabled (see context.py), the vertices are stored in a file
+# in the user's cache directory, keyed by the path content and precision,
+# and loaded from there the next time the path is drawn.
+# The file is memory-mapped, so only the vertices that are actually used are read from disk.
+
+# From the command line:
+# > python nodebox/graphics/diskcache.py warm mymodule:paths
+# > python nodebox/graphics/diskcache.py stats
+# > python nodebox/graphics/diskcache.py compact
+# > python nodebox/graphics/diskcache.py clear
+# The warm command calls the function paths() in mymodule.py, which returns a list of BezierPath objects.
+# The script does not need a display (unlike python -m nodebox.graphics.diskcache, 
+# which imports nodebox.graphics and opens a window).
+
+import os
+import sys
+from array  import array
+from mmap   import mmap, ACCESS_READ
+from struct import Struct
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Windows: the file is not locked.
+
+#=====================================================================================================
+
+#--- DISK CACHE --------------------------------------------------------------------------------------
+# The file starts with a header (file format version, byte order), followed by records.
+# Each record has a 16-byte key, the number of triangle and line coordinates (-1 if not stored),
+# followed by the coordinates as 4-byte floats (as in graphics memory).
+# New records are appended; if a key is stored twice, the last record is used.
+# Records that were replaced are removed (i.e., the file is compacted) when the file is full,
+# or when more than half of the file is replaced records when it is opened.
+# Several processes can share the file: writes are serialized with a lock file,
+# and records appended (or a file replaced) by another process are indexed when they are needed.
+# The VERSION is increased when the file format, flattening or tessellation changes.
+# Files with a different version are discarded.
+
+VERSION = 3
+
+# Maximum size in bytes of the file.
+# When the file is full (after compacting), new geometry is no longer stored (the cached geometry is kept).
+DISK_CACHE = 64 * 1024 * 1024
+
+_HEADER = Struct("<4sII") # "NBGC", version, byte order.
+_RECORD = Struct("<16sii") # key, number of triangle coordinates, number of line coordinates.
+
+def cachedir():
+    """ Returns the path to the NodeBox cache folder for the current user, for example:
+        ~/.cache/nodebox (Linux), ~/Library/Caches/NodeBox (Mac OS X), %LOCALAPPDATA%/NodeBox/Cache (Windows).
+    """
+    if sys.platform == "win32":
+        return os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~")), "NodeBox", "Cache")
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~"), "Library", "Caches", "NodeBox")
+    return os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")), "nodebox")
+
+class DiskCacheError(Exception):
+    pass
+
+class DiskCache(object):
+
+    def __init__(self, path=None, bytes=DISK_CACHE):
+        """ A file of cached triangle and line vertices, where each key is a 16-byte string.
+            By default, the file is "geometry.cache" in cachedir().
+        """
+        self.path   = path or os.path.join(cachedir(), "geometry.cache")
+        self.bytes  = bytes # Maximum file size.
+        self.hits   = 0
+        self.misses = 0
+        self._index = {}    # Key => (offset, number of triangle coordinates, number of line coordinates).
+        self._size  = 0     # File size (up to the last record in the index).
+        self._live  = 0     # Size of the records in the index (i.e., not replaced).
+        self._inode = None  # File identity, changes when the file is replaced (see _replace()).
+        self._mmap  = None
+        self._file  = None
+        self._lockf = None
+        self._locks = 0
+        self._open()
+
+    @property
+    def header(self):
+        return _HEADER.pack("NBGC", VERSION, sys.byteorder == "little")
+
+    def _lock(self):
+        # Other processes that write to the file (set(), compact(), clear()) wait until it is unlocked.
+        # The lock is held on a separate file, since the cache file is replaced when it is compacted.
+        self._locks += 1
+        if self._locks == 1 and fcntl is not None:
+            if self._lockf is None:
+                self._lockf = open(self.path + ".lock", "a")
+            fcntl.flock(self._lockf.fileno(), fcntl.LOCK_EX)
+
+    def _unlock(self):
+        self._locks -= 1
+        if self._locks == 0 and fcntl is not None:
+            fcntl.flock(self._lockf.fileno(), fcntl.LOCK_UN)
+
+    def _open(self):
+        # Reads the index of the records in the file.
+        # A file with a different version is discarded; a partially written record is removed.
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self._lock()
+        try:
+            if not os.path.exists(self.path) \
+            or os.path.getsize(self.path) < _HEADER.size:
+                self.clear()
+                return
+            f = open(self.path, "rb")
+            try:
+                header = f.read(_HEADER.size)
+            finally:
+                f.close()
+            if header != self.header:
+                self.clear()
+                return
+            self._index = {}
+            self._size  = _HEADER.size
+            self._live  = 0
+            self._scan()
+            if self._size < os.path.getsize(self.path):
+                f = open(self.path, "r+b")
+                f.truncate(self._size)
+                f.close()
+            if self._live < (self._size - _HEADER.size) / 2:
+                self.compact()
+        finally:
+            self._unlock()
+
+    def _scan(self):
+        # Adds the records after the last record in the index to the index.
+        f = open(self.path, "rb")
+        try:
+            s = os.fstat(f.fileno())
+            self._inode = s.st_ino
+            if s.st_size <= self._size:
+                return
+            m = mmap(f.fileno(), 0, access=ACCESS_READ)
+        finally:
+            f.close()
+        i, n = self._size, len(m)
+        while i + _RECORD.size <= n:
+            key, t, l = _RECORD.unpack(m[i:i+_RECORD.size])
+            j = i + _RECORD.size + 4 * (max(t, 0) + max(l, 0))
+            if j > n or t < -1 or l < -1:
+                break
+            if key in self._index:
+                self._live -= self._sizeof(key)
+            self._index[key] = (i + _RECORD.size, t, l)
+            self._live += j - i
+            i = j
+        m.close()
+        self._size = i
+
+    def _sync(self):
+        # Other processes can append records to the file, or replace it (see compact()).
+        # New records are added to the index, if the file was replaced it is indexed again.
+        try:
+            s = os.stat(self.path)
+        except OSError:
+            s = None
+        if s is None or s.st_ino != self._inode or s.st_size < self._size:
+            self._reload()
+        elif s.st_size > self._size:
+            self._scan()
+
+    def _reload(self):
+        self._close()
+        self._index = {}
+        self._size  = 0
+        self._live  = 0
+        self._open()
+
+    def _map(self):
+        # Returns the memory-mapped file, mapped again if records were appended.
+        if self._mmap is None or len(self._mmap) < self._size:
+            if self._mmap is not None:
+                self._mmap.close()
+            if self._file is not None:
+                self._file.flush()
+            f = open(self.path, "rb")
+            try:
+                self._mmap = mmap(f.fileno(), 0, access=ACCESS_READ)
+            finally:
+                f.close()
+        return self._mmap
+
+    def get(self, key):
+        """ Returns a (triangles, lines)-tuple of float arrays for the given key, or None.
+            The triangles or lines are None if they were not stored.
+        """
+        if key not in self._index:
+            self._sync()
+        v = None
+        if key in self._index:
+            v = self._read(key)
+        if v is None and key in self._index:
+            # The file was changed by another process.
+            self._reload()
+            if key in self._index:
+                v = self._read(key)
+        if v is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return v
+
+    def _read(self, key):
+        # Returns the (triangles, lines) in the record with the given key,
+        # or None if the record in the file does not match the index.
+        i, t, l = self._index[key]
+        m = self._map()
+        if m[i-_RECORD.size:i] != _RECORD.pack(key, t, l) \
+        or i + 4 * (max(t, 0) + max(l, 0)) > len(m):
+            return None
+        v = []
+        for n in (t, l):
+            if n < 0:
+                v.append(None)
+            else:
+                a = array("f")
+                a.fromstring(m[i:i+4*n])
+                if sys.byteorder != "little":
+                    a.byteswap()
+                v.append(a)
+                i += 4*n
+        return tuple(v)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def _sizeof(self, key):
+        # Returns the size in bytes of the record with the given key.
+        i, t, l = self._index[key]
+        return _RECORD.size + 4 * (max(t, 0) + max(l, 0))
+
+    def set(self, key, triangles=None, lines=None):
+        """ Stores the given list of triangle and/or line coordinates with the given 16-byte key.
+            If the key is already stored, the triangles or lines that are not given are kept,
+            so that there is a single record for each key.
+            Returns False if the file is full.
+        """
+        if len(key) != 16:
+            raise DiskCacheError, "key must be a 16-byte string (e.g., md5 digest)"
+        self._lock()
+        try:
+            self._sync()
+            v = None
+            if key in self._index:
+                v = self._read(key)
+                if v is None:
+                    self._reload()
+                    if key in self._index:
+                        v = self._read(key)
+            if v is not None:
+                # The record with the same key is replaced (see compact()).
+                if triangles is None:
+                    triangles = v[0]
+                if lines is None:
+                    lines = v[1]
+            v, m = [], []
+            for a in (triangles, lines):
+                if a is None:
+                    m.append(-1)
+                else:
+                    a = array("f", a)
+                    if sys.byteorder != "little":
+                        a.byteswap()
+                    m.append(len(a))
+                v.append(a)
+            t, l = m
+            n = _RECORD.size + 4 * (max(t, 0) + max(l, 0))
+            if self._size + n > self.bytes and self._size > _HEADER.size + self._live:
+                self.compact()
+            if self._size + n > self.bytes:
+                return False
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            # The record is appended at the end of the file, 
+            # which is the end of the last record in the index (unless the file was truncated).
+            self._file.seek(0, 2)
+            i = self._file.tell()
+            self._file.write(_RECORD.pack(key, t, l))
+            for a in v:
+                if a is not None:
+                    self._file.write(a.tostring())
+            self._file.flush()
+            if key in self._index:
+                self._live -= self._sizeof(key)
+            self._index[key] = (i + _RECORD.size, t, l)
+            self._size = i + n
+            self._live += n
+            return True
+        finally:
+            self._unlock()
+
+    def compact(self):
+        """ Removes the records that were replaced by a newer record with the same key.
+        """
+        self._lock()
+        try:
+            self._sync()
+            if self._size == _HEADER.size + self._live:
+                return
+            m = self._map()
+            f = open(self.path + ".tmp", "wb")
+            f.write(self.header)
+            index = {}
+            i = _HEADER.size
+            for key, (j, t, l) in sorted(self._index.items(), key=lambda item: item[1][0]):
+                n = 4 * (max(t, 0) + max(l, 0))
+                f.write(_RECORD.pack(key, t, l))
+                f.write(m[j:j+n])
+                index[key] = (i + _RECORD.size, t, l)
+                i += _RECORD.size + n
+            f.close()
+            self._replace(self.path + ".tmp")
+            self._index = index
+            self._size = i
+            self._live = i - _HEADER.size
+        finally:
+            self._unlock()
+
+    def clear(self):
+        """ Removes all cached geometry from the file.
+        """
+        self._lock()
+        try:
+            f = open(self.path + ".tmp", "wb")
+            f.write(self.header)
+            f.close()
+            self._replace(self.path + ".tmp")
+            self._index = {}
+            self._size = _HEADER.size
+            self._live = 0
+        finally:
+            self._unlock()
+
+    def _replace(self, path):
+        # Replaces the file with the given file.
+        # Other processes keep reading the old file (which they have open) until they notice (see _sync()),
+        # so it is not truncated in-place.
+        self._close()
+        if sys.platform == "win32" and os.path.exists(self.path):
+            os.remove(self.path) # Windows can't rename to an existing file.
+        os.rename(path, self.path)
+        self._inode = os.stat(self.path).st_ino
+
+    def _close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        if self._file is not None:
+            self._file.close()
+        self._mmap = None
+        self._file = None
+
+    def close(self):
+        self._close()
+        if self._lockf is not None and self._locks == 0:
+            self._lockf.close()
+            self._lockf = None
+
+    def stats(self):
+        return {
+             "path": self.path,
+            "items": len(self._index),
+            "bytes": self._size,
+            "limit": self.bytes,
+             "hits": self.hits,
+           "misses": self.misses
+        }
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return "DiskCache(path=%s, items=%i, bytes=%i)" % (repr(self.path), len(self._index), self._size)
+
+#=====================================================================================================
+
+#--- COMMAND LINE ------------------------------------------------------------------------------------
+
+def _warm(paths, precision):
+    # Flattens and tessellates each path, so that its vertices are stored in the disk cache.
+    n = 0
+    for p in paths:
+        p._geometry(precision, None, fill=True, stroke=True)
+        n += 1
+    return n
+
+def main(args):
+    usage = "usage: python diskcache.py [warm module:function [precision] | stats | compact | clear]"
+    if len(args) == 0 or args[0] not in ("warm", "stats", "compact", "clear"):
+        print usage
+        return 1
+    if args[0] == "warm":
+        if len(args) < 2 or ":" not in args[1]:
+            print usage
+            return 1
+        module, function = args[1].split(":", 1)
+        sys.path.insert(0, os.getcwd())
+        paths = getattr(__import__(module, {}, {}, [function]), function)()
+        # The paths use the disk cache of the context module they were created with.
+        # If the given module did not import nodebox.graphics, 
+        # context.py is imported from this folder (without opening a window).
+        context = sys.modules.get("nodebox.graphics.context")
+        if context is None:
+            import context
+        context.disk_cache(True)
+        precision = context.RELATIVE
+        if len(args) > 2 and args[2].isdigit():
+            precision = int(args[2])
+        elif len(args) > 2:
+            precision = float(args[2])
+        print "warmed %i paths" % _warm(paths, precision)
+        print context.disk_cache().stats()
+    if args[0] == "stats":
+        print DiskCache().stats()
+    if args[0] == "compact":
+        cache = DiskCache()
+        cache.compact()
+        print cache.stats()
+    if args[0] == "clear":
+        DiskCache().clear()
+        print "cleared"
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -6,7 +6,10 @@
 # http://cityinabottle.org/nodebox
 
 from math import sqrt, pow
-from math import sin, cos, atan2, degrees, radians, pi
+from math import sin, cos, acos, atan2, degrees, radians, pi
+from array import array
+from itertools import izip
+from heapq import heapify, heappush, heappop
 
 INFINITE = 1e15 # float("inf") doesn't work on windows.
 
@@ -158,6 +161,160 @@ def point_in_polygon(points, x, y):
                 odd = not odd
     return odd
 
+class PolygonIndex(object):
+    
+    def __init__(self, contours):
+        """ A hit test area for the given list of polygons (lists of (x,y)-tuples), e.g. path contours.
+            The bounds are divided into a grid of cells. Each cell stores the edges that pass through it,
+            and the winding number at a reference point in the cell.
+            For PolygonIndex.contains(x, y), only the edges in the cell at (x,y) need to be checked,
+            to find the edges crossed between the reference point and the given point.
+            Points inside an odd number of polygons are inside (i.e. holes are supported).
+        """
+        edges = []
+        for points in contours:
+            n = len(points)
+            for i in range(n):
+                x0, y0 = points[i-1][0], points[i-1][1]
+                x1, y1 = points[i][0], points[i][1]
+                if y0 != y1:
+                    edges.append((x0, y0, x1, y1, float(x1-x0) / (y1-y0)))
+                elif x0 != x1:
+                    edges.append((x0, y0, x1, y1, None)) # Horizontal edge.
+        self.edges = len(edges)
+        self.bounds = (0, 0, 0, 0)
+        self.size = 0
+        if edges:
+            x = [e[0] for e in edges]
+            y = [e[1] for e in edges]
+            bx, by = min(x), min(y)
+            bw, bh = max(x)-bx, max(y)-by
+            self.bounds = (bx, by, bw, bh)
+            # The grid has about 1 edge per cell for polygons of uniform density.
+            # An edge is stored in each cell it passes through, so for long edges (e.g. noisy data)
+            # the grid is made coarser, so that an edge is stored in about 8 cells on average.
+            m = sum(abs(x1-x0) / (bw or 1.0) + abs(y1-y0) / (bh or 1.0) for x0, y0, x1, y1, d in edges)
+            n = int(max(1, min(len(edges)**0.5, 8.0 * len(edges) / (m or 1.0), 1024)))
+            self.size = n
+            self._sx = sx = bw and n / float(bw) or 0.0
+            self._sy = sy = bh and n / float(bh) or 0.0
+            # The reference points are not at the center of the cells,
+            # to avoid the vertices of polygons that are aligned to the grid.
+            self._rx = rx = [bx + (i + 0.382) * bw / n for i in range(n)]
+            self._ry = ry = [by + (j + 0.437) * bh / n for j in range(n)]
+            self._cells = cells = [[] for k in range(n*n)]
+            crossings = [[] for j in range(n)]
+            for e in edges:
+                x0, y0, x1, y1, d = e
+                ya, yb = min(y0, y1), max(y0, y1)
+                for j in range(self._row(ya), self._row(yb)+1):
+                    if d is None:
+                        xa, xb = x0, x1
+                    else:
+                        # The part of the edge in this row.
+                        xa = x0 + (max(ya, by + j / sy) - y0) * d
+                        xb = x0 + (min(yb, by + (j+1) / sy) - y0) * d
+                        # The edges that cross the row at the reference points.
+                        if ya < ry[j] <= yb:
+                            crossings[j].append((x0 + (ry[j]-y0) * d, y0 < y1 and 1 or -1))
+                    k = j * n
+                    for i in range(self._col(min(xa, xb)), self._col(max(xa, xb))+1):
+                        cells[k+i].append(e)
+            # The winding number at each reference point (ray casting algorithm).
+            self._ref = ref = [0] * (n*n)
+            for j in range(n):
+                w = 0
+                c = sorted(crossings[j])
+                m = 0
+                for i in range(n):
+                    while m < len(c) and c[m][0] < rx[i]:
+                        w += c[m][1]
+                        m += 1
+                    ref[j*n+i] = w
+
+    def _col(self, x):
+        return max(0, min(int((x - self.bounds[0]) * self._sx), self.size-1))
+
+    def _row(self, y):
+        return max(0, min(int((y - self.bounds[1]) * self._sy), self.size-1))
+
+    def _winding(self, points, k):
+        # Returns the winding numbers of the given points in cell k:
+        # the winding number at the reference point (rx, ry) of the cell,
+        # plus the edges crossed from (rx, ry) to (rx, y) and from (rx, y) to (x, y).
+        n = self.size
+        rx = self._rx[k % n]
+        ry = self._ry[k // n]
+        a = [self._ref[k]] * len(points)
+        for x0, y0, x1, y1, d in self._cells[k]:
+            w1 = y0 < y1 and 1 or -1
+            w2 = 0
+            if (x0 < rx) != (x1 < rx):
+                # The edge crosses the vertical line at rx, at yy.
+                w2 = x0 < x1 and 1 or -1
+                if d is None:
+                    yy = y0
+                else:
+                    yy = y0 + (rx-x0) / d
+            for i, (x, y) in enumerate(points):
+                if d is not None and ((y0 < y <= y1) or (y1 < y <= y0)):
+                    xx = x0 + (y-y0) * d
+                    if rx <= xx < x:
+                        a[i] += w1
+                    elif x <= xx < rx:
+                        a[i] -= w1
+                if w2 != 0:
+                    # The winding number changes at yy if the edge goes right (d > 0),
+                    # or just above yy otherwise, as in the ray casting algorithm.
+                    if d is not None and d > 0:
+                        if ry < yy <= y:
+                            a[i] -= w2
+                        elif y < yy <= ry:
+                            a[i] += w2
+                    else:
+                        if ry <= yy < y:
+                            a[i] -= w2
+                        elif y <= yy < ry:
+                            a[i] += w2
+        return a
+
+    def contains(self, x, y):
+        """ Returns True when point (x,y) falls within an odd number of polygons.
+        """
+        return self.winding(x, y) % 2 != 0
+
+    def winding(self, x, y):
+        """ Returns the winding number of point (x,y), i.e., the number of times the polygons
+            go around the point counterclockwise (+1) or clockwise (-1). 
+            With the nonzero winding rule, the point is inside when the winding number is not 0.
+        """
+        bx, by, bw, bh = self.bounds
+        if not (bx <= x <= bx+bw and by < y <= by+bh):
+            return 0
+        return self._winding([(x, y)], self._row(y) * self.size + self._col(x))[0]
+
+    def winding_many(self, points):
+        """ Returns a list of winding numbers for each (x,y)-tuple in the given list,
+            which is faster than calling PolygonIndex.winding() for each point.
+            The points are grouped by cell, so that the edges in each cell are visited once.
+        """
+        bx, by, bw, bh = self.bounds
+        cells = {}
+        for i, (x, y) in enumerate(points):
+            if bx <= x <= bx+bw and by < y <= by+bh:
+                k = self._row(y) * self.size + self._col(x)
+                cells.setdefault(k, []).append(i)
+        a = [0] * len(points)
+        for k, indices in cells.iteritems():
+            for i, w in zip(indices, self._winding([points[i] for i in indices], k)):
+                a[i] = w
+        return a
+
+    def contains_many(self, points):
+        """ Returns a list of True or False for each (x,y)-tuple in the given list.
+        """
+        return [w % 2 != 0 for w in self.winding_many(points)]
+
 #=====================================================================================================
 
 #--- AFFINE TRANSFORM --------------------------------------------------------------------------------
@@ -272,31 +429,45 @@ class AffineTransform:
         return (x*m[0]+y*m[3]+m[6], x*m[1]+y*m[4]+m[7])
         
     apply = transform_point
-    
-    def transform_path(self, path):
+
+    def transform_points(self, points, out=None):
+        """ Returns an array with the new coordinates of the given flat list (or array) 
+            of x, y coordinates after transformation.
+            The optional out is an array in which the coordinates are stored,
+            e.g., transform_points(a, out=a) transforms array a in-place.
+        """
+        a, b, _, c, d, _, e, f, _ = self.matrix
+        if out is None:
+            out = array(isinstance(points, array) and points.typecode or "d", points)
+        X = points[0::2]
+        Y = points[1::2]
+        if b == 0 and c == 0:
+            # Translation and scaling only.
+            out[0::2] = array(out.typecode, [x*a+e for x in X])
+            out[1::2] = array(out.typecode, [y*d+f for y in Y])
+        else:
+            out[0::2] = array(out.typecode, [x*a+y*c+e for x, y in izip(X, Y)])
+            out[1::2] = array(out.typecode, [x*b+y*d+f for x, y in izip(X, Y)])
+        return out
+
+    def transform_path(self, path, copy=True):
         """ Returns a BezierPath object with the transformation applied.
+            With copy=False, the given path is transformed in-place (see BezierPath.transform()).
         """
-        p = path.__class__() # Create a new BezierPath.
-        for pt in path:
-            if pt.cmd == "close":
-                p.closepath()
-            elif pt.cmd == "moveto":
-                p.moveto(*self.apply(pt.x, pt.y))
-            elif pt.cmd == "lineto":
-                p.lineto(*self.apply(pt.x, pt.y))
-            elif pt.cmd == "curveto":
-                vx1, vy1 = self.apply(pt.ctrl1.x, pt.ctrl1.y)
-                vx2, vy2 = self.apply(pt.ctrl2.x, pt.ctrl2.y)
-                x, y = self.apply(pt.x, pt.y)
-                p.curveto(vx1, vy1, vx2, vy2, x, y)
-        return p
+        if copy:
+            path = path.copy()
+        path.transform(self)
+        return path
     
     # Compatibility with NodeBox.
     transformPoint = transform_point
     transformBezierPath = transform_path
     
     def map(self, points):
-        return [self.apply(*pt) for pt in points]
+        """ Returns a list of (x,y)-tuples with the transformation applied to the given (x,y)-tuples.
+        """
+        a, b, _, c, d, _, e, f, _ = self.matrix
+        return [(x*a+y*c+e, x*b+y*d+f) for x, y in points]
 
 Transform = AffineTransform
 
@@ -415,6 +586,181 @@ class Bounds:
 
 #=====================================================================================================
 
+#--- LRU CACHE ---------------------------------------------------------------------------------------
+# A cache that holds a limited number of items (or bytes), 
+# discarding the least recently used item when it is full.
+# The items are kept in a dictionary and in a doubly linked list (most recently used at the end),
+# so that lookups, updates and evictions are O(1).
+
+_PREV, _NEXT, _KEY, _VALUE, _SIZE = 0, 1, 2, 3, 4
+
+class LRUCache(object):
+
+    def __init__(self, size=None, bytes=None, sizeof=None, evict=None):
+        """ A dictionary that discards the least recently used items
+            when it holds more than the given number of items or bytes (None = no limit).
+            The optional sizeof function returns the size in bytes of a value.
+            The optional evict function is called with the key and value of each discarded item.
+        """
+        self._map      = {}
+        self._root     = [None, None, None, None, 0] # Sentinel of the linked list.
+        self._root[_PREV] = self._root[_NEXT] = self._root
+        self._sizeof   = sizeof
+        self._evict    = evict
+        self.size      = size
+        self.bytes     = bytes
+        self.nbytes    = 0 # Total size of the cached values in bytes.
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._map)
+    def __contains__(self, key):
+        return key in self._map
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        """ Returns the keys, from least to most recently used.
+        """
+        a, link = [], self._root[_NEXT]
+        while link is not self._root:
+            a.append(link[_KEY]); link=link[_NEXT]
+        return a
+
+    def _touch(self, link):
+        # Moves the given link to the end of the list (most recently used).
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+        last = self._root[_PREV]
+        last[_NEXT] = self._root[_PREV] = link
+        link[_PREV] = last
+        link[_NEXT] = self._root
+
+    def get(self, key, default=None):
+        """ Returns the cached value for the given key (or the default value),
+            and updates the hits and misses counters.
+        """
+        link = self._map.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._touch(link)
+        return link[_VALUE]
+
+    def __getitem__(self, key):
+        link = self._map.get(key)
+        if link is None:
+            self.misses += 1
+            raise KeyError, key
+        self.hits += 1
+        self._touch(link)
+        return link[_VALUE]
+
+    def __setitem__(self, key, value):
+        if key in self._map:
+            self._remove(key)
+        n = self._sizeof and self._sizeof(value) or 0
+        last = self._root[_PREV]
+        last[_NEXT] = self._root[_PREV] = self._map[key] = [last, self._root, key, value, n]
+        self.nbytes += n
+        self.trim()
+
+    def _remove(self, key):
+        link = self._map.pop(key)
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+        self.nbytes -= link[_SIZE]
+        return link
+
+    def pop(self, key, default=None):
+        """ Removes the given key from the cache and returns its value (without calling evict).
+        """
+        if key not in self._map:
+            return default
+        return self._remove(key)[_VALUE]
+
+    def __delitem__(self, key):
+        self._remove(key)
+
+    def trim(self):
+        """ Discards the least recently used items until the cache is within its limits.
+            The most recently used item is never discarded.
+        """
+        while len(self._map) > 1 and (
+          self.size  is not None and len(self._map) > self.size or
+          self.bytes is not None and self.nbytes > self.bytes):
+            link = self._remove(self._root[_NEXT][_KEY])
+            self.evictions += 1
+            if self._evict is not None:
+                self._evict(link[_KEY], link[_VALUE])
+
+    def clear(self):
+        """ Discards all items (calling evict for each item).
+        """
+        for k in self.keys():
+            link = self._remove(k)
+            if self._evict is not None:
+                self._evict(link[_KEY], link[_VALUE])
+
+    def stats(self):
+        """ Returns a dictionary with the number of items, bytes, hits, misses and evictions.
+        """
+        return {
+                "items": len(self._map),
+                "bytes": self.nbytes,
+                 "size": self.size,
+                "limit": self.bytes,
+                 "hits": self.hits,
+               "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def __repr__(self):
+        return "LRUCache(items=%i, bytes=%i, hits=%i, misses=%i, evictions=%i)" % (
+            len(self._map), self.nbytes, self.hits, self.misses, self.evictions)
+
+# Shape caches (e.g., tessellated paths, cached stars and ellipses) are registered by name,
+# so that their limits can be changed and their usage inspected in one place.
+_caches = {}
+
+def lrucache(name, size=None, bytes=None, sizeof=None, evict=None):
+    """ Returns a new LRUCache, registered with the given name (see cache_stats()).
+    """
+    _caches[name] = LRUCache(size, bytes, sizeof, evict)
+    return _caches[name]
+
+def cache_limit(name, size=None, bytes=None):
+    """ Sets the maximum number of items and/or bytes for the registered cache with the given name.
+        Items are discarded immediately if the cache exceeds the new limit.
+    """
+    if name not in _caches:
+        raise KeyError, "no cache named '%s'" % name
+    if size is not None:
+        _caches[name].size = size
+    if bytes is not None:
+        _caches[name].bytes = bytes
+    _caches[name].trim()
+
+def cache_stats(name=None):
+    """ Returns a dictionary of cache name => dictionary of items, bytes, hits, misses and evictions,
+        for all registered caches (or the stats of the cache with the given name).
+    """
+    if name is not None:
+        return _caches[name].stats()
+    return dict((k, c.stats()) for k, c in _caches.items())
+
+def cache_clear(name=None):
+    """ Discards all items in the registered caches (or in the cache with the given name).
+    """
+    for k, c in _caches.items():
+        if name is None or name == k:
+            c.clear()
+
+#=====================================================================================================
+
 #--- TESSELLATION ------------------------------------------------------------------------------------
 # OpenGL can only display simple convex polygons directly.
 # A polygon is simple if the edges intersect only at vertices, there are no duplicate vertices, 
@@ -449,44 +795,43 @@ class Bounds:
 #  EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from sys import platform
+from hashlib import md5
+from itertools import chain
 from ctypes import CFUNCTYPE, POINTER, byref, cast, pointer
 from ctypes import CFUNCTYPE as _CFUNCTYPE
-from pyglet.gl import \
-    GLdouble, GLvoid, GLenum, GLfloat, \
-    gluNewTess, gluTessProperty, gluTessNormal, gluTessCallback, gluTessVertex, \
-    gluTessBeginPolygon, gluTessEndPolygon, \
-    gluTessBeginContour, gluTessEndContour, \
-    GLU_TESS_WINDING_RULE, GLU_TESS_WINDING_NONZERO, \
-    GLU_TESS_VERTEX, GLU_TESS_BEGIN, GLU_TESS_END, GLU_TESS_ERROR, GLU_TESS_COMBINE, \
-    GL_TRIANGLE_FAN, GL_TRIANGLE_STRIP, GL_TRIANGLES, GL_LINE_LOOP
+
+# The GLU tessellator is only used if the C triangulator (nodebox/ext/triangulate.c) is not compiled.
+# The geometry module can be used without OpenGL (e.g. in unit tests), 
+# in which case a slower Python version of the triangulator is used.
+try:
+    from pyglet.gl import \
+        GLdouble, GLvoid, GLenum, GLfloat, \
+        gluNewTess, gluTessProperty, gluTessNormal, gluTessCallback, gluTessVertex, \
+        gluTessBeginPolygon, gluTessEndPolygon, \
+        gluTessBeginContour, gluTessEndContour, gluErrorString, \
+        GLU_TESS_WINDING_RULE, GLU_TESS_WINDING_NONZERO, GLU_TESS_WINDING_ODD, \
+        GLU_TESS_VERTEX, GLU_TESS_BEGIN, GLU_TESS_END, GLU_TESS_ERROR, GLU_TESS_COMBINE, \
+        GL_TRIANGLE_FAN, GL_TRIANGLE_STRIP, GL_TRIANGLES, GL_LINE_LOOP
+    _tessellator = gluNewTess()
+except:
+    _tessellator = None
 
 if platform == "win32":
     from ctypes import WINFUNCTYPE as CFUNCTYPE
 
-_tessellator = gluNewTess()
-
 # Winding rule determines the regions that should be filled and those that should remain unshaded.
 # Winding direction is determined by the normal.
-gluTessProperty(_tessellator, GLU_TESS_WINDING_RULE, GLU_TESS_WINDING_NONZERO)
-gluTessNormal(_tessellator, 0, 0, 1)
-
-# As tessellation proceeds, callback routines are called in a manner 
-# similar to OpenGL commands glBegin(), glEdgeFlag*(), glVertex*(), and glEnd().
-# The callback functions must be C functions so we need to cast our Python callbacks to C.
-_tessellate_callback_type = {
-    GLU_TESS_VERTEX  : CFUNCTYPE(None, POINTER(GLvoid)),
-    GLU_TESS_BEGIN   : CFUNCTYPE(None, GLenum),
-    GLU_TESS_END     : CFUNCTYPE(None),
-    GLU_TESS_ERROR   : CFUNCTYPE(None, GLenum),
-    GLU_TESS_COMBINE : CFUNCTYPE(None, 
-        POINTER(GLdouble), 
-        POINTER(POINTER(GLvoid)), 
-        POINTER(GLfloat), 
-        POINTER(POINTER(GLvoid))) 
-}
+# With NONZERO, a point is inside if the contours around it don't cancel each other out 
+# (i.e. a contour in the opposite direction punches a hole).
+# With ODD, a point is inside if it is surrounded by an odd number of contours.
+NONZERO = "nonzero"
+ODD     = "odd"
 
+# Maximum size in bytes of the cached triangles (8 bytes per coordinate).
 # One path with a 100 points is somewhere around 15KB.
-TESSELLATION_CACHE = 100
+# When the cache is full, the least recently used triangles are discarded.
+# The cache size can be changed with cache_limit("tessellation", bytes=...).
+TESSELLATION_CACHE = 4 * 1024 * 1024
 
 class TessellationError(Exception):
     pass
@@ -496,91 +841,98 @@ class Tessellate(list):
         while tessellate() is processing.
     """
     def __init__(self): 
-        self.cache = {}         # Cache of previously triangulated contours
-        self.queue = []         # Latest contours appear at the end of the list.
+        self.cache = lrucache(  # Cache of previously triangulated contours.
+            "tessellation", bytes=TESSELLATION_CACHE, sizeof=lambda triangles: len(triangles) * 8)
         self.reset()
     def clear(self):
         list.__init__(self, []) # Populated during _tessellate_vertex().
     def reset(self):
         self.clear()
         self.mode      = None   # GL_TRIANGLE_FAN | GL_TRIANGLE_STRIP | GL_TRIANGLES.
-        self.triangles = []     # After tessellation, contains lists of (x,y)-vertices,
+        self.triangles = []     # After tessellation, contains a flat list of x, y coordinates,
         self._combined = []     # which can be drawn with glBegin(GL_TRIANGLES) mode.
 
 _tessellate = Tessellate()
 
-def _tessellate_callback(type):
-    # Registers a C version of a Python callback function for gluTessCallback().
-    def _C(function):
-        f = _tessellate_callback_type[type](function)
-        gluTessCallback(_tessellator, type, cast(f, _CFUNCTYPE(None)))
-        return f
-    return _C
-
-@_tessellate_callback(GLU_TESS_BEGIN)
-def _tessellate_begin(mode):
-    # Called to indicate the start of a triangle.
-    _tessellate.mode = mode
-    
-@_tessellate_callback(GLU_TESS_VERTEX)
-def _tessellate_vertex(vertex):
-    # Called to define the vertices of triangles created by the tessellation.
-    _tessellate.append(list(cast(vertex, POINTER(GLdouble))[0:2]))
-
-@_tessellate_callback(GLU_TESS_END)
-def _tessellate_end():
-    # Called to indicate the end of a primitive.
-    # GL_TRIANGLE_FAN defines triangles with a same origin (pt1).
-    if _tessellate.mode in (GL_TRIANGLE_FAN, GL_TRIANGLE_STRIP):
-        pt1 = _tessellate.pop(0)
-        pt2 = _tessellate.pop(0)
-        while _tessellate:
-            pt3 = _tessellate.pop(0)
-            _tessellate.triangles.extend([pt1, pt2, pt3])
-            if _tessellate.mode == GL_TRIANGLE_STRIP: 
-                pt1 = pt2
-            pt2 = pt3
-    elif _tessellate.mode == GL_TRIANGLES:
-        _tessellate.triangles.extend(_tessellate)
-    elif _tessellate.mode == GL_LINE_LOOP:
-        pass
-    _tessellate.mode  = None
-    _tessellate.clear()
-    
-@_tessellate_callback(GLU_TESS_COMBINE)
-def _tessellate_combine(coords, vertex_data, weights, dataOut):
-    # Called when the tessellation detects an intersection.
-    x, y, z = coords[0:3]
-    data = (GLdouble * 3)(x, y, z)
-    dataOut[0] = cast(pointer(data), POINTER(GLvoid))
-    _tessellate._combined.append(data)
-    
-@_tessellate_callback(GLU_TESS_ERROR)
-def _tessellate_error(code):
-    # Called when an error occurs.
-    e, s, i = gluErrorString(code), "", 0
-    while e[i]: 
-        s += chr(e[i])
-        i += 1
-    raise TessellationError, s
+if _tessellator is not None:
 
-_cache = {}
+    gluTessNormal(_tessellator, 0, 0, 1)
 
-def tessellate(contours):
-    """ Returns a list of triangulated (x,y)-vertices from the given list of path contours,
-        where each contour is a list of (x,y)-tuples.
-        The vertices can be drawn with GL_TRIANGLES to render a complex polygon, for example:
-        glBegin(GL_TRIANGLES)
-        for x, y in tessellate(contours):
-            glVertex3f(x, y, 0)
-        glEnd()
+    # As tessellation proceeds, callback routines are called in a manner 
+    # similar to OpenGL commands glBegin(), glEdgeFlag*(), glVertex*(), and glEnd().
+    # The callback functions must be C functions so we need to cast our Python callbacks to C.
+    _tessellate_callback_type = {
+        GLU_TESS_VERTEX  : CFUNCTYPE(None, POINTER(GLvoid)),
+        GLU_TESS_BEGIN   : CFUNCTYPE(None, GLenum),
+        GLU_TESS_END     : CFUNCTYPE(None),
+        GLU_TESS_ERROR   : CFUNCTYPE(None, GLenum),
+        GLU_TESS_COMBINE : CFUNCTYPE(None, 
+            POINTER(GLdouble), 
+            POINTER(POINTER(GLvoid)), 
+            POINTER(GLfloat), 
+            POINTER(POINTER(GLvoid))) 
+    }
+
+    def _tessellate_callback(type):
+        # Registers a C version of a Python callback function for gluTessCallback().
+        def _C(function):
+            f = _tessellate_callback_type[type](function)
+            gluTessCallback(_tessellator, type, cast(f, _CFUNCTYPE(None)))
+            return f
+        return _C
+
+    @_tessellate_callback(GLU_TESS_BEGIN)
+    def _tessellate_begin(mode):
+        # Called to indicate the start of a triangle.
+        _tessellate.mode = mode
+        
+    @_tessellate_callback(GLU_TESS_VERTEX)
+    def _tessellate_vertex(vertex):
+        # Called to define the vertices of triangles created by the tessellation.
+        _tessellate.extend(cast(vertex, POINTER(GLdouble))[0:2])
+
+    @_tessellate_callback(GLU_TESS_END)
+    def _tessellate_end():
+        # Called to indicate the end of a primitive.
+        # GL_TRIANGLE_FAN defines triangles with a same origin (pt1).
+        v = _tessellate
+        if _tessellate.mode in (GL_TRIANGLE_FAN, GL_TRIANGLE_STRIP):
+            strip = _tessellate.mode == GL_TRIANGLE_STRIP
+            for i in xrange(4, len(v), 2):
+                j = strip and i-4 or 0
+                _tessellate.triangles.extend((v[j], v[j+1], v[i-2], v[i-1], v[i], v[i+1]))
+        elif _tessellate.mode == GL_TRIANGLES:
+            _tessellate.triangles.extend(v)
+        elif _tessellate.mode == GL_LINE_LOOP:
+            pass
+        _tessellate.mode = None
+        _tessellate.clear()
+        
+    @_tessellate_callback(GLU_TESS_COMBINE)
+    def _tessellate_combine(coords, vertex_data, weights, dataOut):
+        # Called when the tessellation detects an intersection.
+        x, y, z = coords[0:3]
+        data = (GLdouble * 3)(x, y, z)
+        dataOut[0] = cast(pointer(data), POINTER(GLvoid))
+        _tessellate._combined.append(data)
+        
+    @_tessellate_callback(GLU_TESS_ERROR)
+    def _tessellate_error(code):
+        # Called when an error occurs.
+        e, s, i = gluErrorString(code), "", 0
+        while e[i]: 
+            s += chr(e[i])
+            i += 1
+        raise TessellationError, s
+
+def _glu_triangulate(contours, nonzero=True):
+    """ Returns a flat list of triangle coordinates, using the GLU tessellator.
     """
-    id = repr(contours)
-    if id in _tessellate.cache:
-        return _tessellate.cache[id]
     # Push the given contours to C and call gluTessVertex().
     _tessellate.reset()
     contours = [[(GLdouble * 3)(x, y, 0) for x, y in points] for points in contours]
+    gluTessProperty(_tessellator, GLU_TESS_WINDING_RULE, 
+        nonzero and GLU_TESS_WINDING_NONZERO or GLU_TESS_WINDING_ODD)
     gluTessBeginPolygon(_tessellator, None)
     for vertices in contours:
         gluTessBeginContour(_tessellator)
@@ -588,11 +940,621 @@ def tessellate(contours):
             gluTessVertex(_tessellator, v, v)
         gluTessEndContour(_tessellator)
     gluTessEndPolygon(_tessellator)
-    # Update the tessellation cache with the results.
-    if len(_tessellate.cache) > TESSELLATION_CACHE:
-        del _tessellate.cache[_tessellate.queue.pop(0)]
-    _tessellate.queue.append(id)
-    _tessellate.cache[id] = _tessellate.triangles
     return _tessellate.triangles
+
+def _monotone(left, right, triangles, eps=1e-9):
+    """ Triangulates the y-monotone polygon with the given left and right chains,
+        i.e., lists of (x,y)-tuples from bottom to top, and appends the coordinates to triangles.
+        The vertices are visited from bottom to top. Vertices that can't be connected yet
+        (reflex vertices) are kept on a stack, which always forms a chain on one side.
+    """
+    if abs(left[0][0] - right[0][0]) <= eps:
+        right = right[1:] # Shared bottom point.
+    if abs(left[-1][0] - right[-1][0]) <= eps:
+        left = left[:-1]  # Shared top point.
+    # Merge the chains, sorted by y: (x, y, side), where side is 0 (left) or 1 (right).
+    v, i, j = [], 0, 0
+    while i < len(left) or j < len(right):
+        if j == len(right) or i < len(left) and left[i][1] <= right[j][1]:
+            v.append((left[i][0], left[i][1], 0)); i+=1
+        else:
+            v.append((right[j][0], right[j][1], 1)); j+=1
+    if len(v) < 3:
+        return
+    def triangle(p0, p1, p2):
+        # Degenerate triangles (no area) are omitted.
+        if abs((p1[0]-p0[0]) * (p2[1]-p0[1]) - (p2[0]-p0[0]) * (p1[1]-p0[1])) > 1e-12:
+            triangles.extend((p0[0], p0[1], p1[0], p1[1], p2[0], p2[1]))
+    stack = [v[0], v[1]]
+    for u in v[2:-1]:
+        if u[2] != stack[-1][2]:
+            # Opposite side: connect to all the vertices on the stack.
+            for i in xrange(len(stack)-1):
+                triangle(u, stack[i], stack[i+1])
+            stack = [stack[-1], u]
+        else:
+            # Same side: connect to the vertices on the stack as long as the diagonal is inside.
+            last = stack.pop()
+            while stack:
+                a = stack[-1]
+                c = (u[0]-a[0]) * (last[1]-a[1]) - (u[1]-a[1]) * (last[0]-a[0])
+                if u[2] == 0 and c > 0 or u[2] == 1 and c < 0:
+                    triangle(u, last, a)
+                    last = stack.pop()
+                else:
+                    break
+            stack.append(last)
+            stack.append(u)
+    u = v[-1]
+    for i in xrange(len(stack)-1):
+        triangle(u, stack[i], stack[i+1])
+
+def _py_triangulate(contours, nonzero=True):
+    """ Returns a flat list of triangle coordinates (x1, y1, x2, y2, x3, y3, ...).
+        The plane is cut into horizontal slabs at each vertex.
+        Inside a slab, no edges start or end, so they can be sorted from left to right.
+        If two edges cross inside a slab, the slab is cut again at the crossing.
+        Each span between the sorted edges that is inside the polygon is a trapezoid.
+        If a trapezoid starts where a trapezoid in the slab below ends (same left and right x),
+        it is added to the same region. Each region is a y-monotone polygon
+        that is triangulated when it ends, with about one triangle per vertex.
+        This is the same algorithm as in nodebox/ext/triangulate.c.
+    """
+    edges, ys = [], set()
+    for points in contours:
+        for i in range(len(points)):
+            x0, y0 = points[i-1][0], points[i-1][1]
+            x1, y1 = points[i][0], points[i][1]
+            ys.add(y1)
+            # Each edge is a (bottom y, bottom x, top y, slope, direction)-tuple.
+            if y0 < y1:
+                edges.append((y0, x0, y1, float(x1-x0) / (y1-y0), +1))
+            if y0 > y1:
+                edges.append((y1, x1, y0, float(x1-x0) / (y1-y0), -1))
+    if len(edges) < 2:
+        return []
+    edges.sort()
+    ys = sorted(ys)
+    eps = 1e-9 * (1 + abs(ys[0]) + abs(ys[-1]))
+    def _cmp(a, b):
+        # Edges are sorted by x at the bottom of the slab, then by x at the top.
+        d = a[0] - b[0]
+        if abs(d) <= eps:
+            d = a[1] - b[1]
+        return (d > 0) - (d < 0)
+    # Each region is a [left x, right x, left edge, right edge, left chain, right chain]-list.
+    # The regions that end at the bottom of the current slab are pending.
+    triangles, pending, active, e = [], [], [], 0
+    def close(region):
+        _monotone(region[4], region[5], triangles, eps)
+    for s in range(len(ys)-1):
+        y0, y1 = ys[s], ys[s+1]
+        # Remove the edges that end below the slab, add the edges that start in it.
+        active = [k for k in active if edges[k][2] > y0]
+        while e < len(edges) and edges[e][0] <= y0:
+            if edges[e][2] > y0:
+                active.append(e)
+            e += 1
+        if len(active) < 2:
+            for r in pending:
+                close(r)
+            pending = []
+            continue
+        ylo = y0
+        while ylo < y1:
+            x = [(xa + (ylo-ya) * dx, xa + (y1-ya) * dx, dx, d, k) 
+                for k, (ya, xa, yb, dx, d) in ((k, edges[k]) for k in active)]
+            x.sort(_cmp)
+            # Find the first crossing of two neighboring edges.
+            yc = y1
+            for i in range(len(x)-1):
+                (b0, t0, dx0, d0, k0), (b1, t1, dx1, d1, k1) = x[i], x[i+1]
+                if t0 > t1 + eps:
+                    y = ylo + (b1-b0) / (dx0-dx1)
+                    if ylo + eps < y < yc:
+                        yc = y
+            # Add each span inside the polygon to a region.
+            regions, i, w, start = [], 0, 0, None
+            for b, t, dx, d, k in x:
+                w += d
+                t = b + (yc-ylo) * dx
+                inside = nonzero and w != 0 or not nonzero and w % 2 == 1
+                if inside and start is None:
+                    start = (b, t, k)
+                elif not inside and start is not None:
+                    lb, lt, lk = start
+                    start = None
+                    if b - lb <= eps and t - lt <= eps:
+                        continue
+                    while i < len(pending) and pending[i][0] < lb - eps:
+                        close(pending[i]); i+=1
+                    if i < len(pending) \
+                     and abs(pending[i][0] - lb) <= eps \
+                     and abs(pending[i][1] - b) <= eps and b - lb > eps:
+                        r = pending[i]; i+=1
+                        if r[2] == lk:
+                            r[4][-1] = (lt, yc)
+                        else:
+                            r[4].append((lt, yc))
+                        if r[3] == k:
+                            r[5][-1] = (t, yc)
+                        else:
+                            r[5].append((t, yc))
+                        r[0:4] = [lt, t, lk, k]
+                    else:
+                        r = [lt, t, lk, k, [(lb, ylo), (lt, yc)], [(b, ylo), (t, yc)]]
+                    regions.append(r)
+            for r in pending[i:]:
+                close(r)
+            pending = regions
+            ylo = yc
+    for r in pending:
+        close(r)
+    return triangles
+
+_triangulate = _py_triangulate
+if _tessellator is not None:
+    _triangulate = _glu_triangulate
+
+# Fast C implementation:
+try: from nodebox.ext.triangulate import triangulate as _triangulate
+except:
+    pass
+
+def _contours_id(contours):
+    """ Returns a hash of the given contours, as the md5 digest of their coordinates packed in an array.
+        This is a lot faster than repr(contours).
+    """
+    id = md5(array("i", [len(points) for points in contours]).tostring())
+    id.update(array("d", list(chain(*chain(*contours)))).tostring())
+    return id.digest()
+
+def triangulate(contours, winding=NONZERO, id=None):
+    """ Returns a flat list of triangle coordinates (x1, y1, x2, y2, x3, y3, ...) 
+        from the given list of path contours, where each contour is a list of (x,y)-tuples.
+        The coordinates can be drawn with GL_TRIANGLES to render a complex polygon.
+        The winding rule (NONZERO or ODD) determines which parts of overlapping contours are filled.
+        The results are cached (see cache_stats("tessellation")).
+        The optional id is the cache key for the contours, by default a hash of the coordinates.
+    """
+    id = (winding, id is None and _contours_id(contours) or id)
+    triangles = _tessellate.cache.get(id)
+    if triangles is not None:
+        return triangles
+    triangles = _triangulate(contours, winding != ODD)
+    # Update the tessellation cache with the results.
+    _tessellate.cache[id] = triangles
+    return triangles
+
+def tessellate(contours):
+    """ Returns a list of triangulated (x,y)-vertices from the given list of path contours,
+        where each contour is a list of (x,y)-tuples.
+        The vertices can be drawn with GL_TRIANGLES to render a complex polygon, for example:
+        glBegin(GL_TRIANGLES)
+        for x, y in tessellate(contours):
+            glVertex3f(x, y, 0)
+        glEnd()
+    """
+    v = triangulate(contours)
+    return [v[i:i+2] for i in xrange(0, len(v), 2)]
     
 tesselate = tessellate # Common spelling error.
+
+#--- STROKE ------------------------------------------------------------------------------------------
+# OpenGL lines (glLineWidth) are clamped to a maximum width on many drivers, they have no joins or caps,
+# and line stipple patterns (glLineStipple) break up the batching of drawing commands.
+# The stroke() function outlines a list of contours as triangles instead,
+# with joins between the segments, caps at the ends of open contours and an optional dash pattern.
+# The triangles can be drawn with GL_TRIANGLES, like the fill of a path.
+
+MITER  = "miter"
+ROUND  = "round"
+BEVEL  = "bevel"
+BUTT   = "butt"
+SQUARE = "square"
+
+def dashes(points, pattern, offset=0):
+    """ Returns a list of dashes (i.e., lists of (x,y)-tuples) along the given list of (x,y)-tuples,
+        where pattern is a list of alternating dash and gap lengths, e.g., (4, 2).
+        The offset is the distance into the pattern at the start.
+    """
+    if not pattern or sum(pattern) <= 0 or len(points) < 2:
+        return [list(points)]
+    i, d = 0, offset % sum(pattern)
+    while d >= pattern[i]:
+        d -= pattern[i]
+        i = (i + 1) % len(pattern)
+    v, dash = [], i % 2 == 0 and [points[0]] or None
+    # Walk the segments. The current dash or gap has (pattern[i] - d) length left.
+    for j in xrange(len(points)-1):
+        (x0, y0), (x1, y1) = points[j], points[j+1]
+        n = sqrt((x1-x0)**2 + (y1-y0)**2)
+        t = 0.0
+        while n - t > pattern[i] - d:
+            t += pattern[i] - d
+            pt = (x0 + (x1-x0) * t / n, y0 + (y1-y0) * t / n)
+            if dash is not None:
+                dash.append(pt)
+                v.append(dash)
+                dash = None
+            else:
+                dash = [pt]
+            i = (i + 1) % len(pattern)
+            d = 0.0
+        d += n - t
+        if dash is not None:
+            dash.append((x1, y1))
+    if dash is not None and len(dash) > 1:
+        v.append(dash)
+    return v
+
+def _arc(v, x, y, a0, a1, r):
+    # Appends a triangle fan around x, y with radius r from angle a0 to angle a1 (radians).
+    # The number of triangles is such that they deviate less than 0.25 from the arc.
+    if r > 0.25:
+        n = int(abs(a1-a0) / (2 * acos(1 - 0.25 / r))) + 1
+    else:
+        n = 1
+    da = (a1-a0) / n
+    x0, y0 = x + cos(a0) * r, y + sin(a0) * r
+    for i in xrange(1, n+1):
+        x1, y1 = x + cos(a0 + da*i) * r, y + sin(a0 + da*i) * r
+        v.extend((x, y, x0, y0, x1, y1))
+        x0, y0 = x1, y1
+
+def _join(v, x, y, dx0, dy0, dx1, dy1, r, join, miterlimit):
+    # Appends the join between two segments with unit directions dx0, dy0 and dx1, dy1 at x, y.
+    # The join fills the gap on the outer side of the corner.
+    cross = dx0 * dy1 - dy0 * dx1
+    dot   = dx0 * dx1 + dy0 * dy1
+    if abs(cross) < 1e-9 and dot > 0:
+        return
+    s = cross > 0 and -r or r # Outer side (the normal of a segment points to its left).
+    x0, y0 = x - dy0 * s, y + dx0 * s
+    x1, y1 = x - dy1 * s, y + dx1 * s
+    if join == ROUND:
+        a0 = atan2(y0-y, x0-x)
+        a1 = atan2(y1-y, x1-x)
+        if s > 0 and a1 > a0: a1 -= 2 * pi
+        if s < 0 and a1 < a0: a1 += 2 * pi
+        _arc(v, x, y, a0, a1, r)
+        return
+    if join == MITER:
+        # The miter length relative to the stroke width is 1 / sin(angle / 2).
+        # Very sharp angles are beveled.
+        c = sqrt(max(0, (1 + dot) / 2)) # cos(half the turning angle)
+        if c > 0 and 1 / c <= miterlimit:
+            mx, my = (x0 + x1) / 2 - x, (y0 + y1) / 2 - y
+            m = sqrt(mx*mx + my*my)
+            if m > 0:
+                mx, my = x + mx / m * r / c, y + my / m * r / c
+                v.extend((x, y, x0, y0, mx, my, x, y, mx, my, x1, y1))
+                return
+    v.extend((x, y, x0, y0, x1, y1))
+
+def _stroke(v, points, r, join, cap, miterlimit, closed):
+    # Appends the outline of the given list of (x,y)-tuples as triangles.
+    p = [points[0]]
+    for pt in points[1:]:
+        if pt != p[-1]:
+            p.append(pt)
+    if closed and len(p) > 2 and p[0] == p[-1]:
+        p.pop()
+    else:
+        closed = False
+    if len(p) == 1:
+        # A single point has a round or square cap.
+        x, y = p[0]
+        if cap == ROUND:
+            _arc(v, x, y, 0, 2 * pi, r)
+        if cap == SQUARE:
+            v.extend((x-r, y-r, x+r, y-r, x+r, y+r, x-r, y-r, x+r, y+r, x-r, y+r))
+        return
+    # Unit direction of each segment.
+    n = len(p)
+    d = []
+    for i in xrange(closed and n or n-1):
+        (x0, y0), (x1, y1) = p[i], p[(i+1) % n]
+        m = sqrt((x1-x0)**2 + (y1-y0)**2)
+        d.append(((x1-x0) / m, (y1-y0) / m))
+    # Each segment is a quad (two triangles), extended with the square caps.
+    for i, (dx, dy) in enumerate(d):
+        (x0, y0), (x1, y1) = p[i], p[(i+1) % n]
+        if not closed and cap == SQUARE:
+            if i == 0:
+                x0, y0 = x0 - dx * r, y0 - dy * r
+            if i == len(d)-1:
+                x1, y1 = x1 + dx * r, y1 + dy * r
+        nx, ny = -dy * r, dx * r
+        v.extend((x0+nx, y0+ny, x0-nx, y0-ny, x1+nx, y1+ny, 
+                  x1+nx, y1+ny, x0-nx, y0-ny, x1-nx, y1-ny))
+    # Joins between the segments.
+    for i in xrange(closed and len(d) or len(d)-1):
+        x, y = p[(i+1) % n]
+        _join(v, x, y, d[i][0], d[i][1], d[(i+1) % len(d)][0], d[(i+1) % len(d)][1], r, join, miterlimit)
+    # Round caps at the ends.
+    if not closed and cap == ROUND:
+        (x, y), (dx, dy) = p[0], d[0]
+        a = atan2(dy, dx)
+        _arc(v, x, y, a + pi/2, a + pi*3/2, r)
+        (x, y), (dx, dy) = p[-1], d[-1]
+        a = atan2(dy, dx)
+        _arc(v, x, y, a - pi/2, a + pi/2, r)
+
+def stroke(contours, width=1.0, join=MITER, cap=BUTT, dash=None, miterlimit=4.0):
+    """ Returns a flat list of triangle coordinates (x1, y1, x2, y2, x3, y3, ...)
+        that outline the given list of contours, where each contour is a list of (x,y)-tuples.
+        A contour that ends at its first point is closed.
+        The join between segments is MITER, ROUND or BEVEL, 
+        miters longer than miterlimit * width are beveled.
+        The cap at the ends of open contours is BUTT, ROUND or SQUARE.
+        The optional dash is a list of alternating dash and gap lengths.
+        The triangles can overlap, so a transparent stroke should be drawn with a solid color.
+    """
+    v = []
+    r = width * 0.5
+    if r <= 0:
+        return v
+    for points in contours:
+        if len(points) == 0:
+            continue
+        if dash:
+            for points in dashes(points, dash):
+                _stroke(v, points, r, join, cap, miterlimit, False)
+        else:
+            _stroke(v, points, r, join, cap, miterlimit, True)
+    return v
+
+#--- SIMPLIFICATION ----------------------------------------------------------------------------------
+# Polygons created from data (e.g., sensor data, GPS tracks) often have more points than can be seen.
+# The Ramer-Douglas-Peucker algorithm keeps the points that deviate most from a straight line,
+# until no point deviates more than the tolerance.
+# The Visvalingam-Whyatt algorithm removes the points that form the smallest triangle
+# with their neighbors, until each triangle is larger than the tolerance squared.
+# It tends to produce smoother shapes.
+
+DOUGLAS_PEUCKER = "douglas-peucker"
+VISVALINGAM     = "visvalingam"
+
+def _py_douglas_peucker(points, tolerance):
+    n = len(points)
+    if n < 3:
+        return list(points)
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n-1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        x0, y0 = points[i]
+        x1, y1 = points[j]
+        dx = x1 - x0
+        dy = y1 - y0
+        d = float(dx*dx + dy*dy)
+        m, dmax = i, -1
+        for k in xrange(i+1, j):
+            px = points[k][0] - x0
+            py = points[k][1] - y0
+            if d > 0:
+                # Squared distance to the line.
+                v = (px*dy - py*dx) ** 2 / d
+            else:
+                v = px*px + py*py
+            if v > dmax:
+                m, dmax = k, v
+        if dmax > tolerance * tolerance:
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return [pt for pt, b in izip(points, keep) if b]
+
+_douglas_peucker = _py_douglas_peucker
+
+# Fast C implementation:
+try: from nodebox.ext.geometry import simplify as _douglas_peucker
+except:
+    pass
+
+def _visvalingam(points, tolerance):
+    n = len(points)
+    if n < 3:
+        return list(points)
+    def area(i):
+        (x0, y0), (x1, y1), (x2, y2) = points[prev[i]], points[i], points[next[i]]
+        return abs((x1-x0) * (y2-y0) - (x2-x0) * (y1-y0)) * 0.5
+    prev = range(-1, n-1)
+    next = range(1, n+1)
+    areas = [None] + [area(i) for i in xrange(1, n-1)] + [None]
+    heap = [(areas[i], i) for i in xrange(1, n-1)]
+    heapify(heap)
+    removed = [False] * n
+    while heap:
+        a, i = heappop(heap)
+        if removed[i] or a != areas[i]:
+            continue # Outdated.
+        if a >= tolerance * tolerance:
+            break
+        removed[i] = True
+        next[prev[i]] = next[i]
+        prev[next[i]] = prev[i]
+        # The area of a neighbor is at least the area of the removed point,
+        # so that the points are removed in order of significance.
+        for j in (prev[i], next[i]):
+            if 0 < j < n-1:
+                areas[j] = max(area(j), a)
+                heappush(heap, (areas[j], j))
+    return [pt for pt, b in izip(points, removed) if not b]
+
+def simplify(points, tolerance=0.5, method=DOUGLAS_PEUCKER):
+    """ Returns a list of (x,y)-tuples with fewer points than the given list of (x,y)-tuples,
+        which deviates less than the given tolerance from the original.
+        The method can be DOUGLAS_PEUCKER or VISVALINGAM.
+        The first and last point are always kept.
+    """
+    if method == VISVALINGAM:
+        return _visvalingam(points, tolerance)
+    return _douglas_peucker(points, tolerance)
+
+def resample(points, spacing=1.0):
+    """ Returns a list of (x,y)-tuples at an equal distance (spacing) from each other
+        along the given list of (x,y)-tuples. The first and last point are kept.
+    """
+    if len(points) < 2 or spacing <= 0:
+        return list(points)
+    v = [points[0]]
+    d = 0.0 # Distance since the last point.
+    for i in xrange(len(points)-1):
+        (x0, y0), (x1, y1) = points[i], points[i+1]
+        n = sqrt((x1-x0)**2 + (y1-y0)**2)
+        t = spacing - d
+        while t <= n:
+            v.append((x0 + (x1-x0) * t / n, y0 + (y1-y0) * t / n))
+            t += spacing
+        d = n - (t - spacing)
+    if v[-1] != points[-1]:
+        v.append(points[-1])
+    return v
+
+#--- BOOLEAN OPERATIONS ------------------------------------------------------------------------------
+# The union, intersection, difference or exclusive or of two sets of polygons.
+# The edges of both sets are split where they intersect, so that no edges cross.
+# For each edge, the winding number of both sets is calculated just left and right of it.
+# An edge is part of the result when the result is inside on one side and outside on the other side.
+# The remaining edges are then linked into new polygons (counterclockwise, holes clockwise).
+# Both sets are filled with the nonzero winding rule (see triangulate()).
+
+UNION        = "union"
+INTERSECTION = "intersection"
+DIFFERENCE   = "difference"
+XOR          = "xor"
+
+_BOOLEAN_DECIMALS = 8    # Coordinates are rounded, so that the same intersection has the same point.
+_BOOLEAN_EPSILON  = 1e-5 # Distance left and right of an edge to calculate the winding number.
+
+def _edges(contours):
+    # Returns the edges of the given polygons as a list of ((x0,y0), (x1,y1))-tuples, rounded.
+    edges = []
+    for points in contours:
+        p = [(round(x, _BOOLEAN_DECIMALS), round(y, _BOOLEAN_DECIMALS)) for x, y in points]
+        for i in xrange(len(p)):
+            if p[i-1] != p[i]:
+                edges.append((p[i-1], p[i]))
+    return edges
+
+def _split(edges):
+    """ Returns the given list of edges, split where they intersect or overlap.
+    """
+    splits = [[] for e in edges]
+    # Sweep from left to right,
+    # comparing each edge to the edges that overlap with it horizontally.
+    active = []
+    for i in sorted(xrange(len(edges)), key=lambda i: min(edges[i][0][0], edges[i][1][0])):
+        (x0, y0), (x1, y1) = edges[i]
+        active = [j for j in active if max(edges[j][0][0], edges[j][1][0]) >= min(x0, x1)]
+        for j in active:
+            (x2, y2), (x3, y3) = edges[j]
+            if max(y0, y1) < min(y2, y3) or max(y2, y3) < min(y0, y1):
+                continue
+            rx, ry = x1-x0, y1-y0
+            sx, sy = x3-x2, y3-y2
+            d = rx * sy - ry * sx
+            if abs(d) > 1e-12 * (abs(rx) + abs(ry)) * (abs(sx) + abs(sy)):
+                t = ((x2-x0) * sy - (y2-y0) * sx) / d
+                u = ((x2-x0) * ry - (y2-y0) * rx) / d
+                if 0 <= t <= 1 and 0 <= u <= 1:
+                    pt = (round(x0 + t * rx, _BOOLEAN_DECIMALS), 
+                          round(y0 + t * ry, _BOOLEAN_DECIMALS))
+                    splits[i].append(pt)
+                    splits[j].append(pt)
+            elif abs((x2-x0) * ry - (y2-y0) * rx) <= 1e-9 * (abs(rx) + abs(ry)):
+                # Collinear edges that overlap are split at each other's endpoints.
+                for k, (ax, ay), (bx, by), p in ((i, (x0, y0), (x1, y1), edges[j]), 
+                                                 (j, (x2, y2), (x3, y3), edges[i])):
+                    n = float((bx-ax)**2 + (by-ay)**2)
+                    for px, py in p:
+                        if 0 < ((px-ax) * (bx-ax) + (py-ay) * (by-ay)) / n < 1:
+                            splits[k].append((px, py))
+        active.append(i)
+    v = []
+    for i, ((x0, y0), (x1, y1)) in enumerate(edges):
+        p = [(x0, y0)]
+        p.extend(sorted(splits[i], key=lambda pt: abs(pt[0]-x0) + abs(pt[1]-y0)))
+        p.append((x1, y1))
+        for j in xrange(len(p)-1):
+            if p[j] != p[j+1]:
+                v.append((p[j], p[j+1]))
+    return v
+
+def _link(edges):
+    """ Returns a list of polygons from the given list of directed edges.
+    """
+    next = {}
+    for a, b in edges:
+        next.setdefault(a, []).append(b)
+    contours = []
+    for a0 in [a for a, b in edges]:
+        while next.get(a0):
+            p = [a0]
+            while p[-1] != a0 or len(p) == 1:
+                b = next.get(p[-1])
+                if not b:
+                    break
+                p.append(b.pop())
+            if p[-1] == a0 and len(p) > 3:
+                contours.append(_simplify(p))
+    return [p for p in contours if len(p) > 3]
+
+def _simplify(points):
+    # Removes the points in the given closed polygon that lie on a straight line.
+    p = points[:-1]
+    v = []
+    for i in xrange(len(p)):
+        (x0, y0), (x1, y1), (x2, y2) = p[i-1], p[i], p[(i+1) % len(p)]
+        if abs((x1-x0) * (y2-y0) - (x2-x0) * (y1-y0)) > 1e-12:
+            v.append(p[i])
+    if v:
+        v.append(v[0])
+    return v
+
+def clip(contours1, contours2, operation=UNION):
+    """ Returns a list of polygons (i.e., lists of (x,y)-tuples that end at their first point)
+        from the given UNION, INTERSECTION, DIFFERENCE or XOR of two lists of polygons.
+        Polygons are filled with the nonzero winding rule, so a polygon inside another polygon
+        in the opposite direction is a hole. The returned holes are clockwise.
+    """
+    if operation == UNION:
+        f = lambda a, b: a or b
+    elif operation == INTERSECTION:
+        f = lambda a, b: a and b
+    elif operation == DIFFERENCE:
+        f = lambda a, b: a and not b
+    elif operation == XOR:
+        f = lambda a, b: a != b
+    else:
+        raise ValueError, "operation must be UNION, INTERSECTION, DIFFERENCE or XOR"
+    e1 = _edges(contours1)
+    e2 = _edges(contours2)
+    A = PolygonIndex(contours1)
+    B = PolygonIndex(contours2)
+    unique = set()
+    edges = []
+    for (x0, y0), (x1, y1) in _split(e1 + e2):
+        # Edges that are the same in both sets are used once.
+        k = min((x0, y0), (x1, y1)), max((x0, y0), (x1, y1))
+        if k in unique:
+            continue
+        unique.add(k)
+        # Points left and right of the edge's midpoint.
+        d = sqrt((x1-x0)**2 + (y1-y0)**2)
+        nx = -(y1-y0) / d * _BOOLEAN_EPSILON
+        ny =  (x1-x0) / d * _BOOLEAN_EPSILON
+        mx = (x0 + x1) * 0.5
+        my = (y0 + y1) * 0.5
+        left  = f(A.winding(mx+nx, my+ny) != 0, B.winding(mx+nx, my+ny) != 0)
+        right = f(A.winding(mx-nx, my-ny) != 0, B.winding(mx-nx, my-ny) != 0)
+        if left and not right:
+            edges.append(((x0, y0), (x1, y1)))
+        if right and not left:
+            edges.append(((x1, y1), (x0, y0)))
+    return _link(edges)
@@ -0,0 +1,177 @@
+#=== GLYPH STORE =====================================================================================
+# Compact, memory-mapped storage of character glyph paths (see textpath() in context.py).
+# Authors: Tom De Smedt, Frederik De Bleser
+# License: BSD (see LICENSE.txt for details).
+# Copyright (c) 2008-2012 City In A Bottle (cityinabottle.org)
+# http://cityinabottle.org/nodebox
+
+# NodeBox for OpenGL has no direct way of accessing glyph path information.
+# The glyph paths of the default fonts are generated with nodebox/font/glyph.py (in classic NodeBox)
+# and stored in nodebox/font/glyph.p, a pickled dictionary of font name => weight => character => path.
+# Unpickling the whole dictionary takes time and memory, even if textpath() is never called.
+# Instead, the glyphs are converted to a binary file, nodebox/font/glyph.bin.
+# The file is memory-mapped the first time a glyph is needed,
+# and each glyph is decoded when it is first used.
+# Characters that are not in the store are read from the TrueType fonts (see truetype.py).
+
+# From the command line, convert glyph.p to glyph.bin:
+# > python nodebox/graphics/glyphstore.py nodebox/font/glyph.p nodebox/font/glyph.bin
+# The script does not need a display (unlike python -m nodebox.graphics.glyphstore, 
+# which imports nodebox.graphics and opens a window).
+
+import os
+import sys
+from array  import array
+from mmap   import mmap, ACCESS_READ
+from struct import Struct
+
+#=====================================================================================================
+
+#--- GLYPH STORE -------------------------------------------------------------------------------------
+# The file starts with a header, followed by the font names and weights (a \0-separated UTF-8 string),
+# followed by the index of glyphs, followed by the glyph data.
+# Each index entry has the font name, the weight and the character,
+# and the offset and length of the glyph data: 2-byte integer coordinates + 1-byte commands.
+# The commands are MOVETO=0 (x, y), LINETO=1 (x, y), CURVETO=2 (x, y, vx1, vy1, vx2, vy2), CLOSE=3.
+# The coordinates are relative to a 1000pt font size, measured from the baseline.
+
+VERSION = 1
+
+_HEADER = Struct("<4sIII") # "NBGS", version, length of the names string, number of glyphs.
+_ENTRY  = Struct("<HHIIHH") # Font name, weight (index in names), code point, offset, commands, coordinates.
+
+MOVETO, LINETO, CURVETO, CLOSE = 0, 1, 2, 3
+
+_COMMANDS = {"moveto": MOVETO, "lineto": LINETO, "curveto": CURVETO, "close": CLOSE}
+
+class GlyphStoreError(Exception):
+    pass
+
+class GlyphStore(object):
+
+    def __init__(self, path):
+        """ The glyph paths in the given binary file (see convert()).
+            The file is opened when a glyph is first requested.
+        """
+        self.path   = path
+        self._index = None # (font name, weight, character) => (offset, commands, coordinates).
+        self._mmap  = None
+        self._cache = {}   # (font name, weight, character) => (commands, coordinates)-tuple of arrays.
+
+    def _open(self):
+        # Reads the index of the file.
+        f = open(self.path, "rb")
+        try:
+            self._mmap = m = mmap(f.fileno(), 0, access=ACCESS_READ)
+        finally:
+            f.close()
+        magic, version, n, count = _HEADER.unpack(m[:_HEADER.size])
+        if magic != "NBGS" or version != VERSION:
+            raise GlyphStoreError, "%s is not a glyph store (version %i)" % (self.path, VERSION)
+        i = _HEADER.size
+        names = m[i:i+n].decode("utf-8").split(u"\0")
+        i += n
+        self._index = {}
+        for j in xrange(count):
+            font, weight, ch, offset, cmds, coords = _ENTRY.unpack(m[i:i+_ENTRY.size])
+            self._index[(names[font], names[weight], unichr(ch))] = (offset, cmds, coords)
+            i += _ENTRY.size
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._open()
+        return self._index
+
+    def fonts(self):
+        """ Returns a dictionary of font name => list of weights in the store.
+        """
+        fonts = {}
+        for font, weight, ch in self.index:
+            fonts.setdefault(font, set()).add(weight)
+        return dict((font, sorted(weights)) for font, weights in fonts.items())
+
+    def __contains__(self, (fontname, weight, ch)):
+        return (fontname, weight, ch) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def glyph(self, fontname, weight, ch):
+        """ Returns a (commands, coordinates)-tuple of arrays for the given character,
+            or raises a KeyError.
+        """
+        k = (fontname, weight, ch)
+        if k not in self._cache:
+            offset, n1, n2 = self.index[k]
+            coords = array("h")
+            coords.fromstring(self._mmap[offset:offset+n2*2])
+            cmds = array("B")
+            cmds.fromstring(self._mmap[offset+n2*2:offset+n2*2+n1])
+            if sys.byteorder != "little":
+                coords.byteswap()
+            self._cache[k] = (cmds, coords)
+        return self._cache[k]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = None
+        self._index = None
+        self._cache = {}
+
+    def __repr__(self):
+        return "GlyphStore(path=%s)" % repr(self.path)
+
+#--- CONVERTER ---------------------------------------------------------------------------------------
+
+def convert(glyphs, path):
+    """ Writes the given dictionary of glyphs to a binary file at the given path.
+        The dictionary is font name => weight => character => list of path commands,
+        e.g., ["moveto", x, y], ["curveto", x, y, vx1, vy1, vx2, vy2], ["close"],
+        as in nodebox/font/glyph.p (see nodebox/font/glyph.py).
+    """
+    names, entries, data = [], [], []
+    def name(s):
+        if s not in names:
+            names.append(s)
+        return names.index(s)
+    offset = 0
+    for font in sorted(glyphs):
+        for weight in sorted(glyphs[font]):
+            for ch in sorted(glyphs[font][weight]):
+                cmds, coords = array("B"), array("h")
+                for pt in glyphs[font][weight][ch]:
+                    cmds.append(_COMMANDS[pt[0]])
+                    coords.extend(pt[1:])
+                entries.append((name(font), name(weight), ord(ch), offset, len(cmds), len(coords)))
+                if sys.byteorder != "little":
+                    coords.byteswap()
+                data.append(coords.tostring() + cmds.tostring())
+                # Coordinates are 2-byte aligned.
+                if len(cmds) % 2 == 1:
+                    data[-1] += "\0"
+                offset += len(data[-1])
+    s = u"\0".join(names).encode("utf-8")
+    n = _HEADER.size + len(s) + _ENTRY.size * len(entries)
+    n += n % 2
+    f = open(path, "wb")
+    f.write(_HEADER.pack("NBGS", VERSION, len(s), len(entries)))
+    f.write(s)
+    for font, weight, ch, offset, n1, n2 in entries:
+        f.write(_ENTRY.pack(font, weight, ch, offset + n, n1, n2))
+    f.write("\0" * (n - _HEADER.size - len(s) - _ENTRY.size * len(entries)))
+    f.write("".join(data))
+    f.close()
+
+def main(args):
+    folder = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "font"))
+    src = len(args) > 0 and args[0] or os.path.join(folder, "glyph.p")
+    dst = len(args) > 1 and args[1] or os.path.join(folder, "glyph.bin")
+    import cPickle
+    convert(cPickle.load(open(src, "rb")), dst)
+    print "%s => %s (%i glyphs)" % (src, dst, len(GlyphStore(dst)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -16,12 +16,14 @@ from warnings import warn
 # float("inf") doesn't work on windows.
 INFINITE = 1e20
 
-# This module is standalone, line(), ellipse() and Text.draw() 
+# This module is standalone, line(), ellipse(), ellipses() and Text.draw() 
 # must be either implemented or patched:
 def line(x1, y1, x2, y2, stroke=(0,0,0,1), strokewidth=1):
     pass
 def ellipse(x, y, width, height, fill=(0,0,0,1), stroke=None, strokewidth=1):
     pass
+def ellipses(x, y, width, height, fill=(0,0,0,1), stroke=None, strokewidth=1):
+    pass
 
 class Text:
     def __init__(self, string, **kwargs):
@@ -541,6 +543,17 @@ class Flock(list):
         """
         return sorted(self, key=lambda boid: boid.z)
 
+    def draw(self, size=10, **kwargs):
+        """ Draws the flock as dots, larger for boids that are nearer (Boid.depth).
+            All the boids are drawn in one call.
+        """
+        boids = self.by_depth()
+        ellipses(
+            [b.x for b in boids], 
+            [b.y for b in boids], 
+            [size * (0.5 + b.depth) for b in boids],
+            [size * (0.5 + b.depth) for b in boids], **kwargs)
+
     def __repr__(self):
         return "Flock(%s)" % repr(list(self))
 
@@ -844,9 +857,25 @@ class System(object):
                not s.particle2.dead and \
                not s.snapped:
                 s.draw(**kwargs)
+        # Successive particles that use the default Particle.draw() are drawn together in one call.
+        # Particles with a custom draw() method (or a function set as p.draw) draw themselves,
+        # after the particles before them, so the particles are drawn in order.
+        bulk = []
         for p in self.particles:
             if not p.dead:
-                p.draw(**kwargs)
+                if getattr(p.draw, "im_func", None) is Particle.draw.im_func:
+                    bulk.append(p)
+                else:
+                    self._draw(bulk, **kwargs)
+                    bulk = []
+                    p.draw(**kwargs)
+        self._draw(bulk, **kwargs)
+
+    def _draw(self, particles, **kwargs):
+        # Draws the given particles with the default Particle.draw() in one call.
+        if particles:
+            r = [p.radius * (1 - p.age) * 2 for p in particles]
+            ellipses([p.x for p in particles], [p.y for p in particles], r, r, **kwargs)
 
     def __repr__(self):
         return "System(particles=%i, forces=%i, springs=%i)" % \
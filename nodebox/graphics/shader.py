@@ -7,7 +7,7 @@
 
 from pyglet.gl    import *
 from pyglet.image import Texture, SolidColorImagePattern
-from context      import Image, texture
+from context      import Image, texture, glstate, _flush_batch
 from geometry     import lerp, clamp
 from math         import radians
 from ctypes       import byref, cast, pointer, POINTER
@@ -204,8 +204,9 @@ class Shader(object):
             To use shader effects in combination with paths,
             draw the path in an offscreen buffer, render it, and apply to effect to the render.
         """
+        _flush_batch()
         self._active = True
-        glUseProgram(self._program)
+        glstate.program(self._program)
         for k, v in self.variables.items():
             self._set(k, v)
             
@@ -213,7 +214,8 @@ class Shader(object):
         # Note that shaders can't be nested since they all have their own program,
         # pop() just removes any active program.
         if self._active == True:
-            glUseProgram(0)
+            _flush_batch()
+            glstate.program(0)
             self._active = False
 
     @property
@@ -700,8 +702,8 @@ class Compositing(Filter):
         dx = float(self.dx) / w
         dy = float(self.dy) / h
         glActiveTexture(GL_TEXTURE0)
-        glBindTexture(self.texture.target, self.texture.id)        
-        glActiveTexture(GL_TEXTURE1)
+        glstate.texture(self.texture.target, self.texture.id)
+        glActiveTexture(GL_TEXTURE1) # Not remembered by glstate, which keeps track of texture unit 0.
         glBindTexture(self.blend.target, self.blend.id)
         glActiveTexture(GL_TEXTURE0)
         self.shader.set("src1", 0)
@@ -939,7 +941,9 @@ def _uid():
     
 def _texture(width, height):
     # Returns an empty texture of the given width and height.
-    return Texture.create(width, height)
+    t = Texture.create(width, height)
+    glstate.reset("texture")
+    return t
 
 def glCurrentViewport(x=None, y=None, width=None, height=None):
     """ Returns a (x, y, width, height)-tuple with the current viewport bounds.
@@ -1003,8 +1007,9 @@ class OffscreenBuffer(object):
             The offscreen buffer has its own transformation state,
             so any translate(), rotate() etc. does not affect the onscreen canvas.
         """
+        _flush_batch()
         _FBO_STACK.append(self)
-        glBindTexture(self.texture.target, self.texture.id)
+        glstate.texture(self.texture.target, self.texture.id)
         glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, self.id.value)      
         glFramebufferTexture2DEXT(
             GL_FRAMEBUFFER_EXT, 
@@ -1025,7 +1030,7 @@ class OffscreenBuffer(object):
         glPushMatrix()
         glLoadIdentity()
         glCurrentViewport(0, 0, self.texture.width, self.texture.height)
-        glColor4f(1.0,1.0,1.0,1.0)
+        glstate.color(1.0, 1.0, 1.0, 1.0)
         # FBO's work with a simple GL_LINE_SMOOTH anti-aliasing.
         # The instructions on how to enable framebuffer multisampling are pretty clear:
         # (http://www.opengl.org/wiki/GL_EXT_framebuffer_multisample)
@@ -1039,7 +1044,7 @@ class OffscreenBuffer(object):
         # http://www.openframeworks.cc/forum/viewtopic.php?f=9&t=2215
         # This blend mode gives better results:
         glEnable(GL_BLEND)
-        glBlendFuncSeparate(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
+        glstate.blendfunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
         self._active = True
     
     def pop(self):
@@ -1049,11 +1054,12 @@ class OffscreenBuffer(object):
         # Switch to onscreen canvas size and transformation state.
         # Switch to onscreen canvas.
         # Reset to the normal blending mode.
+        _flush_batch()
         _FBO_STACK.pop(-1)
         glCurrentViewport(*self._viewport)
         glPopMatrix()
         glBindFramebufferEXT(GL_FRAMEBUFFER_EXT, _FBO_STACK and _FBO_STACK[-1].id or 0)
-        glBlendFuncSeparate(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
+        glstate.blendfunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
         #glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
         self._active = False
     
@@ -1149,7 +1155,7 @@ def filter(img, filter=None, clear=True):
         filter.texture = img.texture # Register the current texture with the filter.
         filter.push()
     # This blend mode gives better results for transparent images:
-    glBlendFuncSeparate(GL_ONE, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
+    glstate.blendfunc(GL_ONE, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
     # Note: Image.alpha and Image.color attributes won't work here,
     # because the shader overrides the default drawing behavior.
     # Instead, add the transparent() and colorize() filters to the chain.
@@ -1165,9 +1171,9 @@ class RenderedImage(Image):
         # Textures rendered in the FBO look slightly washed out.
         # The render() command yields a RenderedImage object,
         # which draw() method uses a blending trick to correct the colors:
-        glBlendFunc(GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
+        glstate.blendfunc(GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
         Image.draw(self, *args, **kwargs)
-        glBlendFuncSeparate(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
+        glstate.blendfunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA, GL_ONE, GL_ONE_MINUS_SRC_ALPHA)
     
     def save(self, path):
         # XXX Colors will appear washed out in the exported image.
@@ -1207,7 +1213,9 @@ def solid(width, height, fill=(0,0,0,0)):
     """ Generates an image filled with a solid color.
     """
     clr = tuple([int(v*255) for v in fill])
-    return Image(SolidColorImagePattern(clr).create_image(width, height).get_texture())
+    t = SolidColorImagePattern(clr).create_image(width, height).get_texture()
+    glstate.reset("texture")
+    return Image(t)
 
 def gradient(width, height, clr1=(0,0,0,1), clr2=(1,1,1,1), type=LINEAR):
     """ Generates a gradient image and returns it.
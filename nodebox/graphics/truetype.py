@@ -0,0 +1,381 @@
+#=== TRUETYPE ========================================================================================
+# Glyph outlines and advance widths read from TrueType font files (see textpath() in context.py).
+# Authors: Tom De Smedt, Frederik De Bleser
+# License: BSD (see LICENSE.txt for details).
+# Copyright (c) 2008-2012 City In A Bottle (cityinabottle.org)
+# http://cityinabottle.org/nodebox
+
+# The glyph paths in nodebox/font/glyph.bin only cover ASCII characters (see glyphstore.py).
+# For other characters, the outline is read from the .ttf files in nodebox/font/.
+# This only needs the standard library: no AppKit, FreeType or OpenGL context.
+# Each file is memory-mapped the first time a glyph is needed,
+# and each glyph is decoded when it is first used.
+# The glyphs have the same format as in the glyph store:
+# the commands are MOVETO=0 (x, y), LINETO=1 (x, y), CURVETO=2 (x, y, vx1, vy1, vx2, vy2), CLOSE=3,
+# the coordinates are relative to a 1000pt font size at 96dpi, measured from the baseline (y points down).
+
+import os
+import sys
+from array  import array
+from glob   import glob
+from mmap   import mmap, ACCESS_READ
+from struct import Struct, unpack_from
+
+from glyphstore import MOVETO, LINETO, CURVETO, CLOSE
+
+#=====================================================================================================
+
+#--- TRUETYPE FONT -----------------------------------------------------------------------------------
+# A TrueType file starts with a table directory: tag => (offset, length).
+# The tables used are:
+# - head: units per em, and whether "loca" has 2-byte or 4-byte offsets,
+# - maxp: the number of glyphs,
+# - cmap: character code => glyph index,
+# - loca: glyph index => offset in "glyf",
+# - glyf: glyph outlines (quadratic curves), or composite glyphs (other glyphs, transformed),
+# - hhea + hmtx: glyph index => advance width,
+# - name: the font family and style.
+
+DPI = 96 # NodeBox for OpenGL uses 96dpi (see nodebox/font/glyph.py).
+
+# Flags in simple glyphs:
+ON_CURVE, X_SHORT, Y_SHORT, REPEAT, X_SAME, Y_SAME = 1, 2, 4, 8, 16, 32
+# Flags in composite glyphs:
+ARG_1_AND_2_ARE_WORDS, ARGS_ARE_XY_VALUES, WE_HAVE_A_SCALE, MORE_COMPONENTS, \
+WE_HAVE_AN_X_AND_Y_SCALE, WE_HAVE_A_TWO_BY_TWO = 0x1, 0x2, 0x8, 0x20, 0x40, 0x80
+
+_OFFSETS = Struct(">IHHHH")   # sfnt version, number of tables, ...
+_TABLE   = Struct(">4sIII")   # tag, checksum, offset, length.
+_NAME    = Struct(">HHHHHH")  # platform, encoding, language, name id, length, offset.
+_GLYPH   = Struct(">hhhhh")   # number of contours (-1 = composite), xmin, ymin, xmax, ymax.
+
+class TrueTypeError(Exception):
+    pass
+
+class TrueTypeFont(object):
+
+    def __init__(self, path):
+        """ The glyph outlines and advance widths in the given .ttf file.
+            The file is opened when a glyph is first requested.
+        """
+        self.path    = path
+        self._mmap   = None
+        self._tables = None # Tag => (offset, length).
+        self._cmap   = None # Character code => glyph index.
+        self._cache  = {}   # Character => (commands, coordinates)-tuple of arrays.
+
+    def _open(self):
+        # Reads the table directory and the font header.
+        f = open(self.path, "rb")
+        try:
+            self._mmap = m = mmap(f.fileno(), 0, access=ACCESS_READ)
+        finally:
+            f.close()
+        version, n = _OFFSETS.unpack_from(m, 0)[:2]
+        if version not in (0x00010000, 0x74727565): # 1.0, "true"
+            raise TrueTypeError, "%s is not a TrueType font" % self.path
+        self._tables = {}
+        for i in xrange(n):
+            tag, checksum, offset, length = _TABLE.unpack_from(m, _OFFSETS.size + i * _TABLE.size)
+            self._tables[tag] = (offset, length)
+        for tag in ("head", "maxp", "cmap", "loca", "glyf", "hhea", "hmtx"):
+            if tag not in self._tables:
+                raise TrueTypeError, "%s has no '%s' table" % (self.path, tag)
+        self.units = unpack_from(">H", m, self._table("head") + 18)[0]
+        self._long = unpack_from(">h", m, self._table("head") + 50)[0] == 1
+        self._glyphs = unpack_from(">H", m, self._table("maxp") + 4)[0]
+        self._metrics = unpack_from(">H", m, self._table("hhea") + 34)[0]
+        # The scale from font units to 1000pt at 96dpi.
+        self.scale = 1000.0 * DPI / 72 / self.units
+
+    def _table(self, tag):
+        if self._tables is None:
+            self._open()
+        return self._tables[tag][0]
+
+    @property
+    def name(self):
+        """ Yields a (family, style)-tuple, e.g., ("Droid Serif", "Bold Italic").
+        """
+        o = self._table("name") # KeyError if no "name" table.
+        m = self._mmap
+        format, n, strings = unpack_from(">HHH", m, o)
+        names = {}
+        for i in xrange(n):
+            platform, encoding, language, id, length, offset = _NAME.unpack_from(m, o + 6 + i * _NAME.size)
+            if id in (1, 2) and platform in (1, 3):
+                s = m[o+strings+offset:o+strings+offset+length]
+                # Windows names are UTF-16, Macintosh names are (mostly) Latin-1.
+                s = platform == 3 and s.decode("utf-16-be") or s.decode("latin-1")
+                if platform == 3 or id not in names:
+                    names[id] = s
+        return (names.get(1, u""), names.get(2, u""))
+
+    @property
+    def cmap(self):
+        """ Yields a dictionary of character code => glyph index.
+        """
+        if self._cmap is None:
+            self._cmap = self._read_cmap()
+        return self._cmap
+
+    def _read_cmap(self):
+        # Reads the Unicode subtable: format 12 (all of Unicode) or format 4 (Basic Multilingual Plane).
+        o = self._table("cmap")
+        m = self._mmap
+        n = unpack_from(">H", m, o + 2)[0]
+        subtables = {}
+        for i in xrange(n):
+            platform, encoding, offset = unpack_from(">HHI", m, o + 4 + i * 8)
+            subtables[(platform, encoding)] = o + offset
+        for k in ((3, 10), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)):
+            if k in subtables:
+                o = subtables[k]
+                format = unpack_from(">H", m, o)[0]
+                if format == 12:
+                    return self._read_cmap12(o)
+                if format == 4:
+                    return self._read_cmap4(o)
+        raise TrueTypeError, "%s has no Unicode character map" % self.path
+
+    def _read_cmap4(self, o):
+        # Segments of consecutive character codes: end codes, start codes, deltas, range offsets.
+        m = self._mmap
+        n = unpack_from(">H", m, o + 6)[0] // 2
+        end   = array("H", unpack_from(">%iH" % n, m, o + 14))
+        start = array("H", unpack_from(">%iH" % n, m, o + 16 + n * 2))
+        delta = array("h", unpack_from(">%ih" % n, m, o + 16 + n * 4))
+        range = o + 16 + n * 6
+        cmap = {}
+        for i in xrange(n):
+            r = unpack_from(">H", m, range + i * 2)[0]
+            for ch in xrange(start[i], end[i] + 1):
+                if ch == 0xFFFF:
+                    break
+                if r == 0:
+                    g = (ch + delta[i]) & 0xFFFF
+                else:
+                    g = unpack_from(">H", m, range + i * 2 + r + (ch - start[i]) * 2)[0]
+                    g = g and (g + delta[i]) & 0xFFFF
+                if g != 0:
+                    cmap[ch] = g
+        return cmap
+
+    def _read_cmap12(self, o):
+        # Groups of consecutive character codes: start code, end code, start glyph index.
+        m = self._mmap
+        n = unpack_from(">I", m, o + 12)[0]
+        cmap = {}
+        for i in xrange(n):
+            start, end, g = unpack_from(">III", m, o + 16 + i * 12)
+            for ch in xrange(start, end + 1):
+                cmap[ch] = g + ch - start
+        return cmap
+
+    def index(self, ch):
+        """ Returns the glyph index of the given character, or raises a KeyError.
+        """
+        return self.cmap[ord(ch)]
+
+    def __contains__(self, ch):
+        return ord(ch) in self.cmap
+
+    def advance(self, ch):
+        """ Returns the advance width of the given character (1000pt at 96dpi), or raises a KeyError.
+        """
+        g = min(self.index(ch), self._metrics - 1)
+        return unpack_from(">H", self._mmap, self._table("hmtx") + g * 4)[0] * self.scale
+
+    def _contours(self, g, depth=0):
+        # Returns a list of contours for the given glyph index,
+        # where each contour is a list of (x, y, on curve)-tuples in font units.
+        m = self._mmap
+        o = self._table("loca")
+        if self._long:
+            i, j = unpack_from(">II", m, o + g * 4)
+        else:
+            i, j = unpack_from(">HH", m, o + g * 2)
+            i, j = i * 2, j * 2
+        if i == j:
+            return [] # Empty glyph (e.g., space).
+        o = self._table("glyf") + i
+        n = _GLYPH.unpack_from(m, o)[0]
+        o += _GLYPH.size
+        if n >= 0:
+            return self._simple(o, n)
+        if depth > 8:
+            raise TrueTypeError, "%s: composite glyph %i is nested too deep" % (self.path, g)
+        return self._composite(o, depth)
+
+    def _simple(self, o, n):
+        # A simple glyph has the contour end points, instructions, flags, x-coordinates, y-coordinates.
+        m = self._mmap
+        end = unpack_from(">%iH" % n, m, o)
+        o += n * 2
+        o += 2 + unpack_from(">H", m, o)[0] # Skip instructions.
+        count = n and end[-1] + 1 or 0
+        flags = []
+        while len(flags) < count:
+            f = ord(m[o]); o+=1
+            flags.append(f)
+            if f & REPEAT:
+                flags.extend([f] * ord(m[o])); o+=1
+        flags = flags[:count]
+        xy = []
+        for short, same in ((X_SHORT, X_SAME), (Y_SHORT, Y_SAME)):
+            v, a = 0, []
+            for f in flags:
+                if f & short:
+                    d = ord(m[o]); o+=1
+                    v += f & same and d or -d
+                elif not f & same:
+                    v += unpack_from(">h", m, o)[0]; o+=2
+                a.append(v)
+            xy.append(a)
+        contours, i = [], 0
+        for j in end:
+            contours.append([(xy[0][k], xy[1][k], flags[k] & ON_CURVE) for k in xrange(i, j + 1)])
+            i = j + 1
+        return contours
+
+    def _composite(self, o, depth):
+        # A composite glyph has components: flags, glyph index, offset and optional transformation.
+        m = self._mmap
+        contours = []
+        while True:
+            flags, g = unpack_from(">HH", m, o); o+=4
+            if flags & ARG_1_AND_2_ARE_WORDS:
+                dx, dy = unpack_from(">hh", m, o); o+=4
+            else:
+                dx, dy = unpack_from(">bb", m, o); o+=2
+            if not flags & ARGS_ARE_XY_VALUES:
+                dx, dy = 0, 0 # Matching point numbers is not supported.
+            a, b, c, d = 1.0, 0.0, 0.0, 1.0
+            if flags & WE_HAVE_A_SCALE:
+                a = d = unpack_from(">h", m, o)[0] / 16384.0; o+=2
+            elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                a, d = [v / 16384.0 for v in unpack_from(">hh", m, o)]; o+=4
+            elif flags & WE_HAVE_A_TWO_BY_TWO:
+                a, b, c, d = [v / 16384.0 for v in unpack_from(">hhhh", m, o)]; o+=8
+            for contour in self._contours(g, depth+1):
+                contours.append([(a*x + c*y + dx, b*x + d*y + dy, on) for x, y, on in contour])
+            if not flags & MORE_COMPONENTS:
+                break
+        return contours
+
+    def glyph(self, ch):
+        """ Returns a (commands, coordinates)-tuple of arrays for the given character,
+            or raises a KeyError.
+            Quadratic curves are converted to cubic curves.
+        """
+        if ch not in self._cache:
+            cmds, coords = array("B"), array("d")
+            s = self.scale
+            for contour in self._contours(self.index(ch)):
+                # Between two off-curve points there is an implied on-curve point.
+                points = []
+                for i, (x, y, on) in enumerate(contour):
+                    x0, y0, on0 = contour[i-1]
+                    if not on and not on0:
+                        points.append(((x0 + x) * 0.5, (y0 + y) * 0.5, True))
+                    points.append((x, y, on))
+                if not points:
+                    continue
+                # Start at an on-curve point.
+                i = 0
+                while not points[i][2]:
+                    i += 1
+                points = points[i:] + points[:i+1]
+                x0, y0 = points[0][0] * s, -points[0][1] * s
+                cmds.append(MOVETO)
+                coords.extend((x0, y0))
+                i = 1
+                while i < len(points):
+                    x, y, on = points[i]
+                    x, y = x * s, -y * s
+                    if on:
+                        # The line back to the start point is drawn by CLOSE.
+                        if i < len(points) - 1:
+                            cmds.append(LINETO)
+                            coords.extend((x, y))
+                        i += 1
+                    else:
+                        x1, y1 = points[i+1][0] * s, -points[i+1][1] * s
+                        cmds.append(CURVETO)
+                        coords.extend((x1, y1,
+                            x0 + (x - x0) * 2/3.0, y0 + (y - y0) * 2/3.0,
+                            x1 + (x - x1) * 2/3.0, y1 + (y - y1) * 2/3.0))
+                        x, y = x1, y1
+                        i += 2
+                    x0, y0 = x, y
+                cmds.append(CLOSE)
+            self._cache[ch] = (cmds, coords)
+        return self._cache[ch]
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap   = None
+        self._tables = None
+        self._cmap   = None
+        self._cache  = {}
+
+    def __repr__(self):
+        return "TrueTypeFont(path=%s)" % repr(self.path)
+
+#--- FONT FOLDER -------------------------------------------------------------------------------------
+# The .ttf files in a folder, by font name and weight (e.g., "Droid Serif", "bold italic").
+
+def _weight(style):
+    # "Regular" => "normal", "Bold Italic" => "bold italic".
+    style = style.lower().replace("oblique", "italic")
+    return style in ("regular", "normal", "book", "roman", "") and "normal" or style
+
+class FontFolder(object):
+
+    def __init__(self, path):
+        """ The TrueType fonts in the given folder.
+            The name table of each file is read when a glyph is first requested.
+        """
+        self.path   = path
+        self._fonts = None # (font name, weight) => TrueTypeFont.
+
+    @property
+    def fonts(self):
+        if self._fonts is None:
+            self._fonts = {}
+            for f in sorted(glob(os.path.join(self.path, "*.ttf"))):
+                try:
+                    f = TrueTypeFont(f)
+                    family, style = f.name
+                except (IOError, KeyError, TrueTypeError):
+                    continue
+                self._fonts[(family, _weight(style))] = f
+        return self._fonts
+
+    def font(self, fontname, weight="normal"):
+        """ Returns the TrueTypeFont with the given name and weight, or raises a KeyError.
+        """
+        return self.fonts[(fontname, weight)]
+
+    def __contains__(self, (fontname, weight)):
+        return (fontname, weight) in self.fonts
+
+    def glyph(self, fontname, weight, ch):
+        """ Returns a (commands, coordinates)-tuple of arrays for the given character,
+            or raises a KeyError.
+        """
+        return self.font(fontname, weight).glyph(ch)
+
+    def advance(self, fontname, weight, ch):
+        """ Returns the advance width of the given character (1000pt at 96dpi), or raises a KeyError.
+        """
+        return self.font(fontname, weight).advance(ch)
+
+    def close(self):
+        for f in (self._fonts or {}).values():
+            f.close()
+        self._fonts = None
+
+    def __repr__(self):
+        return "FontFolder(path=%s)" % repr(self.path)
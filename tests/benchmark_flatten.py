@@ -0,0 +1,51 @@
+#=== FLATTEN BENCHMARK ===============================================================================
+# Times bezier.flatten() for a path of 300 contours with 10 curves each,
+# in pure Python and with the C extension (nodebox/ext/bezier.c), if it is compiled.
+# > python tests/benchmark_flatten.py
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "nodebox", "graphics"))
+
+os.environ.setdefault("PYGLET_SHADOW_WINDOW", "0")
+
+from time   import time
+from random import seed, random
+
+import bezier
+import context
+
+def path(contours=300, curves=10):
+    seed(1)
+    p = context.BezierPath()
+    for i in range(contours):
+        x, y = random() * 500, random() * 500
+        p.moveto(x, y)
+        for j in range(curves):
+            p.curveto(*[v + random() * 50 for v in (x, y, x, y, x, y)])
+        p.closepath()
+    return p
+
+def best(f, n=20):
+    # Returns the fastest time of n runs.
+    t = []
+    for i in range(n):
+        t0 = time(); f(); t.append(time() - t0)
+    return min(t)
+
+if __name__ == "__main__":
+    cmds, coords = path()._arrays()
+    for name, precision, tolerance in (
+      ("relative", 0.2, None),
+         ("fixed", 10, None),
+      ("flatness", context.FLATNESS, 0.25)):
+        n = sum(len(contour) for contour in bezier.flatten(cmds, coords, precision, tolerance))
+        t1 = best(lambda: bezier._py_flatten(cmds, coords, precision, tolerance))
+        t2 = best(lambda: bezier.flatten(cmds, coords, precision, tolerance))
+        if bezier.flatten is bezier._py_flatten:
+            print "%-8s %6i points  Python %.4fs  (C extension not compiled)" % (name, n, t1)
+        else:
+            print "%-8s %6i points  Python %.4fs  C %.4fs  (%.1fx)" % (name, n, t1, t2, t1 / t2)
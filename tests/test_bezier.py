@@ -0,0 +1,169 @@
+#=== BEZIER TESTS ====================================================================================
+# Unit tests for nodebox/graphics/bezier.py.
+# The bezier module imports context.py, which needs pyglet (the tests are skipped without it),
+# but not a window: pyglet's hidden shadow window is disabled.
+# > python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "nodebox", "graphics"))
+
+from array  import array
+from math   import pi
+from random import Random
+
+os.environ.setdefault("PYGLET_SHADOW_WINDOW", "0")
+
+try:
+    import pyglet
+except ImportError:
+    pyglet = None
+
+if pyglet is not None:
+    import bezier
+    import context
+
+try:
+    from nodebox.ext.bezier import flatten as c_flatten
+except ImportError:
+    c_flatten = None
+
+#=====================================================================================================
+
+def packed(*commands):
+    # Returns (cmds, coords) arrays for the given list of (cmd, x1, y1, x2, y2, x3, y3)-tuples.
+    return array("B", [c[0] for c in commands]), array("d", [v for c in commands for v in c[1:]])
+
+def curve_points(x0, y0, x1, y1, x2, y2, x3, y3, n=10000):
+    # Returns n+1 points sampled on the curve.
+    return [bezier.curvepoint(float(i) / n, x0, y0, x1, y1, x2, y2, x3, y3)[:2] for i in range(n+1)]
+
+#--- BEZIER PATH BOUNDS ------------------------------------------------------------------------------
+
+@unittest.skipIf(pyglet is None, "requires pyglet")
+class TestBounds(unittest.TestCase):
+
+    def test_curve(self):
+        # The bounds of a curve include the extrema outside its end points.
+        cmds, coords = packed((0, 0, 0, 0, 0, 0, 0), (2, 0, 100, 100, 100, 100, 0))
+        self.assertEqual(bezier.bounds(cmds, coords), [(0, 0, 100, 75)])
+        # An S-curve with extrema below and above its end points.
+        cmds, coords = packed((0, 0, 0, 0, 0, 0, 0), (2, 150, -50, -50, 150, 100, 100))
+        x, y, w, h = bezier.bounds(cmds, coords)[0]
+        p = curve_points(0, 0, 150, -50, -50, 150, 100, 100)
+        self.assertTrue(y < 0 and y + h > 100)
+        self.assertAlmostEqual(x, min(pt[0] for pt in p), 3)
+        self.assertAlmostEqual(y, min(pt[1] for pt in p), 3)
+        self.assertAlmostEqual(x + w, max(pt[0] for pt in p), 3)
+        self.assertAlmostEqual(y + h, max(pt[1] for pt in p), 3)
+
+    def test_contours(self):
+        # Each contour has its own bounds, a contour without lines or curves is omitted.
+        cmds, coords = packed(
+            (0, 0, 0, 0, 0, 0, 0), (1, 10, 10, 10, 10, 10, 10), (3, 0, 0, 0, 0, 0, 0),
+            (0, 50, 50, 50, 50, 50, 50),
+            (0, 20, 20, 20, 20, 20, 20), (1, 30, 25, 30, 25, 30, 25))
+        self.assertEqual(bezier.bounds(cmds, coords), [(0, 0, 10, 10), (20, 20, 10, 5)])
+
+    def test_path(self):
+        p = context.BezierPath()
+        p.moveto(0, 0)
+        p.curveto(0, 100, 100, 100, 100, 0)
+        p.moveto(200, 0)
+        p.lineto(210, -10)
+        self.assertEqual(p.bounds, (0, -10, 210, 85))
+        self.assertEqual(p.contour_bounds, [(0, 0, 100, 75), (200, -10, 10, 10)])
+        # The bounds are calculated again when the path changes.
+        p[1].ctrl1.y = 200
+        self.assertTrue(p.bounds[3] > 85)
+        self.assertFalse(p.contains(50, -5))
+        self.assertTrue(p.contains(50, 50))
+
+#--- FLATTEN ----------------------------------------------------------------------------------------
+
+@unittest.skipIf(pyglet is None, "requires pyglet")
+class TestFlatten(unittest.TestCase):
+
+    def test_flatten(self):
+        # Curves are flattened into line strips, without duplicate points.
+        cmds, coords = packed(
+            (0, 0, 0, 0, 0, 0, 0), (2, 0, 100, 100, 100, 100, 0), (1, 100, 0, 100, 0, 100, 0), (3, 0, 0, 0, 0, 0, 0))
+        p = bezier.flatten(cmds, coords, 4)
+        self.assertEqual(len(p), 1)
+        self.assertEqual(p[0][0], (0, 0))
+        self.assertEqual(p[0][-2:], [(100, 0), (0, 0)])
+        self.assertEqual(len(p[0]), 6)
+        # With a tolerance, the number of lines depends on the curvature.
+        self.assertTrue(len(bezier.flatten(cmds, coords, tolerance=0.1)[0]) > len(p[0]))
+
+    @unittest.skipIf(c_flatten is None, "requires nodebox/ext/bezier.c")
+    def test_c(self):
+        # The C version returns the same points as the Python version.
+        r = Random(1)
+        for i in range(200):
+            cmds = array("B", [r.choice((0, 1, 2, 2, 3)) for j in range(r.randint(0, 20))])
+            coords = array("d", [r.choice((0.0, r.random() * 100)) for j in range(len(cmds) * 6)])
+            for precision, tolerance in ((0.2, None), (10, None), (0, None), (context.FLATNESS, 0.25)):
+                self.assertEqual(
+                    c_flatten(cmds, coords, precision, tolerance), 
+                    bezier._py_flatten(cmds, coords, precision, tolerance))
+
+#--- ARC LENGTH --------------------------------------------------------------------------------------
+
+@unittest.skipIf(pyglet is None, "requires pyglet")
+class TestArcLength(unittest.TestCase):
+
+    def setUp(self):
+        self.line = context.BezierPath()
+        self.line.moveto(0, 0)
+        self.line.lineto(100, 0)
+        self.line.lineto(100, 100)
+        self.circle = context.BezierPath()
+        self.circle.ellipse(0, 0, 100, 100)
+
+    def test_length(self):
+        self.assertAlmostEqual(self.line.length, 200, 6)
+        # Each curve is measured with 10 straight lines.
+        self.assertTrue(abs(self.circle.length - pi * 100) < 0.002 * pi * 100)
+
+    def test_points(self):
+        # The points are spaced by distance along the path, not by the number of segments.
+        self.assertEqual(list(self.line.points_array(5)), [0, 0, 50, 0, 100, 0, 100, 50, 100, 100])
+        self.assertEqual([(pt.x, pt.y) for pt in self.line.points(5)], 
+            [(0, 0), (50, 0), (100, 0), (100, 50), (100, 100)])
+        # The points in a single pass are the same as for each point separately.
+        for t in (0.0, 0.1, 0.25, 0.5, 0.9, 1.0):
+            a = self.circle.point(t)
+            b = list(self.circle.points(2, start=t, end=t))[0]
+            self.assertAlmostEqual(a.x, b.x, 9)
+            self.assertAlmostEqual(a.y, b.y, 9)
+        # Descending.
+        self.assertEqual(list(self.line.points_array(5, start=1.0, end=0.0)), [100, 100, 100, 50, 100, 0, 50, 0, 0, 0])
+        # The t is clamped between 0.0 and 1.0.
+        self.assertEqual((self.line.point(-1).x, self.line.point(-1).y), (0, 0))
+        self.assertEqual((self.line.point(2).x, self.line.point(2).y), (100, 100))
+
+    def test_spacing(self):
+        # The points on a curve are (nearly) evenly distributed.
+        v = self.circle.points_array(101)
+        d = [((v[i+2]-v[i])**2 + (v[i+3]-v[i+1])**2) ** 0.5 for i in range(0, len(v)-2, 2)]
+        for x in d:
+            self.assertTrue(abs(x - self.circle.length / 100) < 0.02 * self.circle.length / 100)
+        # Each point is on the circle (ellipse() is centered at x, y).
+        for i in range(0, len(v), 2):
+            self.assertAlmostEqual((v[i]**2 + v[i+1]**2) ** 0.5, 50, 1)
+
+    def test_no_length(self):
+        p = context.BezierPath()
+        p.moveto(10, 20)
+        p.lineto(10, 20)
+        self.assertEqual(p.length, 0)
+        self.assertEqual((p.point(0.5).x, p.point(0.5).y), (10, 20))
+        self.assertEqual(list(p.points_array(2)), [10, 20, 10, 20])
+
+if __name__ == "__main__":
+    unittest.main()
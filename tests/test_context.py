@@ -0,0 +1,215 @@
+#=== CONTEXT TESTS ===================================================================================
+# Unit tests for nodebox/graphics/context.py.
+# The context module needs pyglet (the tests are skipped without it), but not a window:
+# context.py is imported directly (importing the nodebox.graphics package would open a window),
+# and pyglet's hidden shadow window is disabled.
+# > python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "nodebox", "graphics"))
+
+os.environ.setdefault("PYGLET_SHADOW_WINDOW", "0")
+
+try:
+    import pyglet
+except ImportError:
+    pyglet = None
+
+if pyglet is not None:
+    import context
+
+#--- BATCH -------------------------------------------------------------------------------------------
+
+@unittest.skipIf(pyglet is None, "requires pyglet")
+class TestBatch(unittest.TestCase):
+
+    GL = ("glPushClientAttrib", "glPopClientAttrib", "glEnableClientState",
+          "glVertexPointer", "glColorPointer", "glLineWidth", "glLineDash", "glDrawArrays")
+
+    def setUp(self):
+        # The OpenGL calls in context.py are patched to record what is drawn (without an OpenGL context).
+        self.drawn = []
+        self.gl = dict((k, getattr(context, k)) for k in self.GL)
+        for k in self.GL:
+            setattr(context, k, lambda *args: None)
+        context.glDrawArrays = lambda mode, i, n: self.drawn.append((mode, n))
+        context.glstate.reset()
+
+    def tearDown(self):
+        for k, f in self.gl.items():
+            setattr(context, k, f)
+        context.glstate.reset()
+
+    def test_flush(self):
+        # The fills and the strokes of each strokewidth are drawn with one call each.
+        with context.batch() as b:
+            for i in range(10):
+                context.rect(i, 0, 1, 1, fill=(0,0,0,1), stroke=(1,0,0,1), strokewidth=1)
+            context.line(0, 0, 10, 10, stroke=(1,0,0,1), strokewidth=2)
+            context.rect(0, 0, 10, 10, fill=(0,0,0,1), stroke=None)
+            self.assertEqual(len(b), 10*6 + 10*8 + 2 + 6)
+        self.assertEqual(self.drawn, [
+            (context.GL_TRIANGLES, 10*6 + 6),
+            (context.GL_LINES, 10*8),
+            (context.GL_LINES, 2)])
+        self.assertEqual(b.calls, 3)
+        self.assertEqual(len(b), 0)
+
+#--- BEZIER PATH -------------------------------------------------------------------------------------
+
+@unittest.skipIf(pyglet is None, "requires pyglet")
+class TestBezierPath(unittest.TestCase):
+
+    def test_packed(self):
+        # PathElements from a PackedPath (which are views on its arrays) are copied into a BezierPath.
+        a = context.PackedPath()
+        a.moveto(0, 0)
+        a.lineto(10, 0)
+        a.curveto(10, 10, 20, 10, 20, 0)
+        p = context.BezierPath()
+        p.append(a[0])
+        p.extend(a)
+        p.insert(0, a[1])
+        p[0] = a[2]
+        p[1:2] = a[:1]
+        self.assertEqual([pt.cmd for pt in p], ["curveto", "moveto", "moveto", "lineto", "curveto"])
+        self.assertEqual((p[-1].ctrl1.x, p[-1].ctrl1.y, p[-1].x, p[-1].y), (10, 10, 20, 0))
+        # Modifying the packed path does not modify the copies.
+        a[1].x = 100
+        self.assertEqual(p[3].x, 10)
+        # Modifying a copy modifies the path.
+        b = p.bounds
+        p[3].x = 100
+        self.assertNotEqual(p.bounds, b)
+
+    def test_textpath(self):
+        p = context.BezierPath()
+        p.moveto(0, 0)
+        p.extend(context.textpath("a"))
+        self.assertTrue(len(p) > 1)
+        self.assertTrue(p.bounds[2] > 0)
+
+    def test_transform(self):
+        # The cached flattened contours are transformed along with the path,
+        # unless the transform enlarges the path, which then needs more lines per curve.
+        def circle():
+            p = context.BezierPath()
+            p.ellipse(0, 0, 10, 10)
+            return p
+        def points(p, precision, tolerance=None):
+            p._update() # See BezierPath.draw().
+            return sum(len(c) for c in p._geometry(precision, tolerance)[3])
+        t = context.Transform()
+        t.rotate(45)
+        t.scale(0.5)
+        p = circle()
+        points(p, context.FLATNESS, 0.5)
+        p.transform(t)
+        self.assertTrue(p._cache[0][3] is not None)
+        self.assertTrue(p._cache[0][4] is not None)
+        q = circle()
+        q.transform(t)
+        self.assertEqual(p.bounds, q.bounds)
+        for a, b in zip(p._geometry(context.FLATNESS, 0.5)[3][0], q.flatten(context.FLATNESS, 0.5)[0]):
+            self.assertAlmostEqual(a[0], b[0], 9)
+            self.assertAlmostEqual(a[1], b[1], 9)
+        # Enlarged.
+        t = context.Transform()
+        t.scale(100)
+        p = circle()
+        n = points(p, context.FLATNESS, 0.5)
+        p.transform(t)
+        self.assertTrue(p._cache[0][3] is None)
+        self.assertTrue(points(p, context.FLATNESS, 0.5) > n)
+        # A fixed number of lines per curve is kept.
+        p = circle()
+        n = points(p, 10)
+        p.transform(t)
+        self.assertTrue(p._cache[0][3] is not None)
+        self.assertEqual(points(p, 10), n)
+
+#--- TEXT --------------------------------------------------------------------------------------------
+
+@unittest.skipIf(pyglet is None, "requires pyglet")
+class TestText(unittest.TestCase):
+
+    def setUp(self):
+        # Laying out text needs fonts (and on some platforms an OpenGL context).
+        try:
+            context.Text("a")
+        except Exception, e:
+            self.skipTest("can't lay out text: %s" % e)
+        context._texts.clear()
+        context._text_metrics.clear()
+
+    def test_metrics(self):
+        # Measured strings are cached in the text metrics cache, not in the text() cache.
+        for i in range(10):
+            context.textwidth("text %i" % i)
+        context.textmetrics("text 0", width=100)
+        self.assertEqual(len(context._texts), 0)
+        self.assertEqual(len(context._text_metrics), 11)
+        self.assertEqual(context.textwidth("text 1"), context.textwidth("text 1"))
+        self.assertEqual(len(context._text_metrics), 11)
+
+    def test_cache(self):
+        # A string drawn again is not laid out again.
+        context.text("abc", 0, 0, draw=False)
+        t = context.text("abc", 10, 20, fill=(1,0,0,1), draw=False)
+        self.assertEqual(len(context._texts), 1)
+        self.assertEqual((t.x, t.y), (10, 20))
+        self.assertEqual(list(t._label.color), [255, 0, 0, 255])
+        # A cached Text that is still referenced elsewhere is not reused.
+        self.assertTrue(context.text("abc", 10, 20, draw=False) is not t)
+        # A cached Text that was modified is not reused.
+        t = context.text("abc", 0, 0, draw=False)
+        t.fontsize = 30
+        del t
+        self.assertEqual(context.text("abc", 0, 0, draw=False).fontsize, context.text("xyz", draw=False).fontsize)
+
+    def test_batch(self):
+        b1 = context.TextBatch()
+        t1 = b1.text("a", 10, 20)
+        t2 = context.Text("b", 30, 40, fontsize=20, fill=(1,0,0,1))
+        b1.append(t2)
+        self.assertEqual(list(b1), [t1, t2])
+        self.assertTrue(t1._label.batch is b1._batch)
+        self.assertTrue(t2._label.batch is b1._batch)
+        # The style is kept when the label is moved to the batch.
+        self.assertEqual((t2.text, t2.fontsize, list(t2._label.color)), ("b", 20, [255, 0, 0, 255]))
+        # A Text can only be in one batch.
+        b2 = context.TextBatch([t1])
+        self.assertEqual(list(b1), [t2])
+        self.assertEqual(list(b2), [t1])
+        self.assertTrue(t1._batch is b2 and t1._label.batch is b2._batch)
+        b2.remove(t1)
+        self.assertTrue(t1._batch is None and t1._label.batch is context._label_batch)
+        self.assertEqual(len(b2), 0)
+
+    def test_move(self):
+        # The vertices of the labels in a batch are moved to Text.x and Text.y (without layout).
+        b = context.TextBatch()
+        t = b.text("a", 0, 0)
+        v0 = list(t._label._vertex_lists[0].vertices)
+        t._move()
+        t.x = 10
+        t.y = 20
+        t._move()
+        v1 = list(t._label._vertex_lists[0].vertices)
+        self.assertEqual(v1[0::2], [x + 10 for x in v0[0::2]])
+        self.assertEqual(v1[1::2], [y + 20 for y in v0[1::2]])
+        self.assertEqual(t._offset, (10, 20))
+        # Modifying the text lays it out again at (0, 0).
+        t.text = "b"
+        t._move()
+        self.assertEqual(t._offset, (10, 20))
+        v2 = list(context.TextBatch().text("b")._label._vertex_lists[0].vertices)
+        self.assertEqual(list(t._label._vertex_lists[0].vertices)[1::2], [y + 20 for y in v2[1::2]])
+
+if __name__ == "__main__":
+    unittest.main()
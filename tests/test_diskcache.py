@@ -0,0 +1,104 @@
+#=== DISK CACHE TESTS ================================================================================
+# Unit tests for nodebox/graphics/diskcache.py.
+# > python -m unittest discover tests
+
+import os
+import sys
+import unittest
+import tempfile
+import shutil
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "nodebox", "graphics"))
+
+import diskcache
+
+#--- DISK CACHE --------------------------------------------------------------------------------------
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "geometry.cache")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_get(self):
+        cache = diskcache.DiskCache(self.path)
+        cache.set("a"*16, [1, 2, 3], None)
+        self.assertEqual(cache.get("a"*16), (diskcache.array("f", [1, 2, 3]), None))
+        self.assertEqual(cache.get("b"*16), None)
+        cache.close()
+        # The records are read again from the file.
+        cache = diskcache.DiskCache(self.path)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(list(cache.get("a"*16)[0]), [1, 2, 3])
+
+    def test_merge(self):
+        # Storing the lines after the triangles (or vice versa) keeps both.
+        cache = diskcache.DiskCache(self.path)
+        cache.set("a"*16, [1, 2, 3], None)
+        cache.set("a"*16, None, [4, 5])
+        triangles, lines = cache.get("a"*16)
+        self.assertEqual(list(triangles), [1, 2, 3])
+        self.assertEqual(list(lines), [4, 5])
+        self.assertEqual(len(cache), 1)
+
+    def test_compact(self):
+        # Replaced records are removed when the file is full.
+        cache = diskcache.DiskCache(self.path, bytes=1024)
+        for i in range(100):
+            self.assertTrue(cache.set("a"*16, range(i % 50), None))
+        self.assertTrue(os.path.getsize(self.path) <= 1024)
+        self.assertEqual(len(cache.get("a"*16)[0]), 99 % 50)
+        cache.compact()
+        self.assertEqual(os.path.getsize(self.path), cache.stats()["bytes"])
+        self.assertEqual(len(cache.get("a"*16)[0]), 99 % 50)
+        # New records are refused when the file is full of records that are used.
+        n = 0
+        while cache.set("%16i" % n, range(20), None):
+            n += 1
+        self.assertTrue(n > 0)
+        self.assertEqual(len(cache), n + 1)
+
+    def test_shared(self):
+        # Two caches on the same file (e.g., in two processes) see each other's records.
+        a = diskcache.DiskCache(self.path)
+        b = diskcache.DiskCache(self.path)
+        a.set("a"*16, [1, 2, 3], None)
+        b.set("b"*16, [4, 5], None)
+        self.assertEqual(list(b.get("a"*16)[0]), [1, 2, 3])
+        self.assertEqual(list(a.get("b"*16)[0]), [4, 5])
+        self.assertEqual(list(a.get("a"*16)[0]), [1, 2, 3])
+        # Replaced records are removed by one cache, the other cache reads the new file.
+        a.set("a"*16, [6], None)
+        a.compact()
+        b.set("c"*16, [7, 8, 9], None)
+        self.assertEqual(list(b.get("a"*16)[0]), [6])
+        self.assertEqual(list(b.get("b"*16)[0]), [4, 5])
+        self.assertEqual(list(a.get("c"*16)[0]), [7, 8, 9])
+        self.assertEqual(len(diskcache.DiskCache(self.path)), 3)
+        b.clear()
+        a.set("d"*16, [1], None)
+        self.assertEqual(len(a), 1)
+        self.assertEqual(len(diskcache.DiskCache(self.path)), 1)
+        a.close()
+        b.close()
+
+    def test_truncated(self):
+        # A partially written record is removed when the file is opened.
+        cache = diskcache.DiskCache(self.path)
+        cache.set("a"*16, [1, 2, 3], None)
+        cache.close()
+        open(self.path, "ab").write(diskcache._RECORD.pack("b"*16, 100, -1) + "\0" * 10)
+        cache = diskcache.DiskCache(self.path)
+        self.assertEqual(len(cache), 1)
+        cache.set("c"*16, [4], None)
+        cache.close()
+        cache = diskcache.DiskCache(self.path)
+        self.assertEqual(list(cache.get("c"*16)[0]), [4])
+        cache.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,374 @@
+#=== GEOMETRY TESTS ==================================================================================
+# Unit tests for nodebox/graphics/geometry.py.
+# The geometry module does not need OpenGL or a display, so it is imported directly
+# (importing the nodebox.graphics package would open a window).
+# > python -m unittest discover tests
+
+import os
+import sys
+import unittest
+import random
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "nodebox", "graphics"))
+
+from math import sin, cos, pi
+
+import geometry
+
+try:
+    from nodebox.ext.triangulate import triangulate as c_triangulate
+except ImportError:
+    c_triangulate = None
+
+try:
+    from nodebox.ext.geometry import simplify as c_simplify
+except ImportError:
+    c_simplify = None
+
+#=====================================================================================================
+
+def circle(x, y, r, n=24, clockwise=False):
+    p = [(x + r * cos(2*pi*i/n), y + r * sin(2*pi*i/n)) for i in range(n)]
+    return clockwise and p[::-1] or p
+
+def square(x, y, size):
+    return [(x, y), (x+size, y), (x+size, y+size), (x, y+size)]
+
+def polygon_area(points):
+    # Signed area of a simple polygon (shoelace formula).
+    return sum(x0*y1 - x1*y0 for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])) / 2.0
+
+def triangles_area(v):
+    # Total area of a flat list of triangle coordinates.
+    return sum(abs((v[i+2]-v[i]) * (v[i+5]-v[i+1]) - (v[i+4]-v[i]) * (v[i+3]-v[i+1])) / 2.0
+        for i in range(0, len(v), 6))
+
+def winding(contours, x, y):
+    # Winding number of point (x,y), checking each edge (ray casting algorithm).
+    n = 0
+    for points in contours:
+        for (x0, y0), (x1, y1) in zip(points[-1:] + points[:-1], points):
+            if (y0 < y <= y1 or y1 < y <= y0) and x0 + float(y-y0) / (y1-y0) * (x1-x0) < x:
+                n += y0 < y1 and 1 or -1
+    return n
+
+#--- LRU CACHE ---------------------------------------------------------------------------------------
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_size(self):
+        # The least recently used item is discarded first.
+        evicted = []
+        cache = geometry.LRUCache(size=3, evict=lambda k, v: evicted.append(k))
+        for k in "abc":
+            cache[k] = k.upper()
+        cache.get("a") # b is now the least recently used.
+        cache["d"] = "D"
+        self.assertEqual(cache.keys(), ["c", "a", "d"])
+        self.assertEqual(evicted, ["b"])
+        self.assertTrue("b" not in cache)
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache["a"], "A")
+        self.assertRaises(KeyError, lambda: cache["b"])
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 2, 1))
+        # Replacing an item does not discard other items.
+        cache["c"] = "C"
+        self.assertEqual(cache.keys(), ["d", "a", "c"])
+
+    def test_bytes(self):
+        # Items are discarded until the total size is within the limit.
+        cache = geometry.LRUCache(bytes=10, sizeof=len)
+        cache["a"] = "x" * 4
+        cache["b"] = "x" * 4
+        self.assertEqual(cache.nbytes, 8)
+        cache["c"] = "x" * 4
+        self.assertEqual(cache.keys(), ["b", "c"])
+        self.assertEqual(cache.nbytes, 8)
+        # The most recently used item is kept, even if it is larger than the limit.
+        cache["d"] = "x" * 20
+        self.assertEqual(cache.keys(), ["d"])
+        self.assertEqual(cache.nbytes, 20)
+        self.assertEqual(cache.pop("d"), "x" * 20)
+        self.assertEqual(cache.nbytes, 0)
+
+    def test_clear(self):
+        evicted = []
+        cache = geometry.lrucache("test", size=10, evict=lambda k, v: evicted.append(k))
+        for i in range(5):
+            cache[i] = i
+        self.assertEqual(geometry.cache_stats("test")["items"], 5)
+        geometry.cache_limit("test", size=2)
+        self.assertEqual(cache.keys(), [3, 4])
+        geometry.cache_clear("test")
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(evicted, [0, 1, 2, 3, 4])
+        self.assertRaises(KeyError, geometry.cache_limit, "no such cache", 1)
+        del geometry._caches["test"]
+
+#--- POLYGON INDEX -----------------------------------------------------------------------------------
+
+class TestPolygonIndex(unittest.TestCase):
+
+    def test_winding(self):
+        # The winding number is the same as when checking each edge,
+        # also for points on the edges of polygons aligned to the grid.
+        random.seed(3)
+        for contours in (
+          [square(0, 0, 10)],
+          [square(0, 0, 10), square(5, 5, 10)],
+          [square(0, 0, 10), square(2, 2, 6)[::-1]],
+          [[(0, 0), (0, 10), (10, 10)]],
+          [circle(50, 50, 40, 500)],
+          [[(random.random() * 100, random.random() * 100) for i in range(300)]]):
+            index = geometry.PolygonIndex(contours)
+            points  = [(random.uniform(-5, 105), random.uniform(-5, 105)) for i in range(1000)]
+            points += [(x, y) for x in range(-1, 17) for y in range(-1, 17)]
+            for x, y in points:
+                self.assertEqual(index.winding(x, y), winding(contours, x, y))
+                self.assertEqual(index.contains(x, y), winding(contours, x, y) % 2 != 0)
+
+    def test_contains_many(self):
+        # PolygonIndex.contains_many() yields the same as PolygonIndex.contains() for each point.
+        random.seed(4)
+        index = geometry.PolygonIndex([circle(50, 50, 40, 100), circle(50, 50, 20, 50)])
+        points = [(random.uniform(0, 100), random.uniform(0, 100)) for i in range(1000)]
+        self.assertEqual(index.contains_many(points), [index.contains(x, y) for x, y in points])
+        self.assertEqual(index.winding_many(points), [index.winding(x, y) for x, y in points])
+
+    def test_long_edges(self):
+        # Long edges (e.g. noisy data) are not stored in every cell of the grid.
+        random.seed(5)
+        contours = [[(i * 0.05, random.random() * 100) for i in range(5000)]]
+        index = geometry.PolygonIndex(contours)
+        self.assertTrue(sum(len(cell) for cell in index._cells) <= 16 * index.edges)
+        for i in range(100):
+            x, y = random.random() * 250, random.random() * 100
+            self.assertEqual(index.winding(x, y), winding(contours, x, y))
+
+#--- TRIANGULATION -----------------------------------------------------------------------------------
+
+class TestTriangulate(unittest.TestCase):
+
+    def setUp(self):
+        self.functions = [geometry._py_triangulate]
+        if c_triangulate is not None:
+            self.functions.append(c_triangulate)
+
+    def test_convex(self):
+        # A convex polygon with n vertices yields n-2 triangles.
+        for f in self.functions:
+            p = circle(0, 0, 100, 60)
+            v = f([p], True)
+            self.assertEqual(len(v) / 6, 58)
+            self.assertAlmostEqual(triangles_area(v), polygon_area(p), 6)
+
+    def test_hole(self):
+        # A polygon with a hole: the area of the hole is subtracted.
+        for f in self.functions:
+            p1 = circle(0, 0, 100, 40)
+            p2 = circle(0, 0, 50, 30, clockwise=True)
+            v = f([p1, p2], True)
+            self.assertAlmostEqual(triangles_area(v), polygon_area(p1) + polygon_area(p2), 6)
+            self.assertTrue(len(v) / 6 <= len(p1) + len(p2))
+
+    def test_overlap(self):
+        # Overlapping squares: nonzero fills the union, odd leaves the overlap empty.
+        for f in self.functions:
+            p = [square(0, 0, 10), square(5, 5, 10)]
+            self.assertAlmostEqual(triangles_area(f(p, True)), 175, 6)
+            self.assertAlmostEqual(triangles_area(f(p, False)), 150, 6)
+
+    def test_self_intersecting(self):
+        # A pentagram: nonzero fills the center, odd does not.
+        for f in self.functions:
+            p = [(cos(pi/2 + 4*pi*i/5) * 100, sin(pi/2 + 4*pi*i/5) * 100) for i in range(5)]
+            a1 = triangles_area(f([p], True))
+            a2 = triangles_area(f([p], False))
+            self.assertTrue(a1 > a2 > 0)
+
+    def test_triangle_count(self):
+        # The number of triangles grows with the number of vertices, not with the number of slabs.
+        random.seed(0)
+        for f in self.functions:
+            contours = [circle(random.random() * 1000, random.random() * 1000, 50) for i in range(50)]
+            n = sum(len(p) for p in contours)
+            v = f(contours, True)
+            self.assertTrue(len(v) / 6 <= n, "%i triangles for %i vertices" % (len(v) / 6, n))
+            contours = [circle(i * 7.0, i * 0.5, 50) for i in range(50)]
+            n = sum(len(p) for p in contours)
+            v = f(contours, True)
+            self.assertTrue(len(v) / 6 <= n, "%i triangles for %i vertices" % (len(v) / 6, n))
+
+    def test_coverage(self):
+        # Each point inside the polygon is in exactly one triangle, each point outside in none.
+        random.seed(1)
+        contours = [[(random.random() * 100, random.random() * 100) for i in range(20)]]
+        index = geometry.PolygonIndex(contours)
+        for f in self.functions:
+            v = f(contours, True)
+            for i in range(500):
+                x, y = random.random() * 100, random.random() * 100
+                n = 0
+                for j in range(0, len(v), 6):
+                    x0, y0, x1, y1, x2, y2 = v[j:j+6]
+                    d1 = (x1-x0) * (y-y0) - (y1-y0) * (x-x0)
+                    d2 = (x2-x1) * (y-y1) - (y2-y1) * (x-x1)
+                    d3 = (x0-x2) * (y-y2) - (y0-y2) * (x-x2)
+                    n += d1 > 0 and d2 > 0 and d3 > 0 or d1 < 0 and d2 < 0 and d3 < 0
+                self.assertEqual(n, int(index.winding(x, y) != 0))
+
+    def test_c(self):
+        # The C version yields the same triangles as the Python version.
+        if c_triangulate is None:
+            return
+        random.seed(2)
+        contours = [circle(random.random() * 100, random.random() * 100, 20) for i in range(10)]
+        for nonzero in (True, False):
+            v1 = geometry._py_triangulate(contours, nonzero)
+            v2 = c_triangulate(contours, nonzero)
+            self.assertEqual(len(v1), len(v2))
+            self.assertAlmostEqual(triangles_area(v1), triangles_area(v2), 6)
+
+#--- STROKE ------------------------------------------------------------------------------------------
+
+class TestStroke(unittest.TestCase):
+
+    def test_caps(self):
+        # A line of 10 with width 2 is a quad of 2 triangles,
+        # extended with half the width at both ends for SQUARE, with semicircles for ROUND.
+        line = [(0, 0), (10, 0)]
+        v = geometry.stroke([line], 2, cap=geometry.BUTT)
+        self.assertEqual(len(v) / 6, 2)
+        self.assertAlmostEqual(triangles_area(v), 20, 6)
+        v = geometry.stroke([line], 2, cap=geometry.SQUARE)
+        self.assertEqual(len(v) / 6, 2)
+        self.assertAlmostEqual(triangles_area(v), 24, 6)
+        v = geometry.stroke([line], 20, cap=geometry.ROUND)
+        self.assertTrue(len(v) / 6 > 2)
+        self.assertTrue(abs(triangles_area(v) - (200 + pi * 100)) < 0.02 * (200 + pi * 100))
+
+    def test_joins(self):
+        # A corner of 90 degrees: 2 quads + 2 triangles for MITER, 1 for BEVEL.
+        corner = [(0, 0), (10, 0), (10, 10)]
+        self.assertEqual(len(geometry.stroke([corner], 2, join=geometry.MITER)) / 6, 6)
+        self.assertEqual(len(geometry.stroke([corner], 2, join=geometry.BEVEL)) / 6, 5)
+        self.assertTrue(len(geometry.stroke([corner], 2, join=geometry.ROUND)) / 6 >= 5)
+        # A sharp corner exceeds the miter limit and is beveled.
+        corner = [(0, 0), (10, 0), (0, 1)]
+        self.assertEqual(len(geometry.stroke([corner], 2, join=geometry.MITER)) / 6, 5)
+        self.assertEqual(len(geometry.stroke([corner], 2, join=geometry.MITER, miterlimit=100)) / 6, 6)
+        # A closed contour has a join at each corner: 4 quads + 4 miters.
+        v = geometry.stroke([square(0, 0, 10) + [(0, 0)]], 2, join=geometry.MITER)
+        self.assertEqual(len(v) / 6, 16)
+        self.assertEqual((min(v[0::2]), min(v[1::2]), max(v[0::2]), max(v[1::2])), (-1, -1, 11, 11))
+
+    def test_dashes(self):
+        self.assertEqual(geometry.dashes([(0, 0), (10, 0)], (2, 1)), 
+            [[(0, 0), (2, 0)], [(3, 0), (5, 0)], [(6, 0), (8, 0)], [(9, 0), (10, 0)]])
+        self.assertEqual(geometry.dashes([(0, 0), (10, 0)], (2, 1), offset=1), 
+            [[(0, 0), (1, 0)], [(2, 0), (4, 0)], [(5, 0), (7, 0)], [(8, 0), (10, 0)]])
+        # A dash continues around a corner.
+        self.assertEqual(geometry.dashes([(0, 0), (5, 0), (5, 5)], (6, 1)),
+            [[(0, 0), (5, 0), (5, 1)], [(5, 2), (5, 5)]])
+        # Without a (valid) pattern, the line is one dash.
+        self.assertEqual(geometry.dashes([(0, 0), (10, 0)], (0, 0)), [[(0, 0), (10, 0)]])
+        # Each dash is stroked with caps.
+        self.assertEqual(len(geometry.stroke([[(0, 0), (10, 0)]], 2, dash=(2, 1))) / 6, 8)
+
+#--- SIMPLIFICATION ----------------------------------------------------------------------------------
+
+def distance_to_line(x, y, x0, y0, x1, y1):
+    d = ((x1-x0)**2 + (y1-y0)**2) ** 0.5
+    if d == 0:
+        return ((x-x0)**2 + (y-y0)**2) ** 0.5
+    return abs((x-x0) * (y1-y0) - (y-y0) * (x1-x0)) / d
+
+class TestSimplify(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(6)
+        # A random walk.
+        self.points = [(0.0, 0.0)]
+        for i in range(500):
+            x, y = self.points[-1]
+            self.points.append((x + random.random(), y + random.random() * 2 - 1))
+
+    def test_douglas_peucker(self):
+        # Collinear points are removed, the first and last point are kept.
+        self.assertEqual(geometry.simplify([(0, 0), (1, 0), (2, 0), (3, 1)], 0.1), [(0, 0), (2, 0), (3, 1)])
+        for tolerance in (0.5, 2.0, 5.0):
+            p = geometry._py_douglas_peucker(self.points, tolerance)
+            self.assertEqual(p[0], self.points[0])
+            self.assertEqual(p[-1], self.points[-1])
+            # Each removed point deviates less than the tolerance 
+            # from the line between the points that are kept around it.
+            i = 0
+            for j in range(1, len(p)):
+                k = self.points.index(p[j])
+                for x, y in self.points[i+1:k]:
+                    self.assertTrue(distance_to_line(x, y, p[j-1][0], p[j-1][1], p[j][0], p[j][1]) <= tolerance)
+                i = k
+        self.assertTrue(len(geometry.simplify(self.points, 5.0)) < len(geometry.simplify(self.points, 0.5)))
+
+    def test_c(self):
+        # The C version keeps the same points as the Python version.
+        if c_simplify is None:
+            return
+        for tolerance in (0.1, 0.5, 2.0, 5.0):
+            self.assertEqual(c_simplify(self.points, tolerance), geometry._py_douglas_peucker(self.points, tolerance))
+        self.assertEqual(c_simplify([(0, 0), (0, 0), (0, 0)], 0.5), geometry._py_douglas_peucker([(0, 0), (0, 0), (0, 0)], 0.5))
+
+    def test_visvalingam(self):
+        p1 = geometry.simplify(self.points, 0.5, geometry.VISVALINGAM)
+        p2 = geometry.simplify(self.points, 2.0, geometry.VISVALINGAM)
+        self.assertTrue(len(p2) < len(p1) < len(self.points))
+        self.assertEqual((p2[0], p2[-1]), (self.points[0], self.points[-1]))
+        self.assertTrue(set(p2) <= set(self.points))
+
+    def test_resample(self):
+        p = geometry.resample([(0, 0), (10, 0), (10, 5.5)], 1.0)
+        self.assertEqual(len(p), 17)
+        self.assertEqual((p[0], p[-1]), ((0, 0), (10, 5.5)))
+        # The points are at an equal distance along the line (not in a straight line, around the corner).
+        for (x0, y0), (x1, y1) in zip(p[:10], p[1:11]):
+            self.assertAlmostEqual(((x1-x0)**2 + (y1-y0)**2) ** 0.5, 1.0, 6)
+        self.assertEqual(p[10], (10, 0))
+
+#--- BOOLEAN OPERATIONS ------------------------------------------------------------------------------
+
+class TestClip(unittest.TestCase):
+
+    def area(self, contours):
+        # Holes run in the opposite direction, so their area is subtracted.
+        return abs(sum(polygon_area(points) for points in contours))
+
+    def test_overlapping(self):
+        a, b = [square(0, 0, 10)], [square(5, 5, 10)]
+        self.assertAlmostEqual(self.area(geometry.clip(a, b, geometry.UNION)), 175, 6)
+        self.assertAlmostEqual(self.area(geometry.clip(a, b, geometry.INTERSECTION)), 25, 6)
+        self.assertAlmostEqual(self.area(geometry.clip(a, b, geometry.DIFFERENCE)), 75, 6)
+        self.assertAlmostEqual(self.area(geometry.clip(a, b, geometry.XOR)), 150, 6)
+        self.assertEqual(len(geometry.clip(a, b, geometry.XOR)), 2)
+
+    def test_adjacent(self):
+        # Squares that share an edge: the shared edge is removed from the union.
+        a, b = [square(0, 0, 10)], [square(10, 0, 10)]
+        union = geometry.clip(a, b, geometry.UNION)
+        self.assertEqual(len(union), 1)
+        self.assertEqual(len(union[0]), 5) # 4 corners + closing point.
+        self.assertAlmostEqual(self.area(union), 200, 6)
+        self.assertEqual(geometry.clip(a, b, geometry.INTERSECTION), [])
+        self.assertAlmostEqual(self.area(geometry.clip(a, b, geometry.DIFFERENCE)), 100, 6)
+
+    def test_identical(self):
+        # Identical squares: the edges in both sets are used once.
+        a, b = [square(0, 0, 10)], [square(0, 0, 10)]
+        self.assertAlmostEqual(self.area(geometry.clip(a, b, geometry.UNION)), 100, 6)
+        self.assertAlmostEqual(self.area(geometry.clip(a, b, geometry.INTERSECTION)), 100, 6)
+        self.assertEqual(geometry.clip(a, b, geometry.DIFFERENCE), [])
+        self.assertEqual(geometry.clip(a, b, geometry.XOR), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#=== GLYPH STORE TESTS ===============================================================================
+# Unit tests for nodebox/graphics/glyphstore.py.
+# > python -m unittest discover tests
+
+import os
+import sys
+import unittest
+import tempfile
+import shutil
+import cPickle
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "nodebox", "graphics"))
+
+import glyphstore
+
+FONT = os.path.join(ROOT, "nodebox", "font")
+
+#--- GLYPH STORE -------------------------------------------------------------------------------------
+
+class TestGlyphStore(unittest.TestCase):
+
+    def setUp(self):
+        self.glyphs = cPickle.load(open(os.path.join(FONT, "glyph.p"), "rb"))
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def assertGlyphs(self, store):
+        # Each glyph in glyph.p has the same commands and coordinates in the store.
+        n = 0
+        for font in self.glyphs:
+            for weight in self.glyphs[font]:
+                for ch, path in self.glyphs[font][weight].items():
+                    cmds, coords = store.glyph(font, weight, ch)
+                    self.assertEqual(list(cmds), [glyphstore._COMMANDS[pt[0]] for pt in path])
+                    self.assertEqual(list(coords), [v for pt in path for v in pt[1:]])
+                    n += 1
+        self.assertEqual(len(store), n)
+        self.assertEqual(store.fonts(), dict((font, sorted(self.glyphs[font])) for font in self.glyphs))
+
+    def test_convert(self):
+        path = os.path.join(self.folder, "glyph.bin")
+        glyphstore.convert(self.glyphs, path)
+        store = glyphstore.GlyphStore(path)
+        self.assertGlyphs(store)
+        self.assertRaises(KeyError, store.glyph, "no such font", "normal", u"a")
+        store.close()
+
+    def test_bundled(self):
+        # The bundled glyph.bin is up to date with glyph.p.
+        store = glyphstore.GlyphStore(os.path.join(FONT, "glyph.bin"))
+        self.assertGlyphs(store)
+        store.close()
+
+    def test_version(self):
+        path = os.path.join(self.folder, "glyph.bin")
+        open(path, "wb").write("NBGC" + "\0" * 100)
+        store = glyphstore.GlyphStore(path)
+        self.assertRaises(glyphstore.GlyphStoreError, len, store)
+        store.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+#=== PHYSICS TESTS ===================================================================================
+# Unit tests for nodebox/graphics/physics.py.
+# > python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "nodebox", "graphics"))
+
+import physics
+
+#--- SYSTEM ------------------------------------------------------------------------------------------
+
+class TestSystem(unittest.TestCase):
+
+    def setUp(self):
+        # The drawing functions in physics.py are patched to record what is drawn.
+        self.drawn = []
+        self._ellipses = physics.ellipses
+        physics.ellipses = lambda x, y, width, height, **kwargs: self.drawn.append(list(x))
+
+    def tearDown(self):
+        physics.ellipses = self._ellipses
+
+    def test_draw(self):
+        # Particles with the default draw() are drawn together, in order with custom-drawn particles.
+        class Square(physics.Particle):
+            def draw(p, **kwargs):
+                self.drawn.append("square")
+        s = physics.System()
+        a = physics.Particle(0, 0)
+        b = physics.Particle(1, 0)
+        c = Square(2, 0)
+        d = physics.Particle(3, 0)
+        e = physics.Particle(4, 0)
+        e.draw = lambda **kwargs: self.drawn.append("function")
+        f = physics.Particle(5, 0)
+        s.extend((a, b, c, d, e, f))
+        s.draw()
+        self.assertEqual(self.drawn, [[a.x, b.x], "square", [d.x], "function", [f.x]])
+        # Dead particles are not drawn.
+        del self.drawn[:]
+        a.dead = True
+        d.dead = True
+        s.draw()
+        self.assertEqual(self.drawn, [[b.x], "square", "function", [f.x]])
+
+if __name__ == "__main__":
+    unittest.main()